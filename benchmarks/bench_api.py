@@ -0,0 +1,130 @@
+"""
+API read benchmark: latency and throughput of the read endpoints.
+
+Runs the real API app (src.api) in process through an ASGI client, on a
+temporary database seeded with posts, jobs and history, as a read-only
+worker: jobs are left to a standalone runner and startup hooks are not run,
+so no browser, job runner or scheduler is started. Each endpoint is
+measured twice: served from the response cache, and with its cached
+responses invalidated before every request (the cost of a cache miss).
+
+Usage: python benchmarks/bench_api.py [--seconds 2] [--clients 8] [--rows 5000]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common import timing_row, write_results  # noqa: E402
+from src.config import settings  # noqa: E402
+
+ACCOUNTS = ["brasserie chez ju", "le petit bouchon", "café des arts", "la cantine"]
+WORDS = ["menu", "semaine", "valentin", "jazz", "brunch", "dessert", "fermeture", "soirée", "réservation"]
+
+# Endpoint, cache resource invalidated on a miss, query parameter sets (one picked per request)
+ENDPOINTS = [
+    ("/posts", "posts", [{"limit": 20}, {"limit": 50}, *({"limit": 20, "account": account} for account in ACCOUNTS)]),
+    ("/posts/search", "posts", [{"q": word} for word in WORDS]),
+    ("/history", "history", [{"limit": 20}, {"limit": 20, "status": "completed"}, {"limit": 20, "status": "error"}]),
+    ("/jobs", "jobs", [{"limit": 20}, {"limit": 20, "status": "completed"}]),
+    ("/status", "jobs", [{}]),
+]
+
+
+def seed(db, rows: int) -> None:
+    """Posts over the last 30 days, and one finished job (with history) per 50 posts"""
+    rng = random.Random(1)
+    now = datetime.now()
+    with db.get_connection() as conn:
+        conn.executemany("""
+            INSERT INTO posts (url, image_url, title, description, account, first_seen, last_seen)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, [
+            (
+                f"https://www.instagram.com/p/bench{i}/", f"https://cdn.example/{i}.jpg",
+                f"{rng.choice(WORDS).capitalize()} {i}", " ".join(rng.choices(WORDS, k=30)),
+                rng.choice(ACCOUNTS), now - timedelta(days=30), now - timedelta(minutes=rng.randint(0, 30 * 24 * 60)),
+            )
+            for i in range(rows)
+        ])
+        target_id = conn.execute("SELECT id FROM scrape_targets LIMIT 1").fetchone()[0]
+        for i in range(rows // 50):
+            finished = now - timedelta(hours=i)
+            status = "error" if i % 7 == 0 else "completed"
+            job_id = conn.execute("""
+                INSERT INTO scrape_jobs (target_id, status, created_at, started_at, finished_at, new_posts, stats)
+                VALUES (?, ?, ?, ?, ?, ?, '{}')
+            """, (target_id, status, finished, finished, finished, rng.randint(0, 3))).lastrowid
+            conn.execute(
+                "INSERT INTO scraping_history (timestamp, status, job_id) VALUES (?, ?, ?)",
+                (finished, status, job_id),
+            )
+        conn.commit()
+
+
+async def run_case(http: httpx.AsyncClient, api, endpoint: str, resource: str, params: list, cached: bool,
+                   args: argparse.Namespace) -> dict:
+    latencies = []
+    deadline = time.perf_counter() + args.seconds
+    rng = random.Random(2)
+
+    async def client():
+        while time.perf_counter() < deadline:
+            if not cached:
+                api.response_cache.invalidate(resource)
+            started = time.perf_counter()
+            response = await http.get(endpoint, params=rng.choice(params))
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(client() for _ in range(args.clients)))
+    return timing_row(
+        f"GET {endpoint} ({'cached' if cached else 'uncached'})", latencies,
+        requests_per_second=len(latencies) / args.seconds,
+    )
+
+
+async def main(args: argparse.Namespace) -> list:
+    workdir = tempfile.mkdtemp()
+    os.chdir(workdir)  # The API logs to scraper.log in the working directory
+    settings.DB_PATH = os.path.join(workdir, "bench.db")
+    settings.IMAGES_DIR = os.path.join(workdir, "images")
+    settings.JOB_RUNNER_MODE = "standalone"
+
+    from src import api
+
+    logging.getLogger().setLevel(logging.WARNING)
+    api.open_services()
+    seed(api.db, args.rows)
+    rows = []
+    transport = httpx.ASGITransport(app=api.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://api") as http:
+        for endpoint, resource, params in ENDPOINTS:
+            for cached in (True, False):
+                row = await run_case(http, api, endpoint, resource, params, cached, args)
+                rows.append(row)
+                print(
+                    f"{row['case']:<32} {row['requests_per_second']:8.1f} req/s  "
+                    f"p50 {row['p50_ms']:7.2f}ms  p99 {row['p99_ms']:7.2f}ms"
+                )
+    await api.db.close()
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=2, help="Duration of each case")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--rows", type=int, default=5000, help="Posts seeded before the run")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+    write_results(args.json, asyncio.run(main(args)))
@@ -0,0 +1,177 @@
+"""
+Database load benchmark: /posts throughput while a scrape is writing.
+
+Compares the legacy access path (a fresh synchronous sqlite3 connection per
+call, run directly inside the async handler, rollback journal) with the async
+pooled layer (reader threads, single writer thread, WAL and tuned pragmas).
+A writer task keeps upserting batches of posts for the whole run, like a
+scrape saving its results, while concurrent clients poll /posts through an
+in-process ASGI client.
+
+Usage: python benchmarks/bench_db.py [--seconds 5] [--clients 16] [--rows 5000]
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import httpx
+from fastapi import FastAPI
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common import write_results  # noqa: E402
+from src.database import Database  # noqa: E402
+
+UPSERT = """
+    INSERT INTO posts (url, image_url, local_image_path, title, description, first_seen, last_seen)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(url) DO UPDATE SET last_seen = excluded.last_seen
+"""
+
+SELECT_POSTS = """
+    SELECT url, image_url, local_image_path, title, description, first_seen, last_seen
+    FROM posts
+    ORDER BY last_seen DESC
+    LIMIT ?
+"""
+
+
+def post_rows(start: int, count: int) -> list:
+    now = datetime.now()
+    return [
+        (f"https://www.instagram.com/p/{i}/", f"https://cdn.example/{i}.jpg", None, f"Post {i}", "Description " * 20, now, now)
+        for i in range(start, start + count)
+    ]
+
+
+class LegacyBackend:
+    """The original access pattern: connect, query, close, on the event loop"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    async def get_latest_posts(self, limit: int) -> list:
+        conn = self._connect()
+        try:
+            return [dict(row) for row in conn.execute(SELECT_POSTS, (limit,)).fetchall()]
+        finally:
+            conn.close()
+
+    async def write_batch(self, rows: list) -> None:
+        conn = self._connect()
+        try:
+            conn.executemany(UPSERT, rows)
+            conn.commit()
+        finally:
+            conn.close()
+
+
+class PooledBackend:
+    """The async pooled access layer"""
+
+    def __init__(self, db: Database):
+        self.db = db
+
+    async def get_latest_posts(self, limit: int) -> list:
+        posts, _ = await self.db.get_latest_posts(limit)  # The next-page cursor is not served
+        return posts
+
+    async def write_batch(self, rows: list) -> None:
+        await self.db.pool.write(lambda conn: conn.executemany(UPSERT, rows))
+
+
+def make_api(backend) -> FastAPI:
+    api = FastAPI()
+
+    @api.get("/posts")
+    async def get_posts(limit: int = 10):
+        return {"posts": await backend.get_latest_posts(limit)}
+
+    return api
+
+
+async def run_case(name: str, backend, args: argparse.Namespace) -> dict:
+    latencies = []
+    writes = 0
+    deadline = time.perf_counter() + args.seconds
+
+    async def writer():
+        nonlocal writes
+        start = 0
+        while time.perf_counter() < deadline:
+            await backend.write_batch(post_rows(start % args.rows, args.batch))
+            start += args.batch
+            writes += 1
+            await asyncio.sleep(0.005)
+
+    async def client(http: httpx.AsyncClient):
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            response = await http.get("/posts", params={"limit": args.limit})
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - started)
+
+    transport = httpx.ASGITransport(app=make_api(backend))
+    async with httpx.AsyncClient(transport=transport, base_url="http://api") as http:
+        await asyncio.gather(writer(), *(client(http) for _ in range(args.clients)))
+
+    latencies.sort()
+    result = {
+        "case": name,
+        "requests_per_second": len(latencies) / args.seconds,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+        "write_batches_per_second": writes / args.seconds,
+    }
+    print(
+        f"{name:<10} {result['requests_per_second']:8.1f} req/s  "
+        f"p50 {result['p50_ms']:7.1f}ms  p99 {result['p99_ms']:7.1f}ms  "
+        f"{result['write_batches_per_second']:6.1f} write batches/s"
+    )
+    return result
+
+
+async def main(args: argparse.Namespace) -> list:
+    workdir = tempfile.mkdtemp()
+
+    # Same schema for both, seeded with the same rows
+    legacy_db = Database(os.path.join(workdir, "legacy.db"), os.path.join(workdir, "images"))
+    legacy_db.pool.close()
+    with sqlite3.connect(legacy_db.db_path) as conn:
+        conn.execute("PRAGMA journal_mode=DELETE")
+        conn.executemany(UPSERT, post_rows(0, args.rows))
+
+    pooled_db = Database(os.path.join(workdir, "pooled.db"), os.path.join(workdir, "images"))
+    with pooled_db.get_connection() as conn:
+        conn.executemany(UPSERT, post_rows(0, args.rows))
+        conn.commit()
+
+    results = [
+        await run_case("legacy", LegacyBackend(legacy_db.db_path), args),
+        await run_case("pooled", PooledBackend(pooled_db), args),
+    ]
+    await pooled_db.close()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--rows", type=int, default=5000, help="Posts seeded before the run")
+    parser.add_argument("--batch", type=int, default=50, help="Posts per write batch")
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+    write_results(args.json, asyncio.run(main(args)))
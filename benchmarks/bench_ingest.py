@@ -0,0 +1,140 @@
+"""
+Image ingestion benchmark: throughput and p99 API latency while images are ingested.
+
+Compares the legacy inline PNG (optimize=True) conversion on the event loop with
+the process-pool transcoding stage. Images are served by a local aiohttp server
+and /status is polled through an in-process ASGI client, so any event loop
+blocking shows up directly in the request latency.
+
+Usage: python benchmarks/bench_ingest.py [--images 50] [--size 2048]
+"""
+import argparse
+import asyncio
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import httpx
+from aiohttp import web
+from fastapi import FastAPI
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common import make_image, write_results  # noqa: E402
+from src.image_store import ImageStore  # noqa: E402
+from src.images import ImageIngestor  # noqa: E402
+from src.transcode import Transcoder  # noqa: E402
+
+POLL_INTERVAL = 0.01  # Seconds between two /status requests
+
+
+class InlinePngTranscoder(Transcoder):
+    """Legacy behaviour: PNG with optimize=True, encoded on the event loop"""
+
+    def __init__(self):
+        super().__init__(fmt="PNG", workers=0)
+
+    async def transcode(self, data: bytes, local_path: str, thumbnails=None) -> None:
+        image = Image.open(io.BytesIO(data)).convert('RGBA')
+        image.save(local_path, 'PNG', optimize=True)
+
+
+async def start_cdn(image: bytes, port: int) -> web.AppRunner:
+    """Local stand-in for the image CDN, returning distinct bytes per URL"""
+    async def handler(request: web.Request) -> web.Response:
+        # Unique trailer so content-addressed storage does not deduplicate the batch
+        return web.Response(body=image + request.match_info["name"].encode(), content_type="image/jpeg")
+
+    app = web.Application()
+    app.router.add_get("/{name}", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+
+def make_api() -> FastAPI:
+    api = FastAPI()
+
+    @api.get("/status")
+    async def status():
+        return {"status": "running"}
+
+    return api
+
+
+async def run_case(name: str, transcoder: Transcoder, urls: list) -> dict:
+    store = ImageStore(tempfile.mkdtemp(), extension=transcoder.extension)
+    ingestor = ImageIngestor(store, transcoder=transcoder, concurrency=16, per_host_limit=16)
+    latencies = []
+    done = asyncio.Event()
+
+    async def poll_api():
+        # Latency is measured from the intended send time, so time spent waiting
+        # for a blocked event loop is counted instead of silently omitted
+        transport = httpx.ASGITransport(app=make_api())
+        async with httpx.AsyncClient(transport=transport, base_url="http://api") as client:
+            next_send = time.perf_counter()
+            while not done.is_set():
+                await asyncio.sleep(max(0.0, next_send - time.perf_counter()))
+                await client.get("/status")
+                latencies.append(time.perf_counter() - next_send)
+                next_send += POLL_INTERVAL
+
+    poller = asyncio.create_task(poll_api())
+    started = time.perf_counter()
+    await ingestor.ingest_batch(urls)
+    elapsed = time.perf_counter() - started
+    done.set()
+    await poller
+    await ingestor.close()
+
+    latencies.sort()
+    return {
+        "case": name,
+        "seconds": elapsed,
+        "images_per_second": len(urls) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+        "max_ms": latencies[-1] * 1000,
+    }
+
+
+async def main(args: argparse.Namespace) -> list:
+    runner = await start_cdn(make_image(args.size, seed=1), args.port)
+    results = []
+    try:
+        cases = [
+            ("inline PNG optimize (before)", InlinePngTranscoder()),
+            ("pool PNG", Transcoder(fmt="PNG", workers=args.workers)),
+            (f"pool WEBP q{args.quality}", Transcoder(fmt="WEBP", quality=args.quality, workers=args.workers)),
+            (f"pool JPEG q{args.quality}", Transcoder(fmt="JPEG", quality=args.quality, workers=args.workers)),
+        ]
+        for name, transcoder in cases:
+            # Unique URLs per case so nothing is served from disk
+            urls = [f"http://127.0.0.1:{args.port}/{name.replace(' ', '_')}-{i}" for i in range(args.images)]
+            result = await run_case(name, transcoder, urls)
+            results.append(result)
+            print(
+                f"{result['case']:<30} {result['seconds']:7.2f}s  {result['images_per_second']:6.2f} img/s  "
+                f"/status p50 {result['p50_ms']:7.1f}ms  p99 {result['p99_ms']:7.1f}ms  max {result['max_ms']:7.1f}ms"
+            )
+    finally:
+        await runner.cleanup()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=50)
+    parser.add_argument("--size", type=int, default=2048, help="Edge length of the source images in pixels")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--quality", type=int, default=80)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+    write_results(args.json, asyncio.run(main(args)))
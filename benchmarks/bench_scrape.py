@@ -0,0 +1,131 @@
+"""
+Scrape benchmark: scrape_instagram and Database.save_posts, offline.
+
+The fast path runs against a recorded fixture (see replay.py) with the fake
+LLM, so the timings cover candidate extraction, selection and summarization
+prompts and parsing, not Instagram or OpenAI. --llm-latency adds a fixed
+delay per LLM call to model them. Images are served by a local CDN stand-in
+and go through the real download and transcoding stages.
+
+Cases:
+- scrape (uncached): extraction, one selection call, one summary batch
+- scrape (cached summaries): same, summaries served by the cache
+- save_posts (new): new posts, images downloaded and transcoded
+- save_posts (unchanged): known posts, last_seen bumped only
+
+Usage: python benchmarks/bench_scrape.py [--runs 20] [--llm-latency 0]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common import timing_row, write_results  # noqa: E402
+from replay import Fixture, ReplayBrowser, ReplayBrowserPool, patch_llm, start_cdn  # noqa: E402
+from src.database import Database  # noqa: E402
+from src.jobs import ScrapeTarget  # noqa: E402
+from src.models import DEFAULT_PROMPT_TEMPLATE, InstagramPost, InstagramPosts  # noqa: E402
+from src.scrapper import scrape_instagram  # noqa: E402
+from src.summarizer import OpenAISummaryBackend, Summarizer  # noqa: E402
+
+
+async def bench_scrape(case: str, target: ScrapeTarget, pool: ReplayBrowserPool, summarizer_factory, runs: int) -> dict:
+    timings = []
+    input_tokens = output_tokens = 0
+    result = None
+    for _ in range(runs):
+        stats = {}
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            success, result = await scrape_instagram(target, browser_pool=pool, stats=stats, summarizer=summarizer_factory())
+        timings.append(time.perf_counter() - started)
+        if not success:
+            raise RuntimeError(f"Replay scrape failed: {result}")
+        input_tokens += stats["extraction"][-1]["input_tokens"]
+        output_tokens += stats["extraction"][-1]["output_tokens"]
+    return timing_row(
+        case, timings, posts=len(result.posts),
+        input_tokens_per_run=input_tokens / runs, output_tokens_per_run=output_tokens / runs,
+    ), result
+
+
+def unique_posts(posts: InstagramPosts, run: int) -> InstagramPosts:
+    """Copies of the posts with their own URLs and image paths (so their own CDN images): nothing is deduplicated across runs"""
+    return InstagramPosts(posts=[
+        InstagramPost(
+            url=post.url.rstrip("/") + f"-{run}/",
+            image_url=post.image_url.replace(".jpg", f"-{run}.jpg"),
+            title=post.title,
+            description=post.description,
+        )
+        for post in posts.posts
+    ])
+
+
+async def bench_save(db: Database, posts: InstagramPosts, runs: int) -> list:
+    new, unchanged = [], []
+    for run in range(runs):
+        batch = unique_posts(posts, run)
+        started = time.perf_counter()
+        saved = await db.save_posts(batch, account="bench")
+        new.append(time.perf_counter() - started)
+        if saved.new_posts != len(batch.posts) or saved.images.failed or saved.images.near_duplicates:
+            raise RuntimeError(f"Unexpected save result: {saved}")
+        started = time.perf_counter()
+        await db.save_posts(batch, account="bench")
+        unchanged.append(time.perf_counter() - started)
+    return [
+        timing_row("save_posts (new)", new, posts=len(posts.posts)),
+        timing_row("save_posts (unchanged)", unchanged, posts=len(posts.posts)),
+    ]
+
+
+async def main(args: argparse.Namespace) -> list:
+    workdir = tempfile.mkdtemp()
+    os.chdir(workdir)  # scrape_instagram writes output.json to the working directory
+    runner = await start_cdn(args.port, args.image_size)
+    fixture = Fixture(args.fixture, cdn_url=f"http://127.0.0.1:{args.port}")
+    target = ScrapeTarget(account=fixture.account, prompt_template=DEFAULT_PROMPT_TEMPLATE, post_count=args.posts)
+    pool = ReplayBrowserPool(ReplayBrowser(fixture, latency=args.page_latency))
+    db = Database(os.path.join(workdir, "bench.db"), os.path.join(workdir, "images"))
+    rows = []
+    try:
+        with patch_llm(latency=args.llm_latency):
+            row, posts = await bench_scrape(
+                "scrape (uncached)", target, pool, lambda: Summarizer(OpenAISummaryBackend()), args.runs
+            )
+            rows.append(row)
+            cached = Summarizer(OpenAISummaryBackend(), db=db)
+            row, _ = await bench_scrape("scrape (cached summaries)", target, pool, lambda: cached, args.runs)
+            rows.append(row)
+        rows.extend(await bench_save(db, posts, args.runs))
+    finally:
+        await db.close()
+        await runner.cleanup()
+
+    for row in rows:
+        print(
+            f"{row['case']:<28} p50 {row['p50_ms']:8.2f}ms  p99 {row['p99_ms']:8.2f}ms  "
+            f"mean {row['mean_ms']:8.2f}ms  ({row['runs']} runs)"
+        )
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--fixture", default="chez_ju")
+    parser.add_argument("--posts", type=int, default=3, help="post_count of the target")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Seconds added to each LLM call")
+    parser.add_argument("--page-latency", type=float, default=0.0, help="Seconds added to each page load")
+    parser.add_argument("--image-size", type=int, default=1080, help="Edge length of the CDN images in pixels")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+    write_results(args.json, asyncio.run(main(args)))
@@ -0,0 +1,148 @@
+"""
+Startup benchmark: import time and memory of an API worker and of the scraping engine.
+
+Each case runs in a fresh interpreter (python -X importtime), timing the
+imports and the opening of the database and stores that an API worker does
+on startup, then reading the peak RSS of the process. The slowest imports of
+the last run of each case are listed from the -X importtime report.
+
+Cases:
+  read-only API worker   JOB_RUNNER_MODE "standalone": serves reads and queues jobs
+  API worker with jobs   JOB_RUNNER_MODE "in_process": also loads the scraping engine
+  standalone job runner  what `python -m src.worker` loads before running jobs
+
+Usage: python benchmarks/bench_startup.py [--runs 5] [--top 8]
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+from typing import Any, Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common import write_results  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules whose presence after startup means the scraping engine was loaded
+ENGINE_MODULES = ["browser_use", "langchain_openai", "langchain_core", "openai"]
+
+# Case name -> code run (and timed) in the child process
+CASES = {
+    "read-only API worker": (
+        "settings.JOB_RUNNER_MODE = 'standalone'\n"
+        "from src import api\n"
+        "api.open_services()\n"
+    ),
+    "API worker with jobs": (
+        "settings.JOB_RUNNER_MODE = 'in_process'\n"
+        "from src import api\n"
+        "api.open_services()\n"
+    ),
+    "standalone job runner": (
+        "settings.JOB_RUNNER_MODE = 'standalone'\n"
+        "from src import worker\n"
+        "from src.database import Database\n"
+        "from src.jobs import JobStore\n"
+        "from src.telemetry import TelemetryStore\n"
+        "from src.checkpoints import CheckpointStore\n"
+        "db = Database(db_path=settings.DB_PATH, images_dir=settings.IMAGES_DIR)\n"
+        "worker.JobRunner(db, JobStore(db), TelemetryStore(db), CheckpointStore(db))\n"
+    ),
+}
+
+CHILD = """
+import json, resource, sys, time
+sys.path.insert(0, {root!r})
+
+def peak_rss_mb():
+    # VmHWM is reset by exec; ru_maxrss keeps the peak of the forked parent (this benchmark)
+    try:
+        with open("/proc/self/status") as f:
+            return int(f.read().split("VmHWM:")[1].split()[0]) / 1024
+    except (OSError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+started = time.perf_counter()
+from src.config import settings
+settings.DB_PATH = 'bench.db'
+settings.IMAGES_DIR = 'images'
+settings.SUMMARY_BACKEND = 'stub'
+{code}
+seconds = time.perf_counter() - started
+print(json.dumps({{
+    "seconds": seconds,
+    "rss_mb": peak_rss_mb(),
+    "modules": len(sys.modules),
+    "engine_loaded": [name for name in {engine!r} if name in sys.modules],
+}}))
+"""
+
+IMPORTTIME_RE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def slowest_imports(report: str, top: int) -> List[Tuple[str, float]]:
+    """Imports of the first two levels of the -X importtime tree, by cumulative time (ms)"""
+    imports = []
+    for line in report.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if match and len(match.group(3)) <= 3:  # Imported by the code, or by what it imports
+            imports.append((match.group(4), int(match.group(2)) / 1000))
+    return sorted(imports, key=lambda item: item[1], reverse=True)[:top]
+
+
+def run_once(code: str) -> Tuple[Dict[str, Any], str]:
+    workdir = tempfile.mkdtemp()  # Fresh database, and the API logs to scraper.log in the working directory
+    child = CHILD.format(root=ROOT, code=code, engine=ENGINE_MODULES)
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", child], cwd=workdir, capture_output=True, text=True, check=True
+    )
+    return json.loads(process.stdout.strip().splitlines()[-1]), process.stderr
+
+
+def run_case(name: str, code: str, args: argparse.Namespace) -> Dict[str, Any]:
+    runs = []
+    report = ""
+    for _ in range(args.runs):
+        result, report = run_once(code)
+        runs.append(result)
+    seconds = [run["seconds"] for run in runs]
+    return {
+        "case": name,
+        "runs": len(runs),
+        "seconds": statistics.median(seconds),
+        "mean_ms": statistics.mean(seconds) * 1000,
+        "rss_mb": statistics.median(run["rss_mb"] for run in runs),
+        "modules": runs[-1]["modules"],
+        "engine_loaded": runs[-1]["engine_loaded"],
+        "slowest_imports": slowest_imports(report, args.top),
+    }
+
+
+def main(args: argparse.Namespace) -> list:
+    results = []
+    for name, code in CASES.items():
+        result = run_case(name, code, args)
+        results.append(result)
+        engine = ", ".join(result["engine_loaded"]) or "not loaded"
+        print(
+            f"{result['case']:<24} {result['seconds'] * 1000:8.0f}ms  RSS {result['rss_mb']:6.1f} MB  "
+            f"{result['modules']:5d} modules  engine: {engine}"
+        )
+        for module, ms in result["slowest_imports"]:
+            print(f"    {module:<40} {ms:8.1f}ms")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Fresh processes per case (the median is reported)")
+    parser.add_argument("--top", type=int, default=8, help="Slowest imports listed per case")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+    write_results(args.json, main(args))
@@ -0,0 +1,53 @@
+"""
+Helpers shared by the benchmarks. Kept apart from replay.py, which loads the
+scraping engine (browser_use, LangChain): importing them stays cheap.
+"""
+import io
+import json
+import random
+from typing import Any, Dict, List, Optional
+
+from PIL import Image, ImageChops, ImageDraw
+
+
+def make_image(size: int, seed: int) -> bytes:
+    """
+    A JPEG of seeded shapes under fine noise. Distinct seeds give perceptually
+    distinct images (kept apart by the near-duplicate index), and the noise
+    keeps encoders from taking shortcuts.
+    """
+    rng = random.Random(seed)
+    image = Image.new("RGB", (size, size), tuple(rng.randrange(256) for _ in range(3)))
+    draw = ImageDraw.Draw(image)
+    for _ in range(12):
+        x, y = rng.randrange(size), rng.randrange(size)
+        w, h = rng.randrange(size // 8, size // 2), rng.randrange(size // 8, size // 2)
+        shape = draw.ellipse if rng.random() < 0.5 else draw.rectangle
+        shape((x - w // 2, y - h // 2, x + w // 2, y + h // 2), fill=tuple(rng.randrange(256) for _ in range(3)))
+    # Noise of +/-16 levels: unseen by the perceptual hash, but it costs encoders real work
+    noise = Image.frombytes("RGB", (size, size), rng.randbytes(size * size * 3)).point(lambda v: 112 + v // 8)
+    image = ImageChops.add(image, noise, offset=-128)
+    buf = io.BytesIO()
+    image.save(buf, "JPEG", quality=90)
+    return buf.getvalue()
+
+
+def timing_row(case: str, seconds: List[float], **extra: Any) -> Dict[str, Any]:
+    """Summary of repeated timings, as reported by the benchmarks"""
+    ordered = sorted(seconds)
+    return {
+        "case": case,
+        "runs": len(ordered),
+        "mean_ms": sum(ordered) / len(ordered) * 1000,
+        "p50_ms": ordered[len(ordered) // 2] * 1000,
+        "p99_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000,
+        "max_ms": ordered[-1] * 1000,
+        **extra,
+    }
+
+
+def write_results(path: Optional[str], rows: List[Dict[str, Any]]) -> None:
+    """Write benchmark rows as JSON (for run_all.py)"""
+    if path:
+        with open(path, "w") as f:
+            json.dump(rows, f, indent=1)
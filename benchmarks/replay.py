@@ -0,0 +1,369 @@
+"""
+Record/replay harness: run the scraper offline against captured pages.
+
+A fixture (benchmarks/fixtures/<name>/) holds what the fast path reads from
+a live session: the profile page HTML (profile.html), the timeline JSON
+responses captured while it loads (responses.json), the rendered grid
+anchors (anchors.json) and the account search result (meta.json). Image URLs
+are stored as a {cdn} placeholder, served at replay by a local stand-in for
+the image CDN.
+
+At replay, ReplayBrowser plays the fixture back through the Playwright calls
+made by src.extractor.collect_candidates, and FakeChatOpenAI replaces
+ChatOpenAI with deterministic answers (see patch_llm). The browsing agent
+itself needs a real Chrome and is not replayed.
+
+Record a fixture from the logged-in Chrome (debug port 9222):
+    python benchmarks/replay.py record "brasserie chez ju" --name chez_ju
+Replay it once and print the extracted posts:
+    python benchmarks/replay.py replay --name chez_ju
+"""
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import io
+import json
+import os
+import re
+import sys
+import tempfile
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List
+
+from aiohttp import web
+from langchain_core.messages import AIMessage
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common import make_image  # noqa: E402
+from src import scrapper, summarizer  # noqa: E402
+from src.browser_pool import BrowserRunStats  # noqa: E402
+from src.extractor import PostSelection  # noqa: E402
+from src.summarizer import IndexedSummary, SummaryBatch  # noqa: E402
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# Image URLs of the Instagram CDN, JSON-escaped or not
+CDN_URL_RE = re.compile(r"https?:(?:\\?/){2}[^\"'\s<>]*?(?:cdninstagram\.com|fbcdn\.net)[^\"'\s<>]*")
+
+
+class Fixture:
+    """Captured pages of one account, with {cdn} pointing at cdn_url"""
+
+    def __init__(self, name: str, cdn_url: str = "http://127.0.0.1:8766"):
+        self.name = name
+        path = os.path.join(FIXTURES_DIR, name)
+
+        def read(file: str) -> str:
+            with open(os.path.join(path, file), encoding="utf-8") as f:
+                return f.read().replace("{cdn}", cdn_url)
+
+        self.html = read("profile.html")
+        self.responses: List[Dict[str, Any]] = json.loads(read("responses.json"))
+        self.anchors: List[Dict[str, Any]] = json.loads(read("anchors.json"))
+        self.meta: Dict[str, Any] = json.loads(read("meta.json"))
+
+    @property
+    def account(self) -> str:
+        return self.meta["account"]
+
+
+class _ReplayResponse:
+    def __init__(self, url: str, body: Any):
+        self.url = url
+        self.body = body
+        self.request = type("Request", (), {"resource_type": "xhr"})()
+
+    async def json(self) -> Any:
+        return self.body
+
+
+class ReplayPage:
+    """The subset of a Playwright page used by the fast path, answered from a fixture"""
+
+    def __init__(self, fixture: Fixture, latency: float = 0.0):
+        self.fixture = fixture
+        self.latency = latency
+        self._handlers: List[Any] = []
+
+    def on(self, event: str, handler) -> None:
+        if event == "response":
+            self._handlers.append(handler)
+
+    async def goto(self, url: str, **kwargs: Any) -> None:
+        await asyncio.sleep(self.latency)
+        if url.rstrip("/").endswith(self.fixture.meta["username"]):
+            for response in self.fixture.responses:
+                for handler in self._handlers:
+                    handler(_ReplayResponse(response["url"], response["body"]))
+
+    async def wait_for_load_state(self, state: str = "load", **kwargs: Any) -> None:
+        await asyncio.sleep(0)
+
+    async def evaluate(self, script: str, *args: Any) -> Any:
+        return self.fixture.meta.get("search")
+
+    async def content(self) -> str:
+        return self.fixture.html
+
+    async def eval_on_selector_all(self, selector: str, script: str) -> List[Dict[str, Any]]:
+        return self.fixture.anchors
+
+    async def close(self) -> None:
+        pass
+
+
+class _ReplayContext:
+    def __init__(self, fixture: Fixture, latency: float):
+        self.fixture = fixture
+        self.latency = latency
+        self.pages: List[ReplayPage] = []
+
+    async def new_page(self) -> ReplayPage:
+        page = ReplayPage(self.fixture, self.latency)
+        self.pages.append(page)
+        return page
+
+    async def close(self) -> None:
+        pass
+
+
+class ReplayBrowser:
+    """Stands in for a browser_use Browser, serving a fixture instead of Instagram"""
+
+    def __init__(self, fixture: Fixture, latency: float = 0.0):
+        self.fixture = fixture
+        self.latency = latency  # Seconds per navigation
+        self.contexts: List[_ReplayContext] = []
+
+    async def get_playwright_browser(self) -> "ReplayBrowser":
+        return self
+
+    async def new_context(self) -> _ReplayContext:
+        return _ReplayContext(self.fixture, self.latency)
+
+    def is_connected(self) -> bool:
+        return True
+
+    async def close(self) -> None:
+        pass
+
+
+class _ReplaySlot:
+    def __init__(self, browser: ReplayBrowser):
+        self.browser = browser
+        self.run = BrowserRunStats(slot=0, warm=True)
+
+    def mark_step(self) -> None:
+        pass
+
+    def chrome_rss_mb(self) -> float:
+        return 0.0
+
+
+class ReplayBrowserPool:
+    """Stands in for src.browser_pool.BrowserPool with a single replay browser"""
+
+    def __init__(self, browser: ReplayBrowser):
+        self.browser = browser
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield _ReplaySlot(self.browser)
+
+    async def close(self) -> None:
+        pass
+
+
+def _usage(prompt: str, answer: str) -> Dict[str, int]:
+    """Token counts of the usual ~4 characters per token"""
+    input_tokens, output_tokens = len(prompt) // 4, len(answer) // 4
+    return {"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens}
+
+
+def _answer_selection(prompt: str) -> PostSelection:
+    """The first posts of the listing, as many as asked for"""
+    count = int(re.search(r"au plus (\d+) publications", prompt).group(1))
+    listing = json.loads(prompt.split("Publications :\n", 1)[1])
+    return PostSelection(shortcodes=[post["shortcode"] for post in listing[:count]])
+
+
+def _answer_summaries(prompt: str) -> SummaryBatch:
+    """Title from the first caption line, description from the rest (or the alt text)"""
+    summaries = []
+    for block in re.split(r"\n\n(?=\[\d+\] )", prompt.split("Publications :\n", 1)[1]):
+        match = re.match(r"\[(\d+)\] Légende : (.*)\nTexte alternatif : (.*)", block, re.DOTALL)
+        lines = [line.strip() for line in match.group(2).splitlines() if line.strip()]
+        title = lines[0] if lines else match.group(3)[:120]
+        summaries.append(IndexedSummary(
+            index=int(match.group(1)), title=title, description=" ".join(lines[1:]) or match.group(3) or title,
+        ))
+    return SummaryBatch(summaries=summaries)
+
+
+ANSWERS = {PostSelection: _answer_selection, SummaryBatch: _answer_summaries}
+
+
+class FakeChatOpenAI:
+    """
+    Deterministic stand-in for ChatOpenAI's structured output: answers the
+    selection and summarization prompts from their own content, after
+    latency seconds, with token usage estimated from the text length.
+    """
+
+    calls = 0  # Across instances, as the code under test creates its own
+
+    def __init__(self, model: str = "fake", latency: float = 0.0, **kwargs: Any):
+        self.model = model
+        self.latency = latency
+
+    def with_structured_output(self, schema, include_raw: bool = False) -> "FakeChatOpenAI._Structured":
+        return FakeChatOpenAI._Structured(self, schema, include_raw)
+
+    class _Structured:
+        def __init__(self, llm: "FakeChatOpenAI", schema, include_raw: bool):
+            self.llm = llm
+            self.schema = schema
+            self.include_raw = include_raw
+
+        async def ainvoke(self, prompt: str) -> Any:
+            FakeChatOpenAI.calls += 1
+            await asyncio.sleep(self.llm.latency)
+            parsed = ANSWERS[self.schema](prompt)
+            if not self.include_raw:
+                return parsed
+            answer = parsed.model_dump_json()
+            raw = AIMessage(content=answer, usage_metadata=_usage(prompt, answer))
+            return {"raw": raw, "parsed": parsed, "parsing_error": None}
+
+
+@contextlib.contextmanager
+def patch_llm(latency: float = 0.0):
+    """Replace ChatOpenAI in the scraper and summarizer with FakeChatOpenAI"""
+    def factory(*args: Any, **kwargs: Any) -> FakeChatOpenAI:
+        return FakeChatOpenAI(kwargs.get("model", "fake"), latency=latency)
+
+    originals = scrapper.ChatOpenAI, summarizer.ChatOpenAI
+    scrapper.ChatOpenAI = summarizer.ChatOpenAI = factory
+    try:
+        yield
+    finally:
+        scrapper.ChatOpenAI, summarizer.ChatOpenAI = originals
+
+
+async def start_cdn(port: int = 8766, size: int = 1080) -> web.AppRunner:
+    """
+    Local stand-in for the image CDN. Each path gets its own image, seeded by
+    the path and generated on first request (query strings are ignored, like
+    the signed parameters of the real CDN).
+    """
+    images: Dict[str, bytes] = {}
+
+    async def handler(request: web.Request) -> web.Response:
+        path = request.match_info["path"]
+        if path not in images:
+            seed = int(hashlib.blake2b(path.encode(), digest_size=8).hexdigest(), 16)
+            images[path] = await asyncio.to_thread(make_image, size, seed)
+        return web.Response(body=images[path], content_type="image/jpeg")
+
+    app = web.Application()
+    app.router.add_get("/{path:.*}", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+
+def anonymize_cdn_urls(text: str) -> str:
+    """Replace Instagram CDN URLs with stable {cdn} paths"""
+    def replace(match: re.Match) -> str:
+        url = match.group(0).replace("\\/", "/").split("?")[0]
+        name = hashlib.blake2b(url.encode(), digest_size=8).hexdigest()
+        return "{cdn}/" + name + ".jpg"
+
+    return CDN_URL_RE.sub(replace, text)
+
+
+async def record(account: str, name: str, cdp_url: str) -> None:
+    """Capture the fast path inputs of an account from the logged-in Chrome"""
+    from browser_use import Browser, BrowserConfig
+
+    from src.extractor import ANCHORS_SCRIPT, INSTAGRAM_URL, PAYLOAD_URL_RE, SEARCH_SCRIPT, username_from_search
+
+    browser = Browser(config=BrowserConfig(cdp_url=cdp_url))
+    playwright_browser = await browser.get_playwright_browser()
+    context = playwright_browser.contexts[0] if playwright_browser.contexts else await playwright_browser.new_context()
+    page = await context.new_page()
+    captured: List[asyncio.Task] = []
+
+    async def capture(response) -> Dict[str, Any]:
+        return {"url": response.url, "body": await response.json()}
+
+    def on_response(response) -> None:
+        if response.request.resource_type in ("xhr", "fetch") and PAYLOAD_URL_RE.search(response.url):
+            captured.append(asyncio.ensure_future(capture(response)))
+
+    page.on("response", on_response)
+    try:
+        await page.goto(INSTAGRAM_URL, wait_until="domcontentloaded")
+        search = await page.evaluate(SEARCH_SCRIPT, account)
+        username = username_from_search(search, account) if not re.fullmatch(r"[A-Za-z0-9._]+", account) else account
+        await page.goto(f"{INSTAGRAM_URL}/{username}/", wait_until="domcontentloaded")
+        with contextlib.suppress(Exception):
+            await page.wait_for_load_state("networkidle", timeout=30000)
+        html = await page.content()
+        anchors = await page.eval_on_selector_all("a[href*='/p/'], a[href*='/reel/']", ANCHORS_SCRIPT)
+        responses = [r for r in await asyncio.gather(*captured, return_exceptions=True) if isinstance(r, dict)]
+    finally:
+        await page.close()
+        await browser.close()
+
+    path = os.path.join(FIXTURES_DIR, name)
+    os.makedirs(path, exist_ok=True)
+    files = {
+        "profile.html": html,
+        "responses.json": json.dumps(responses, ensure_ascii=False, indent=1),
+        "anchors.json": json.dumps(anchors, ensure_ascii=False, indent=1),
+        "meta.json": json.dumps({"account": account, "username": username, "search": search}, ensure_ascii=False, indent=1),
+    }
+    for file, content in files.items():
+        with open(os.path.join(path, file), "w", encoding="utf-8") as f:
+            f.write(anonymize_cdn_urls(content))
+    print(f"Recorded {len(responses)} response(s) and {len(anchors)} anchor(s) of '{account}' in {path}")
+
+
+async def replay(name: str, port: int) -> None:
+    """Run scrape_instagram once on a fixture and print what it extracted"""
+    from src.jobs import ScrapeTarget
+    from src.models import DEFAULT_PROMPT_TEMPLATE
+
+    os.chdir(tempfile.mkdtemp())  # scrape_instagram writes output.json to the working directory
+    fixture = Fixture(name, cdn_url=f"http://127.0.0.1:{port}")
+    target = ScrapeTarget(account=fixture.account, prompt_template=DEFAULT_PROMPT_TEMPLATE, post_count=3)
+    stats: Dict[str, Any] = {}
+    with patch_llm(), contextlib.redirect_stdout(io.StringIO()):
+        success, result = await scrapper.scrape_instagram(
+            target, browser_pool=ReplayBrowserPool(ReplayBrowser(fixture)), stats=stats,
+            summarizer=scrapper.create_summarizer(),
+        )
+    print(result.model_dump_json(indent=1) if success else result)
+    print(json.dumps(stats["extraction"], indent=1, default=str))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    record_parser = commands.add_parser("record", help="Capture a fixture from the logged-in Chrome")
+    record_parser.add_argument("account")
+    record_parser.add_argument("--name", required=True, help="Fixture directory name")
+    record_parser.add_argument("--cdp-url", default="http://localhost:9222")
+    replay_parser = commands.add_parser("replay", help="Scrape a fixture offline")
+    replay_parser.add_argument("--name", default="chez_ju")
+    replay_parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    if args.command == "record":
+        asyncio.run(record(args.account, args.name, args.cdp_url))
+    else:
+        asyncio.run(replay(args.name, args.port))
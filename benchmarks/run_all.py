@@ -0,0 +1,137 @@
+"""
+Run every benchmark and keep the results per commit.
+
+Each benchmark runs in its own process with short settings and writes its
+results as JSON. They are gathered in benchmarks/results/<commit>.json and
+compared with a baseline (by default the most recent other results file),
+flagging every metric that got worse by more than --threshold.
+
+Usage: python benchmarks/run_all.py [--only scrape api] [--baseline <commit or file>] [--threshold 0.2]
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(BENCHMARKS_DIR, "results")
+
+# Benchmark name -> script and arguments of the tracked configuration
+SUITE = {
+    "scrape": ["bench_scrape.py", "--runs", "10"],
+    "api": ["bench_api.py", "--seconds", "1", "--clients", "8", "--rows", "5000"],
+    "db": ["bench_db.py", "--seconds", "2", "--clients", "8"],
+    "ingest": ["bench_ingest.py", "--images", "16", "--size", "1024"],
+    "startup": ["bench_startup.py", "--runs", "3"],
+}
+
+# Metrics compared with the baseline, and whether lower is better
+METRICS = {
+    "p50_ms": True,
+    "p99_ms": True,
+    "mean_ms": True,
+    "seconds": True,
+    "rss_mb": True,
+    "requests_per_second": False,
+    "images_per_second": False,
+    "write_batches_per_second": False,
+}
+
+
+def git_commit() -> str:
+    """Short hash of HEAD, suffixed with -dirty when the tree has local changes"""
+    def git(*args: str) -> str:
+        return subprocess.run(
+            ["git", *args], cwd=os.path.dirname(BENCHMARKS_DIR), capture_output=True, text=True
+        ).stdout.strip()
+
+    commit = git("rev-parse", "--short", "HEAD") or "unknown"
+    dirty = git("status", "--porcelain", "--", "src", "benchmarks", ":(exclude)benchmarks/results")
+    return f"{commit}-dirty" if dirty else commit
+
+
+def run_benchmark(name: str, command: List[str]) -> List[Dict[str, Any]]:
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+        output = f.name
+    print(f"\n== {name} ==", flush=True)
+    try:
+        subprocess.run([sys.executable, os.path.join(BENCHMARKS_DIR, command[0]), *command[1:], "--json", output], check=True)
+        with open(output) as f:
+            return json.load(f)
+    finally:
+        os.unlink(output)
+
+
+def load_baseline(baseline: Optional[str], current: str) -> Optional[Dict[str, Any]]:
+    """
+    Results of a commit (or a path), or by default the most recent results
+    file, which is the previous run of this commit if it was run before
+    """
+    if baseline:
+        path = baseline if os.path.exists(baseline) else os.path.join(RESULTS_DIR, f"{baseline}.json")
+    else:
+        existing = glob.glob(os.path.join(RESULTS_DIR, "*.json"))
+        path = max(existing, key=os.path.getmtime) if existing else current
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Metrics worse than the baseline by more than threshold (a fraction)"""
+    regressions = []
+    for name, rows in results["benchmarks"].items():
+        before = {row["case"]: row for row in baseline["benchmarks"].get(name, [])}
+        for row in rows:
+            for metric, lower_is_better in METRICS.items():
+                old, new = before.get(row["case"], {}).get(metric), row.get(metric)
+                if not old or new is None:
+                    continue
+                change = (new - old) / old if lower_is_better else (old - new) / old
+                if change > threshold:
+                    regressions.append(f"{name} / {row['case']} / {metric}: {old:.2f} -> {new:.2f} ({change:+.0%} worse)")
+    return regressions
+
+
+def main(args: argparse.Namespace) -> int:
+    commit = git_commit()
+    path = os.path.join(RESULTS_DIR, f"{commit}.json")
+    baseline = load_baseline(args.baseline, path)
+    results = {
+        "commit": commit,
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "benchmarks": {name: run_benchmark(name, SUITE[name]) for name in args.only or SUITE},
+    }
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(results, f, indent=1)
+    print(f"\nResults written to {path}")
+
+    if baseline is None:
+        print("No baseline to compare with")
+        return 0
+    regressions = compare(results, baseline, args.threshold)
+    print(f"Compared with {baseline['commit']} ({baseline['date']}): {len(regressions)} regression(s)")
+    for regression in regressions:
+        print(f"  {regression}")
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", nargs="+", choices=list(SUITE), help="Benchmarks to run (all by default)")
+    parser.add_argument("--baseline", help="Commit (results file name) or path of the results to compare with")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Relative change reported as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit with status 1 on regressions")
+    sys.exit(main(parser.parse_args()))
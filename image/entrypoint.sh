@@ -30,8 +30,8 @@ mkdir -p $HOME/static/images
 # Start the API using the Python from pyenv with logging
 $HOME/.pyenv/versions/$PYENV_VERSION/bin/python -m uvicorn src.api:app --host 0.0.0.0 --port 8000 --log-level debug --reload > $HOME/logs/uvicorn.log 2>&1 &
 
-# Start the scheduler
-$HOME/.pyenv/versions/$PYENV_VERSION/bin/python src/scheduler.py > $HOME/logs/scheduler.log 2>&1 &
+# Start the standalone scheduler (exits unless SCHEDULER_MODE is "standalone": it runs inside the API by default)
+$HOME/.pyenv/versions/$PYENV_VERSION/bin/python -m src.scheduler > $HOME/logs/scheduler.log 2>&1 &
 
 echo "✨ Browser Bot is ready!"
 echo "➡️  Open http://localhost:8080 in your browser to begin"
@@ -1,13 +1,25 @@
-from fastapi import FastAPI, BackgroundTasks
-from fastapi.responses import JSONResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import FileResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
 from datetime import datetime
-from src.scrapper import scrape_instagram, InstagramPosts
-from src.database import Database
+from src.models import DEFAULT_TARGET
+from src.database import Database, InvalidCursor
+from src.jobs import JobStore, ScrapeJob, ScrapeTarget, JOB_STATUSES
+from src.checkpoints import CheckpointStore
+from src.export import ndjson_posts, tar_archive
+from src.scheduler import ScheduleStore, ScrapingScheduler
+from src.telemetry import TelemetryStore, prometheus_metric
+from src.image_store import CONTENT_NAME_RE
+from src.cache import ResponseCache, etag_matches
+from src.events import Broadcaster, sse_frame
 from src.config import settings
+from typing import TYPE_CHECKING, Optional
+import asyncio
 import logging
+import os
+
+if TYPE_CHECKING:
+    from src.worker import JobRunner
 
 # Configure logging
 logging.basicConfig(
@@ -31,105 +43,356 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Mount the static directory for serving images
-app.mount("/static", StaticFiles(directory=settings.STATIC_DIR), name="static")
+# Database, stores, job runner and scheduler, created on startup by open_services():
+# importing the app opens nothing and does not load the scraping engine
+db: Optional[Database] = None
+job_store: Optional[JobStore] = None
+telemetry: Optional[TelemetryStore] = None
+checkpoints: Optional[CheckpointStore] = None
+scheduler: Optional[ScrapingScheduler] = None
+runner: Optional["JobRunner"] = None  # In process mode only (JOB_RUNNER_MODE)
 
-# Initialize database
-db = Database(db_path=settings.DB_PATH, images_dir=settings.IMAGES_DIR)
+# Cache of read endpoint responses, invalidated whenever the data behind them changes
+response_cache = ResponseCache(max_entries=settings.RESPONSE_CACHE_SIZE)
 
-class ScrapeStatus(BaseModel):
-    status: str
-    timestamp: str
-    last_result: InstagramPosts | None = None
-    error_message: str | None = None
+# Push channel for /events subscribers
+broadcaster = Broadcaster(queue_size=settings.EVENTS_QUEUE_SIZE)
 
-# Global variable to store the current scraping status
-current_status = ScrapeStatus(
-    status="idle",
-    timestamp=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-    last_result=None,
-    error_message=None
-)
+def on_db_change(resource: str, payload) -> None:
+    """Invalidate cached responses and push newly saved posts and job transitions"""
+    response_cache.invalidate(resource)
+    if resource == "posts":
+        for post in payload or []:
+            broadcaster.publish("post", post)
+    elif resource == "jobs" and payload is not None:
+        broadcaster.publish("job", payload.model_dump(mode="json", exclude={"stats"}))
+
+def step_publisher(job: ScrapeJob):
+    """Agent step callback of a job: push progress to /events subscribers"""
+    async def publish_step(state, model_output, step: int) -> None:
+        current_state = getattr(model_output, "current_state", None)
+        broadcaster.publish("step", {
+            "job_id": job.id,
+            "account": job.account,
+            "step": step,
+            "url": getattr(state, "url", None),
+            "next_goal": getattr(current_state, "next_goal", None),
+        })
+    return publish_step
+
+async def enqueue(target_id: int) -> ScrapeJob:
+    """Queue a job for a target; the standalone job runner picks it up on its next poll"""
+    if runner is not None:
+        return await runner.queue.enqueue(target_id)
+    return await job_store.enqueue(target_id)
+
+def open_services() -> None:
+    """Open the database and create the stores, the job runner (in process mode) and the scheduler"""
+    global db, job_store, telemetry, checkpoints, scheduler, runner
+    db = Database(db_path=settings.DB_PATH, images_dir=settings.IMAGES_DIR)
+    db.add_listener(on_db_change)
+    # Scrape targets and the persistent job queue
+    job_store = JobStore(db)
+    job_store.ensure_default_target(DEFAULT_TARGET)
+    # Per-step spans of each run, keyed by job id
+    telemetry = TelemetryStore(db)
+    # Progress of agent runs, resumed by the retry of a failed job
+    checkpoints = CheckpointStore(db, ttl_hours=settings.CHECKPOINT_TTL_HOURS)
+    if settings.JOB_RUNNER_MODE == "in_process":
+        # Loads browser_use and LangChain, which read-only workers never need
+        from src.worker import JobRunner
+        runner = JobRunner(db, job_store, telemetry, checkpoints, step_publisher=step_publisher)
+    # Queues jobs for the targets on their adaptive schedule
+    scheduler = ScrapingScheduler(
+        job_store, enqueue,
+        store=ScheduleStore(db) if settings.SCHEDULE_PERSIST or settings.SCHEDULER_MODE == "standalone" else None,
+    )
+
+async def status_summary() -> dict:
+    """
+    Aggregate state of the job queue, shared by every API worker. Cached
+    until a job changes state, so it carries no timestamp (see the Date header).
+    """
+    counts = await job_store.count_by_status()
+    running = await job_store.list_jobs(status="running", limit=settings.MAX_PAGE_SIZE)
+    return {
+        "status": "running" if counts["running"] else "idle",
+        "jobs": counts,
+        "running": [job.model_dump(mode="json") for job in running],
+    }
+
+async def watch_changes():
+    """Invalidate cached responses when another API worker changes the data behind them"""
+    while True:
+        await asyncio.sleep(settings.DATA_VERSION_POLL_SECONDS)
+        try:
+            await db.poll_changes()
+        except Exception as e:
+            logger.error(f"Error polling database changes: {e}")
+
+@app.on_event("startup")
+async def startup():
+    """Open the database, and start the job runner (in process mode) and the scheduler"""
+    open_services()
+    await db.poll_changes()
+    app.state.change_watcher = asyncio.create_task(watch_changes())
+    if runner is not None:
+        await runner.start()
+    if settings.SCHEDULER_MODE == "in_process":
+        await scheduler.start()
 
-async def run_scraping():
-    global current_status
-    try:
-        logger.info("Starting scraping process")
-        current_status.status = "running"
-        current_status.timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        current_status.error_message = None
-        
-        # Log scraping start
-        logger.debug("Logging scraping start to database")
-        db.log_scraping("started")
-        
-        # Run the scraping
-        logger.info("Running scraper...")
-        success, result = await scrape_instagram()
-        logger.debug(f"Scraper returned: success={success}, result type={type(result)}")
-        
-        if success:
-            logger.info("Scraping completed successfully")
-            current_status.status = "completed"
-            current_status.last_result = result
-            # Save posts to database
-            logger.debug(f"Saving {len(result.posts)} posts to database")
-            await db.save_posts(result)
-            # Log success
-            db.log_scraping("completed")
-        else:
-            logger.error(f"Scraping failed: {result}")
-            current_status.status = "error"
-            current_status.error_message = result
-            # Log error
-            db.log_scraping("error", result)
-            
-    except Exception as e:
-        logger.exception("Unexpected error during scraping")
-        current_status.status = "error"
-        current_status.error_message = str(e)
-        # Log error
-        db.log_scraping("error", str(e))
-    finally:
-        current_status.timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        logger.info(f"Scraping process ended with status: {current_status.status}")
+@app.on_event("shutdown")
+async def shutdown():
+    """Stop the scheduler and the job runner, close the shared image download session, transcoding workers and database connections"""
+    await scheduler.close()
+    app.state.change_watcher.cancel()
+    if runner is not None:
+        await runner.close()
+    await db.close()
 
 @app.post("/trigger-scrape")
-async def trigger_scrape(background_tasks: BackgroundTasks):
-    """Trigger a new Instagram scraping job"""
-    global current_status
+async def trigger_scrape(target_id: int | None = None):
+    """
+    Queue a scraping job for every enabled target, or only for target_id.
+    Targets that already have a queued or running job keep it.
+    """
+    if target_id is not None:
+        target = await job_store.get_target(target_id)
+        if target is None:
+            raise HTTPException(status_code=404, detail="Target not found")
+        targets = [target]
+    else:
+        targets = await job_store.list_targets(enabled_only=True)
     
-    # If a scraping is already running, return its status
-    if current_status.status == "running":
-        return JSONResponse(
-            status_code=409,
-            content={"error": "A scraping job is already running", "current_status": current_status.model_dump()}
-        )
-    
-    # Reset status before starting new job
-    current_status.last_result = None
-    current_status.error_message = None
+    jobs = [await enqueue(target.id) for target in targets]
+    return {"message": f"{len(jobs)} scraping job(s) queued", "jobs": [job.model_dump(mode="json") for job in jobs]}
+
+@app.get("/status")
+async def get_status(request: Request):
+    """Get the aggregate status of the scraping jobs"""
+    return await response_cache.respond(request, "jobs", status_summary)
+
+@app.get("/schedule")
+async def get_schedule():
+    """Interval, last and next run of every target, next run first"""
+    return {
+        "mode": settings.SCHEDULER_MODE,
+        "window": {"start_hour": settings.SCRAPE_START_HOUR, "end_hour": settings.SCRAPE_END_HOUR},
+        "min_interval_hours": settings.SCHEDULE_MIN_INTERVAL_HOURS,
+        "max_interval_hours": settings.SCHEDULE_MAX_INTERVAL_HOURS,
+        "targets": await scheduler.snapshot(),
+    }
+
+@app.get("/targets")
+async def get_targets():
+    """Get the scrape targets"""
+    return {"targets": await job_store.list_targets()}
+
+@app.post("/targets")
+async def save_target(target: ScrapeTarget):
+    """Create a scrape target, or update the one with the same account"""
+    return await job_store.save_target(target)
+
+@app.get("/targets/{target_id}/checkpoint")
+async def get_checkpoint(target_id: int):
+    """Progress saved by the last failed run of a target, resumed by its next job"""
+    checkpoint = await checkpoints.get(target_id)
+    if checkpoint is None:
+        raise HTTPException(status_code=404, detail="No checkpoint for this target")
+    return checkpoint
+
+@app.get("/jobs")
+async def get_jobs(
+    request: Request,
+    limit: int = Query(20, ge=1, le=settings.MAX_PAGE_SIZE),
+    status: str | None = Query(None, pattern=f"^({'|'.join(JOB_STATUSES)})$"),
+):
+    """Get the most recent scraping jobs"""
+    async def produce():
+        jobs = await job_store.list_jobs(status=status, limit=limit)
+        return {"jobs": [job.model_dump(mode="json") for job in jobs]}
+    return await response_cache.respond(request, "jobs", produce)
+
+@app.get("/stats/extraction")
+async def get_extraction_stats(request: Request, last_jobs: int = Query(100, ge=1, le=1000)):
+    """Success rate, wall time and token spend of the fast path and the agent over the last jobs"""
+    async def produce():
+        return {"paths": await job_store.extraction_stats(last_jobs)}
+    return await response_cache.respond(request, "jobs", produce)
+
+@app.get("/runs/{job_id}/profile")
+async def get_run_profile(job_id: int):
+    """Per-step spans of a job's run: where time, tokens and screenshots went"""
+    if await job_store.get_job(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return await telemetry.profile(job_id)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus metrics of the jobs, agent spans, response cache, events and browser pool"""
+    jobs = await job_store.count_by_status()
+    spans = await telemetry.totals_by_kind()
     
-    # Start the scraping in the background
-    background_tasks.add_task(run_scraping)
+    def by_kind(field: str) -> list:
+        return [({"kind": row["kind"]}, row[field] or 0) for row in spans]
     
-    return {"message": "Scraping job started", "status": current_status.model_dump()}
+    return PlainTextResponse("".join([
+        prometheus_metric("scraper_jobs", "gauge", "Scrape jobs by status",
+                          [({"status": status}, count) for status, count in jobs.items()]),
+        prometheus_metric("scraper_spans_total", "counter", "Recorded run spans", by_kind("spans")),
+        prometheus_metric("scraper_span_errors_total", "counter", "Run spans that ended with an error", by_kind("errors")),
+        prometheus_metric("scraper_span_seconds_total", "counter", "Wall time of run spans", by_kind("duration_seconds")),
+        prometheus_metric("scraper_llm_seconds_total", "counter", "Time spent waiting for the LLM", by_kind("llm_seconds")),
+        prometheus_metric("scraper_input_tokens_total", "counter", "LLM input tokens", by_kind("input_tokens")),
+        prometheus_metric("scraper_output_tokens_total", "counter", "LLM output tokens", by_kind("output_tokens")),
+        prometheus_metric("scraper_screenshot_bytes_total", "counter", "Screenshot bytes sent to the LLM", by_kind("screenshot_bytes")),
+        prometheus_metric("scraper_response_cache_hits_total", "counter", "Read responses served from cache", [({}, response_cache.hits)]),
+        prometheus_metric("scraper_response_cache_misses_total", "counter", "Read responses produced", [({}, response_cache.misses)]),
+        prometheus_metric("scraper_event_subscribers", "gauge", "Connected /events clients", [({}, broadcaster.subscriber_count)]),
+        prometheus_metric("scraper_event_subscribers_dropped_total", "counter", "Slow /events clients dropped", [({}, broadcaster.dropped_total)]),
+        *([
+            prometheus_metric("scraper_browsers", "gauge", "Browsers of the pool", [({}, runner.browser_pool.size)]),
+            prometheus_metric("scraper_browsers_idle", "gauge", "Idle browsers of the pool", [({}, runner.browser_pool.stats()["idle"])]),
+        ] if runner is not None else []),
+    ]), media_type="text/plain; version=0.0.4")
 
-@app.get("/status")
-async def get_status():
-    """Get the current status of the scraping job"""
-    return current_status.model_dump()
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: int):
+    """Get one scraping job, with its stats"""
+    job = await job_store.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/browsers")
+async def get_browsers():
+    """Get the state of the browser pool and the latency/memory of the last run"""
+    if runner is None:
+        raise HTTPException(status_code=404, detail="Jobs are run by the standalone job runner, not by this worker")
+    return runner.browser_pool.stats()
+
+@app.get("/events")
+async def get_events():
+    """
+    Server-Sent Events stream replacing /status polling.
+    Events: "status" (aggregate job status, sent first), "job" (transitions of
+    each job), "step" (agent progress of a job) and "post" (each newly saved post).
+    """
+    subscription = broadcaster.subscribe()
+    first = sse_frame("status", await status_summary())
+    return StreamingResponse(
+        broadcaster.stream(subscription, first),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @app.get("/posts")
-async def get_posts(limit: int = 10):
-    """Get the latest posts from the database"""
-    posts = db.get_latest_posts(limit)
-    return {"posts": posts}
+async def get_posts(
+    request: Request,
+    limit: int = Query(10, ge=1, le=settings.MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    account: str | None = None,
+    include_duplicates: bool = False,
+):
+    """Get the latest posts from the database, one page at a time (near-duplicate posts collapsed by default)"""
+    async def produce():
+        try:
+            posts, next_cursor = await db.get_latest_posts(
+                limit, cursor=cursor, since=since, until=until, account=account,
+                include_duplicates=include_duplicates,
+            )
+        except InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return {"posts": posts, "next_cursor": next_cursor}
+    return await response_cache.respond(request, "posts", produce)
+
+@app.get("/posts/search")
+async def search_posts(
+    request: Request,
+    q: str = Query(..., min_length=1),
+    limit: int = Query(10, ge=1, le=settings.MAX_PAGE_SIZE),
+    cursor: str | None = None,
+):
+    """Full-text search over post titles and descriptions"""
+    async def produce():
+        try:
+            posts, next_cursor = await db.search_posts(q, limit, cursor=cursor)
+        except InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return {"posts": posts, "next_cursor": next_cursor}
+    return await response_cache.respond(request, "posts", produce)
+
+@app.get("/export/posts.ndjson")
+async def export_posts(since: datetime | None = None, account: str | None = None):
+    """
+    Stream every post (or those seen since `since`) as newline-delimited JSON,
+    oldest last_seen first. For an incremental mirror, pass the last_seen of
+    the last line received as `since` on the next sync.
+    """
+    return StreamingResponse(ndjson_posts(db, since=since, account=account), media_type="application/x-ndjson")
+
+@app.get("/export/archive.tar")
+async def export_archive(since: datetime | None = None, account: str | None = None):
+    """
+    Stream a tarball of the posts (posts/<shortcode>.json) and the image
+    files they reference (images/...), read from disk as they are sent.
+    Same `since` semantics as /export/posts.ndjson.
+    """
+    suffix = f"-since-{since:%Y%m%d%H%M%S}" if since else ""
+    return StreamingResponse(
+        tar_archive(db, since=since, account=account),
+        media_type="application/x-tar",
+        headers={"Content-Disposition": f'attachment; filename="posts{suffix}.tar"'},
+    )
 
 @app.get("/history")
-async def get_history(limit: int = 10):
-    """Get the scraping history"""
-    return {"history": db.get_scraping_history(limit)}
+async def get_history(
+    request: Request,
+    limit: int = Query(10, ge=1, le=settings.MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    status: str | None = None,
+):
+    """Get the scraping history, one page at a time"""
+    async def produce():
+        try:
+            history, next_cursor = await db.get_scraping_history(
+                limit, cursor=cursor, since=since, until=until, status=status
+            )
+        except InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return {"history": history, "next_cursor": next_cursor}
+    return await response_cache.respond(request, "history", produce)
+
+@app.get("/static/{file_path:path}")
+async def get_static(file_path: str, request: Request):
+    """
+    Serve static files.
+    Content-addressed images are immutable: their ETag is the content hash and
+    they may be cached forever. Conditional GETs are answered with 304.
+    """
+    static_root = os.path.realpath(settings.STATIC_DIR)
+    full_path = os.path.realpath(os.path.join(static_root, file_path))
+    if os.path.commonpath([static_root, full_path]) != static_root or not os.path.isfile(full_path):
+        raise HTTPException(status_code=404, detail="Not Found")
+    
+    match = CONTENT_NAME_RE.match(os.path.basename(full_path).split('.')[0])
+    if match:
+        etag = f'"{os.path.basename(full_path)}"'
+        cache_control = "public, max-age=31536000, immutable"
+    else:
+        stat = os.stat(full_path)
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        cache_control = "no-cache"
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    
+    if etag_matches(etag, request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=headers)
+    
+    return FileResponse(full_path, headers=headers)
 
 if __name__ == "__main__":
     import uvicorn
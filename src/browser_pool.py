@@ -0,0 +1,309 @@
+import asyncio
+import dataclasses
+import logging
+import os
+import shutil
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+import psutil
+from browser_use import Browser, BrowserConfig
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+# Left out of the profile copies: locks and the port file of the running Chrome, and caches
+PROFILE_COPY_IGNORE = shutil.ignore_patterns(
+    "Singleton*", "DevToolsActivePort", "lockfile", "Cache", "Code Cache", "GPUCache",
+    "ShaderCache", "GrShaderCache", "Crashpad",
+)
+
+
+def python_rss_mb() -> float:
+    """Resident memory of the current Python process"""
+    return psutil.Process().memory_info().rss / (1024 * 1024)
+
+
+class BrowserRunStats(BaseModel):
+    """Latency and memory of one scrape run on a pooled browser"""
+    slot: int
+    warm: bool  # Whether the browser was already started when acquired
+    acquire_seconds: float = 0.0  # From acquire() to a ready browser
+    first_step_seconds: Optional[float] = None  # From acquire() to the first agent step
+    chrome_rss_before_mb: float = 0.0
+    chrome_rss_after_mb: float = 0.0
+    python_rss_before_mb: float = 0.0
+    python_rss_after_mb: float = 0.0
+
+
+class PooledBrowser:
+    """
+    One slot of the pool: its own Chrome process, started on a copy of the
+    logged-in profile, the browser_use Browser connected to it over CDP, and
+    usage counters. Slots share nothing, so concurrent runs never see each
+    other's tabs and a slot's memory is that of its own process tree.
+    """
+
+    def __init__(
+        self,
+        slot: int,
+        config: BrowserConfig,
+        user_data_dir: Optional[str] = None,
+        profiles_dir: Optional[str] = None,
+        start_timeout: float = 30.0,
+    ):
+        if not config.chrome_instance_path:
+            raise ValueError("Pooled browsers launch Chrome themselves: chrome_instance_path is required")
+        self.slot = slot
+        self.config = config
+        self.user_data_dir = os.path.expanduser(user_data_dir) if user_data_dir else None
+        self.profiles_dir = profiles_dir
+        self.start_timeout = start_timeout
+        self.browser: Optional[Browser] = None
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.profile_copy: Optional[str] = None
+        self.uses = 0
+        self.started = False
+        self.run: Optional[BrowserRunStats] = None
+        self.recycle_reason: Optional[str] = None  # Set during a run to recycle the browser on release
+        self._acquired_at = 0.0
+
+    def _copy_profile(self) -> str:
+        """Fresh copy of the logged-in profile: Chrome locks its user data dir to one process"""
+        if self.profiles_dir:
+            os.makedirs(self.profiles_dir, exist_ok=True)
+        copy = tempfile.mkdtemp(prefix=f"chrome-slot{self.slot}-", dir=self.profiles_dir)
+        if self.user_data_dir and os.path.isdir(self.user_data_dir):
+            shutil.copytree(self.user_data_dir, copy, ignore=PROFILE_COPY_IGNORE, dirs_exist_ok=True)
+        elif self.user_data_dir:
+            logger.warning(f"Chrome profile {self.user_data_dir} not found, browser slot {self.slot} starts logged out")
+        return copy
+
+    async def _launch(self) -> int:
+        """Start this slot's Chrome and return its debugging port, chosen by Chrome"""
+        self.profile_copy = await asyncio.to_thread(self._copy_profile)
+        self.process = await asyncio.create_subprocess_exec(
+            self.config.chrome_instance_path,
+            "--remote-debugging-port=0",
+            f"--user-data-dir={self.profile_copy}",
+            *self.config.extra_chromium_args,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        # Chrome writes the port it bound to the first line of DevToolsActivePort
+        port_file = os.path.join(self.profile_copy, "DevToolsActivePort")
+        deadline = time.monotonic() + self.start_timeout
+        while time.monotonic() < deadline:
+            if self.process.returncode is not None:
+                raise RuntimeError(f"Chrome of browser slot {self.slot} exited with code {self.process.returncode}")
+            try:
+                with open(port_file) as f:
+                    port = f.readline().strip()
+                if port:
+                    return int(port)
+            except FileNotFoundError:
+                pass
+            await asyncio.sleep(0.1)
+        raise RuntimeError(f"Chrome of browser slot {self.slot} did not start within {self.start_timeout:.0f}s")
+
+    async def start(self) -> None:
+        """Launch this slot's Chrome and connect to it so the next run starts warm"""
+        try:
+            port = await self._launch()
+            self.browser = Browser(config=dataclasses.replace(
+                self.config, chrome_instance_path=None, cdp_url=f"http://127.0.0.1:{port}",
+            ))
+            await self.browser.get_playwright_browser()
+        except Exception:
+            await self.close()
+            raise
+        self.started = True
+
+    def healthy(self) -> bool:
+        playwright_browser = self.browser.playwright_browser if self.browser is not None else None
+        return (
+            self.started
+            and self.process is not None and self.process.returncode is None
+            and playwright_browser is not None and playwright_browser.is_connected()
+        )
+
+    def chrome_rss_mb(self) -> float:
+        """Resident memory of this slot's Chrome: the browser process and its renderers, GPU and utilities"""
+        if self.process is None or self.process.returncode is not None:
+            return 0.0
+        try:
+            root = psutil.Process(self.process.pid)
+            processes = [root, *root.children(recursive=True)]
+        except psutil.NoSuchProcess:
+            return 0.0
+        total = 0
+        for process in processes:
+            try:
+                total += process.memory_info().rss
+            except psutil.NoSuchProcess:
+                pass
+        return total / (1024 * 1024)
+
+    def mark_step(self) -> None:
+        """Record the first agent step of the current run"""
+        if self.run is not None and self.run.first_step_seconds is None:
+            self.run.first_step_seconds = time.perf_counter() - self._acquired_at
+
+    async def close_extra_tabs(self) -> None:
+        """Close the tabs a run left open in this slot's Chrome, keeping the first one"""
+        playwright_browser = self.browser.playwright_browser if self.browser is not None else None
+        if playwright_browser is None or not playwright_browser.is_connected():
+            return
+        for context in playwright_browser.contexts:
+            for page in context.pages[1:]:
+                await page.close()
+
+    async def close(self) -> None:
+        """Disconnect, terminate this slot's Chrome and delete its profile copy"""
+        if self.browser is not None:
+            await self.browser.close()
+        if self.process is not None and self.process.returncode is None:
+            self.process.terminate()
+            try:
+                await asyncio.wait_for(self.process.wait(), timeout=10)
+            except asyncio.TimeoutError:
+                self.process.kill()
+                await self.process.wait()
+        if self.profile_copy is not None:
+            await asyncio.to_thread(shutil.rmtree, self.profile_copy, True)
+            self.profile_copy = None
+        self.started = False
+
+
+class BrowserPool:
+    """
+    Pool of pre-warmed browsers, each its own Chrome on a copy of the
+    logged-in profile (user_data_dir, copied under profiles_dir on every launch).
+    A browser is health-checked when acquired and recycled (its Chrome
+    terminated and relaunched) after max_uses runs or when its Chrome uses
+    more than max_chrome_rss_mb. close() tears every browser down, whatever
+    state the runs left it in.
+    """
+
+    def __init__(
+        self,
+        config: BrowserConfig,
+        size: int = 1,
+        max_uses: int = 20,
+        max_chrome_rss_mb: float = 1500,
+        user_data_dir: Optional[str] = None,
+        profiles_dir: Optional[str] = None,
+        start_timeout: float = 30.0,
+    ):
+        self.config = config
+        self.size = size
+        self.max_uses = max_uses
+        self.max_chrome_rss_mb = max_chrome_rss_mb
+        self.user_data_dir = user_data_dir
+        self.profiles_dir = profiles_dir
+        self.start_timeout = start_timeout
+        self.last_run: Optional[BrowserRunStats] = None
+        self._slots = [self._new_slot(slot) for slot in range(size)]
+        self._idle: asyncio.Queue[PooledBrowser] = asyncio.Queue()
+        for slot in self._slots:
+            self._idle.put_nowait(slot)
+
+    async def start(self) -> None:
+        """Warm every idle browser concurrently"""
+        async def warm(slot: PooledBrowser) -> None:
+            try:
+                await slot.start()
+            except Exception as e:
+                logger.error(f"Failed to warm browser slot {slot.slot}: {e}")
+
+        started = time.perf_counter()
+        await asyncio.gather(*(warm(slot) for slot in self._slots if not slot.started))
+        logger.info(f"Browser pool warmed {self.size} browser(s) in {time.perf_counter() - started:.2f}s")
+
+    def _new_slot(self, slot: int) -> PooledBrowser:
+        return PooledBrowser(
+            slot, self.config,
+            user_data_dir=self.user_data_dir, profiles_dir=self.profiles_dir, start_timeout=self.start_timeout,
+        )
+
+    async def _recycle(self, slot: PooledBrowser, reason: str) -> PooledBrowser:
+        """Terminate a slot's Chrome and replace it with a fresh one, started on next acquire"""
+        logger.info(f"Recycling browser slot {slot.slot}: {reason}")
+        try:
+            await slot.close()
+        except Exception as e:
+            logger.error(f"Error closing browser slot {slot.slot}: {e}")
+        fresh = self._new_slot(slot.slot)
+        self._slots[slot.slot] = fresh
+        return fresh
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[PooledBrowser]:
+        """Borrow a ready browser for one run"""
+        acquired_at = time.perf_counter()
+        slot = await self._idle.get()
+        try:
+            if slot.started and not slot.healthy():
+                slot = await self._recycle(slot, "failed health check")
+            warm = slot.started
+            if not slot.started:
+                await slot.start()
+
+            slot.uses += 1
+            slot._acquired_at = acquired_at
+            slot.run = BrowserRunStats(
+                slot=slot.slot,
+                warm=warm,
+                acquire_seconds=time.perf_counter() - acquired_at,
+                chrome_rss_before_mb=slot.chrome_rss_mb(),
+                python_rss_before_mb=python_rss_mb(),
+            )
+            yield slot
+        finally:
+            await self._release(slot)
+
+    async def _release(self, slot: PooledBrowser) -> None:
+        try:
+            chrome_rss = slot.chrome_rss_mb()
+            if slot.run is not None:
+                slot.run.chrome_rss_after_mb = chrome_rss
+                slot.run.python_rss_after_mb = python_rss_mb()
+                self.last_run = slot.run
+                logger.info(f"Browser run stats: {slot.run.model_dump()}")
+
+            if slot.recycle_reason:
+                slot = await self._recycle(slot, slot.recycle_reason)
+            elif slot.uses >= self.max_uses:
+                slot = await self._recycle(slot, f"reached {slot.uses} uses")
+            elif chrome_rss > self.max_chrome_rss_mb:
+                slot = await self._recycle(slot, f"Chrome uses {chrome_rss:.0f} MB")
+            elif slot.started and not slot.healthy():
+                slot = await self._recycle(slot, "disconnected during run")
+            else:
+                await slot.close_extra_tabs()
+        except Exception as e:
+            logger.error(f"Error releasing browser slot {slot.slot}: {e}")
+        finally:
+            slot.run = None
+            self._idle.put_nowait(slot)
+
+    async def close(self) -> None:
+        """Tear down every browser of the pool"""
+        for slot in self._slots:
+            try:
+                await slot.close()
+            except Exception as e:
+                logger.error(f"Error closing browser slot {slot.slot}: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "idle": self._idle.qsize(),
+            "slots": [
+                {"slot": slot.slot, "uses": slot.uses, "started": slot.started, "healthy": slot.healthy()}
+                for slot in self._slots
+            ],
+            "last_run": self.last_run.model_dump() if self.last_run else None,
+        }
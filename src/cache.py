@@ -0,0 +1,119 @@
+import asyncio
+import hashlib
+import json
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional
+
+from fastapi import Request, Response
+
+logger = logging.getLogger(__name__)
+
+
+class CachedResponse(NamedTuple):
+    version: int
+    etag: str
+    body: bytes
+
+
+def serialize(payload: Any) -> bytes:
+    """Compact JSON encoding of a response payload"""
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False, default=str).encode()
+
+
+def etag_matches(etag: str, if_none_match: Optional[str]) -> bool:
+    """Whether an If-None-Match header matches the given strong ETag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+
+
+class ResponseCache:
+    """
+    In-process cache of read endpoint responses.
+    A bounded LRU of pre-serialized JSON bodies keyed by endpoint and query
+    parameters. Every entry belongs to a resource ("posts", "history", ...)
+    whose version is bumped when the underlying data changes, which makes all
+    of its entries stale at once. ETags are derived from the body, so they stay
+    valid across API workers and restarts.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._versions: Dict[str, int] = {}
+        self._entries: "OrderedDict[tuple, CachedResponse]" = OrderedDict()
+        self._inflight: Dict[tuple, asyncio.Future] = {}
+
+    def invalidate(self, resource: str) -> None:
+        """Mark every cached response of a resource as stale"""
+        self._versions[resource] = self._versions.get(resource, 0) + 1
+
+    def _get(self, key: tuple, version: int) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.version != version:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _put(self, key: tuple, entry: CachedResponse) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def _produce(self, key: tuple, version: int, producer: Callable[[], Awaitable[Any]]) -> CachedResponse:
+        """Build a response once even if many requests miss at the same time"""
+        inflight = self._inflight.get((key, version))
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[(key, version)] = future
+        try:
+            body = serialize(await producer())
+            entry = CachedResponse(version, f'"{hashlib.blake2b(body, digest_size=12).hexdigest()}"', body)
+            # Captured before producing: if data changed meanwhile the entry is already stale
+            self._put(key, entry)
+            future.set_result(entry)
+            return entry
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Mark as retrieved when nobody else is waiting
+            raise
+        finally:
+            del self._inflight[(key, version)]
+
+    async def respond(
+        self,
+        request: Request,
+        resource: str,
+        producer: Callable[[], Awaitable[Any]],
+    ) -> Response:
+        """
+        Serve a cached response for the request, producing and caching it on a miss.
+        Answers If-None-Match with 304 Not Modified.
+        """
+        key = (request.url.path, tuple(sorted(request.query_params.multi_items())))
+        version = self._versions.get(resource, 0)
+
+        entry = self._get(key, version)
+        if entry is None:
+            self.misses += 1
+            entry = await self._produce(key, version, producer)
+        else:
+            self.hits += 1
+
+        headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+        if etag_matches(entry.etag, request.headers.get("if-none-match")):
+            return Response(status_code=304, headers=headers)
+        return Response(content=entry.body, media_type="application/json", headers=headers)
@@ -0,0 +1,140 @@
+import json
+import logging
+import sqlite3
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from pydantic import BaseModel
+
+if TYPE_CHECKING:
+    from src.database import Database
+
+logger = logging.getLogger(__name__)
+
+
+class Checkpoint(BaseModel):
+    """Progress of an agent run on a target, saved as the run goes"""
+    job_id: Optional[int] = None
+    posts: List[Dict[str, Any]] = []  # Posts recorded by the agent, in order
+    visited_urls: List[str] = []  # Post pages already opened
+    last_url: Optional[str] = None  # Last page the agent was on
+    step: int = 0
+    failures: int = 0  # Failed runs resumed from this checkpoint
+
+
+class RunCheckpoint:
+    """
+    Checkpoint of the current run. Every recorded post and visited post page
+    is persisted immediately, so a failed run loses at most its current step.
+    Without a store the checkpoint only lives in memory.
+    """
+
+    def __init__(self, state: Checkpoint, store: Optional["CheckpointStore"] = None, target_id: Optional[int] = None):
+        self.state = state
+        self.store = store
+        self.target_id = target_id
+
+    @property
+    def resumed(self) -> bool:
+        return bool(self.state.posts or self.state.last_url)
+
+    @property
+    def recorded_urls(self) -> List[str]:
+        return [post["url"] for post in self.state.posts]
+
+    async def _save(self) -> None:
+        if self.store is not None and self.target_id is not None:
+            await self.store.save(self.target_id, self.state)
+
+    async def record_post(self, post: Dict[str, Any]) -> bool:
+        """Add an extracted post. Returns False if it was already recorded"""
+        if post["url"] in self.recorded_urls:
+            return False
+        self.state.posts.append(post)
+        await self._save()
+        return True
+
+    async def visit(self, url: Optional[str], step: int) -> None:
+        """Record the agent's position after a step"""
+        self.state.step = step
+        if not url or url == self.state.last_url:
+            return
+        self.state.last_url = url
+        if "/p/" in url and url not in self.state.visited_urls:
+            self.state.visited_urls.append(url)
+        await self._save()
+
+    async def fail(self) -> int:
+        """Keep the checkpoint for a retry and count the failure"""
+        self.state.failures += 1
+        await self._save()
+        return self.state.failures
+
+    async def clear(self) -> None:
+        """Forget the checkpoint once the run succeeded"""
+        if self.store is not None and self.target_id is not None:
+            await self.store.clear(self.target_id)
+
+
+class CheckpointStore:
+    """Persistence of run checkpoints, one per target (the unit a retry resumes)"""
+
+    def __init__(self, db: "Database", ttl_hours: float = 24):
+        self.db = db
+        self.ttl = timedelta(hours=ttl_hours)
+        self.init_db()
+
+    def init_db(self) -> None:
+        """Create the checkpoints table"""
+        with self.db.get_connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS scrape_checkpoints (
+                    target_id INTEGER PRIMARY KEY,
+                    state TEXT NOT NULL,
+                    updated_at TIMESTAMP NOT NULL
+                )
+            """)
+            conn.commit()
+
+    async def open(self, target_id: int, job_id: int) -> RunCheckpoint:
+        """Checkpoint to resume for a target, or a fresh one (stale checkpoints are ignored)"""
+        def query(conn: sqlite3.Connection) -> Optional[sqlite3.Row]:
+            return conn.execute(
+                "SELECT state FROM scrape_checkpoints WHERE target_id = ? AND updated_at >= ?",
+                (target_id, datetime.now() - self.ttl)
+            ).fetchone()
+
+        row = await self.db.pool.read(query)
+        state = Checkpoint.model_validate_json(row['state']) if row else Checkpoint()
+        if row:
+            logger.info(
+                f"Resuming target {target_id} from job {state.job_id}: "
+                f"{len(state.posts)} post(s) recorded, last page {state.last_url}"
+            )
+        state.job_id = job_id
+        return RunCheckpoint(state, self, target_id)
+
+    async def save(self, target_id: int, state: Checkpoint) -> None:
+        def upsert(conn: sqlite3.Connection) -> None:
+            conn.execute("""
+                INSERT INTO scrape_checkpoints (target_id, state, updated_at) VALUES (?, ?, ?)
+                ON CONFLICT(target_id) DO UPDATE SET state = excluded.state, updated_at = excluded.updated_at
+            """, (target_id, state.model_dump_json(), datetime.now()))
+
+        await self.db.pool.write(upsert)
+
+    async def clear(self, target_id: int) -> None:
+        def delete(conn: sqlite3.Connection) -> None:
+            conn.execute("DELETE FROM scrape_checkpoints WHERE target_id = ?", (target_id,))
+
+        await self.db.pool.write(delete)
+
+    async def get(self, target_id: int) -> Optional[Dict[str, Any]]:
+        """Stored checkpoint of a target, for inspection"""
+        def query(conn: sqlite3.Connection) -> Optional[sqlite3.Row]:
+            return conn.execute(
+                "SELECT state, updated_at FROM scrape_checkpoints WHERE target_id = ?", (target_id,)
+            ).fetchone()
+
+        row = await self.db.pool.read(query)
+        return {**json.loads(row['state']), "updated_at": row['updated_at']} if row else None
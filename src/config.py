@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Optional
 import os
 
 class Settings:
@@ -12,6 +12,10 @@ class Settings:
     # API Settings
     API_HOST: str = "0.0.0.0"
     API_PORT: int = 8000
+    MAX_PAGE_SIZE: int = 100  # Upper bound for the limit parameter of paginated endpoints
+    RESPONSE_CACHE_SIZE: int = 256  # Cached read responses (LRU)
+    EVENTS_QUEUE_SIZE: int = 100  # Pending events per /events subscriber before it is dropped
+    DATA_VERSION_POLL_SECONDS: float = 1.0  # How often a worker checks for changes made by the other API workers
     
     # Paths
     STATIC_DIR: str = "static"
@@ -19,10 +23,67 @@ class Settings:
     
     # Database
     DB_PATH: str = "instagram_posts.db"
+    POST_RETENTION_DAYS: int = 30  # Posts not seen for this long are deleted
+    DB_READERS: int = 4  # Reader threads (each with its own connection)
+    DB_MMAP_SIZE: int = 256 * 1024 * 1024  # Bytes of the database file memory-mapped
+    DB_CACHE_SIZE_KB: int = 64 * 1024  # Page cache per connection
+    
+    # Image ingestion Settings
+    IMAGE_CONCURRENCY: int = 8  # Max concurrent downloads (and pooled connections)
+    IMAGE_PER_HOST_LIMIT: int = 4  # Max concurrent connections per CDN host
+    IMAGE_RETRIES: int = 3
+    IMAGE_BACKOFF_BASE: float = 0.5  # Seconds, doubled on each retry
+    IMAGE_TIMEOUT: float = 30.0  # Seconds per download
+    IMAGE_FORMAT: str = "WEBP"  # PNG, WEBP, AVIF or JPEG
+    IMAGE_QUALITY: int = 80  # Encoder quality for WEBP, AVIF and JPEG
+    TRANSCODE_WORKERS: int = 2  # Processes used to decode/encode images
+    THUMBNAIL_SIZES: List[int] = [320, 640, 1080]  # Thumbnail widths generated on ingest
+    IMAGE_GC_GRACE_MINUTES: int = 60  # Unreferenced images younger than this are kept
+    IMAGE_NEAR_DUPLICATE_DISTANCE: Optional[int] = 24  # Max differing dHash bits (of 256) of a near-duplicate candidate, confirmed by the grid check; None to disable
+    IMAGE_NEAR_DUPLICATE_MAX_DIFFERENCE: int = 10  # Max gray level difference of a 32x32 cell to share a stored image
+    
+    # Browser pool Settings
+    BROWSER_POOL_SIZE: int = 1  # Pre-warmed browsers, one Chrome each (at least MAX_CONCURRENT_JOBS)
+    BROWSER_MAX_USES: int = 20  # Runs before a browser is recycled
+    BROWSER_MAX_CHROME_RSS_MB: float = 1500  # Recycle a browser when its Chrome uses more (container shm is 2 GB)
+    BROWSER_USER_DATA_DIR: Optional[str] = "~/.config/google-chrome"  # Logged-in profile copied for each pooled Chrome (None: fresh profile)
+    BROWSER_PROFILES_DIR: Optional[str] = None  # Where the profile copies go (None: the system temp dir)
+    BROWSER_START_TIMEOUT: float = 30  # Seconds for a pooled Chrome to open its debugging port
+    
+    # Agent memory bounds (the container has a 2 GB shm)
+    AGENT_SCREENSHOT_MAX_SIDE: int = 1024  # Screenshots are downscaled to fit (pixels, 0 to keep them as taken)
+    AGENT_KEEP_SCREENSHOTS: int = 3  # Last screenshots kept in the agent history
+    AGENT_SCREENSHOT_DIR: Optional[str] = None  # Older screenshots are written there, or dropped when None
+    AGENT_MAX_INPUT_TOKENS: int = 64000  # Message history kept for the LLM
+    AGENT_MEMORY_SAMPLE_SECONDS: float = 2.0  # Chrome and Python RSS sampling period
+    AGENT_RECYCLE_TAB_CHROME_MB: float = 1200  # Reopen the agent's tab when the run's Chrome uses more
+    AGENT_ABORT_RSS_MB: float = 1800  # Stop the run (and recycle its browser) when its Chrome uses more
     
     # Scraping Settings
-    SCRAPE_INTERVAL_DAYS: int = 3
-    SCRAPE_START_HOUR: int = 9
+    MAX_CONCURRENT_JOBS: int = 1  # Scrape jobs (agents) running at the same time, per job runner
+    JOB_RUNNER_MODE: str = "in_process"  # "in_process" (inside each API worker) or "standalone" (python -m src.worker)
+    FAST_PATH_ENABLED: bool = True  # Read posts from the profile page before falling back to the agent
+    FAST_PATH_MODEL: str = "gpt-4o-mini"  # Text-only model selecting the extracted posts
+    FAST_PATH_MAX_CANDIDATES: int = 12  # Most recent posts sent to the selection call
+    FAST_PATH_TIMEOUT: float = 30.0  # Seconds to load the profile page
+    JOB_LEASE_SECONDS: float = 60  # A running job whose lease is not renewed for this long is reclaimed
+    JOB_HEARTBEAT_SECONDS: float = 15  # Lease renewal period (well under JOB_LEASE_SECONDS)
+    JOB_MAX_ATTEMPTS: int = 3  # Runs of a job reclaimed from dead workers before it is failed
+    CHECKPOINT_TTL_HOURS: float = 24  # Older checkpoints are not resumed
+    CHECKPOINT_MAX_RETRIES: int = 2  # Automatic retries of a failed job that made progress
+    SUMMARY_BACKEND: str = "openai"  # "openai", or "stub" to run offline
+    SUMMARY_MODEL: str = "gpt-4o-mini"
+    SUMMARY_BATCH_SIZE: int = 10  # Posts summarized per LLM request
+    SCRAPE_INTERVAL_DAYS: int = 3  # Initial interval between runs of a target
+    SCRAPE_START_HOUR: int = 9  # Scheduled runs start within [START_HOUR, END_HOUR)
     SCRAPE_END_HOUR: int = 17
 
+    # Scheduler
+    SCHEDULER_MODE: str = "in_process"  # "in_process" (inside the API), "standalone" (python -m src.scheduler) or "off"
+    SCHEDULE_PERSIST: bool = True  # Keep the adapted intervals in the database across restarts
+    SCHEDULE_MIN_INTERVAL_HOURS: float = 12  # Interval floor for targets posting often (and retry delay after a failure)
+    SCHEDULE_MAX_INTERVAL_HOURS: float = 144  # Interval ceiling for quiet targets
+    SCHEDULE_JITTER: float = 0.1  # Random fraction of the interval added or removed
+    SCHEDULE_TICK_SECONDS: float = 60
+
 settings = Settings() 
\ No newline at end of file
@@ -1,30 +1,151 @@
 import sqlite3
-from datetime import datetime
+import base64
+import json
+from datetime import datetime, timedelta
 from contextlib import contextmanager
-from typing import List, Optional
-from src.scrapper import InstagramPost, InstagramPosts
-import aiohttp
-import asyncio
-from PIL import Image
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+from src.models import InstagramPosts
+from src.images import ImageIngestor, IngestStats
+from src.image_store import ImageStore, url_key
+from src.phash import NearDuplicateIndex, from_hex, to_hex
+from src.transcode import Transcoder
+from src.sqlite_pool import SQLitePool
+from src.config import settings
+from pydantic import BaseModel
 import os
-import io
-import hashlib
 import logging
 
 logger = logging.getLogger(__name__)
 
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded"""
+
+def encode_cursor(*values) -> str:
+    """Opaque keyset pagination cursor from the sort key of the last returned row"""
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, size: int) -> list:
+    """Decode a cursor produced by encode_cursor"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidCursor(f"Invalid cursor: {cursor}")
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor(f"Invalid cursor: {cursor}")
+    return values
+
+def fts_query(text: str) -> str:
+    """
+    Turn free text into a safe FTS5 query: every term is quoted (so FTS5
+    syntax in user input is matched literally) and the last one is a prefix
+    """
+    terms = ['"' + term.replace('"', '""') + '"' for term in text.split()]
+    if terms:
+        terms[-1] += "*"
+    return " ".join(terms)
+
+def _local_naive(value: Optional[datetime]) -> Optional[datetime]:
+    """Stored timestamps are naive local times; align filter values with them"""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone().replace(tzinfo=None)
+    return value
+
+class SaveResult(BaseModel):
+    """Outcome of an incremental save_posts call"""
+    new_posts: int = 0
+    unchanged_posts: int = 0
+    pruned_posts: int = 0
+    deleted_images: int = 0
+    duplicate_posts: int = 0  # New posts flagged as near-duplicates of a stored post
+    images: IngestStats = IngestStats()
+
+    def add(self, other: "SaveResult") -> None:
+        """Accumulate the result of another save of the same run"""
+        self.new_posts += other.new_posts
+        self.unchanged_posts += other.unchanged_posts
+        self.pruned_posts += other.pruned_posts
+        self.deleted_images += other.deleted_images
+        self.duplicate_posts += other.duplicate_posts
+        for field in ("total", "reused", "near_duplicates", "succeeded", "failed", "retries", "wall_seconds", "sum_seconds"):
+            setattr(self.images, field, getattr(self.images, field) + getattr(other.images, field))
+        self.images.slowest_seconds = max(self.images.slowest_seconds, other.images.slowest_seconds)
+
 class Database:
     def __init__(self, db_path: str = "instagram_posts.db", images_dir: str = "static/images"):
         self.db_path = db_path
         self.images_dir = images_dir
         os.makedirs(self.images_dir, exist_ok=True)
+        transcoder = Transcoder(
+            fmt=settings.IMAGE_FORMAT,
+            quality=settings.IMAGE_QUALITY,
+            workers=settings.TRANSCODE_WORKERS,
+        )
+        self.image_store = ImageStore(
+            root_dir=self.images_dir,
+            extension=transcoder.extension,
+            thumbnail_sizes=settings.THUMBNAIL_SIZES,
+        )
+        self.image_ingestor = ImageIngestor(
+            store=self.image_store,
+            transcoder=transcoder,
+            concurrency=settings.IMAGE_CONCURRENCY,
+            per_host_limit=settings.IMAGE_PER_HOST_LIMIT,
+            retries=settings.IMAGE_RETRIES,
+            backoff_base=settings.IMAGE_BACKOFF_BASE,
+            timeout=settings.IMAGE_TIMEOUT,
+            near_duplicates=(
+                NearDuplicateIndex(settings.IMAGE_NEAR_DUPLICATE_DISTANCE, settings.IMAGE_NEAR_DUPLICATE_MAX_DIFFERENCE)
+                if settings.IMAGE_NEAR_DUPLICATE_DISTANCE is not None else None
+            ),
+        )
+        self.pool = SQLitePool(
+            db_path=self.db_path,
+            readers=settings.DB_READERS,
+            mmap_size=settings.DB_MMAP_SIZE,
+            cache_size_kb=settings.DB_CACHE_SIZE_KB,
+        )
+        self._listeners: List[Callable[[str, Any], None]] = []
+        self._data_versions: Optional[Dict[str, int]] = None
         self.init_db()
     
+    def add_listener(self, callback: Callable[[str, Any], None]) -> None:
+        """
+        Register a callback invoked after each write with the changed resource
+        ("posts", "history", "jobs") and a payload (the newly inserted posts for "posts")
+        """
+        self._listeners.append(callback)
+    
+    def notify(self, resource: str, payload: Any = None) -> None:
+        for callback in self._listeners:
+            try:
+                callback(resource, payload)
+            except Exception as e:
+                logger.error(f"Error in database listener for {resource}: {e}")
+    
+    async def poll_changes(self) -> List[str]:
+        """
+        Notify the resources changed since the last poll, by this process or another
+        one sharing the database. The first poll only records the current versions.
+        """
+        def query(conn: sqlite3.Connection) -> Dict[str, int]:
+            return dict(conn.execute("SELECT resource, version FROM data_versions").fetchall())
+
+        versions = await self.pool.read(query)
+        changed = []
+        if self._data_versions is not None:
+            changed = [resource for resource, version in versions.items() if self._data_versions.get(resource) != version]
+        self._data_versions = versions
+        for resource in changed:
+            self.notify(resource)
+        return changed
+    
     @contextmanager
     def get_connection(self):
-        """Context manager for database connections"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row  # This enables column access by name
+        """
+        Context manager for a standalone tuned connection.
+        Only meant for setup and scripts; the API goes through the async pool.
+        """
+        conn = self.pool.connect()
         try:
             yield conn
         finally:
@@ -48,6 +169,64 @@ class Database:
                     last_seen TIMESTAMP NOT NULL
                 )
             """)
+            self._add_column_if_missing(cursor, "posts", "content_hash", "TEXT")
+            self._add_column_if_missing(cursor, "posts", "account", "TEXT")
+            self._add_column_if_missing(cursor, "posts", "image_phash", "TEXT")
+            # URL of the earlier post of the account with the same (or a near-duplicate) image
+            self._add_column_if_missing(cursor, "posts", "duplicate_of", "TEXT")
+            
+            # Create image_urls table: stable URL key -> stored image content
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS image_urls (
+                    url_key TEXT PRIMARY KEY,
+                    content_hash TEXT NOT NULL,
+                    first_seen TIMESTAMP NOT NULL
+                )
+            """)
+            
+            # Create images table: reference count of posts using each stored content
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS images (
+                    content_hash TEXT PRIMARY KEY,
+                    refcount INTEGER NOT NULL DEFAULT 0,
+                    created_at TIMESTAMP NOT NULL
+                )
+            """)
+            self._add_column_if_missing(cursor, "images", "phash", "TEXT")
+            
+            # Keep reference counts in sync with posts, whatever removes or rewrites them
+            cursor.executescript("""
+                CREATE TRIGGER IF NOT EXISTS posts_image_ref AFTER INSERT ON posts
+                WHEN NEW.content_hash IS NOT NULL
+                BEGIN
+                    INSERT INTO images (content_hash, refcount, created_at)
+                    VALUES (NEW.content_hash, 1, datetime('now', 'localtime'))
+                    ON CONFLICT(content_hash) DO UPDATE SET refcount = refcount + 1;
+                END;
+                
+                CREATE TRIGGER IF NOT EXISTS posts_image_unref AFTER DELETE ON posts
+                WHEN OLD.content_hash IS NOT NULL
+                BEGIN
+                    UPDATE images SET refcount = refcount - 1 WHERE content_hash = OLD.content_hash;
+                END;
+                
+                CREATE TRIGGER IF NOT EXISTS posts_image_reref AFTER UPDATE OF content_hash ON posts
+                WHEN OLD.content_hash IS NOT NEW.content_hash
+                BEGIN
+                    UPDATE images SET refcount = refcount - 1 WHERE content_hash = OLD.content_hash;
+                    INSERT INTO images (content_hash, refcount, created_at)
+                    VALUES (NEW.content_hash, 1, datetime('now', 'localtime'))
+                    ON CONFLICT(content_hash) DO UPDATE SET refcount = refcount + 1;
+                END;
+            """)
+            
+            # Backfill reference counts for posts saved before the images table existed
+            cursor.execute("""
+                INSERT OR IGNORE INTO images (content_hash, refcount, created_at)
+                SELECT content_hash, COUNT(*), datetime('now', 'localtime')
+                FROM posts WHERE content_hash IS NOT NULL
+                GROUP BY content_hash
+            """)
             
             # Create scraping_history table
             cursor.execute("""
@@ -58,148 +237,552 @@ class Database:
                     error_message TEXT
                 )
             """)
+            self._add_column_if_missing(cursor, "scraping_history", "job_id", "INTEGER")
+            
+            # Indexes backing the keyset pagination and filters of /posts and /history
+            cursor.executescript("""
+                CREATE INDEX IF NOT EXISTS idx_posts_last_seen ON posts (last_seen DESC, id DESC);
+                CREATE INDEX IF NOT EXISTS idx_posts_account_last_seen ON posts (account, last_seen DESC, id DESC);
+                CREATE INDEX IF NOT EXISTS idx_history_timestamp ON scraping_history (timestamp DESC, id DESC);
+                CREATE INDEX IF NOT EXISTS idx_history_status_timestamp ON scraping_history (status, timestamp DESC, id DESC);
+                CREATE INDEX IF NOT EXISTS idx_posts_content_hash ON posts (content_hash);
+                CREATE INDEX IF NOT EXISTS idx_posts_duplicate_of ON posts (duplicate_of) WHERE duplicate_of IS NOT NULL;
+                
+                -- Duplicates of a deleted post are shown again
+                CREATE TRIGGER IF NOT EXISTS posts_duplicate_release AFTER DELETE ON posts BEGIN
+                    UPDATE posts SET duplicate_of = NULL WHERE duplicate_of = OLD.url;
+                END;
+            """)
+            
+            # Per-resource change counters, bumped by triggers whatever process writes,
+            # so API workers notice changes made by the others (see poll_changes)
+            cursor.executescript("""
+                CREATE TABLE IF NOT EXISTS data_versions (
+                    resource TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL DEFAULT 0
+                );
+                INSERT OR IGNORE INTO data_versions (resource) VALUES ('posts'), ('history'), ('jobs');
+                
+                CREATE TRIGGER IF NOT EXISTS posts_version_insert AFTER INSERT ON posts BEGIN
+                    UPDATE data_versions SET version = version + 1 WHERE resource = 'posts';
+                END;
+                
+                CREATE TRIGGER IF NOT EXISTS posts_version_update AFTER UPDATE ON posts BEGIN
+                    UPDATE data_versions SET version = version + 1 WHERE resource = 'posts';
+                END;
+                
+                CREATE TRIGGER IF NOT EXISTS posts_version_delete AFTER DELETE ON posts BEGIN
+                    UPDATE data_versions SET version = version + 1 WHERE resource = 'posts';
+                END;
+                
+                CREATE TRIGGER IF NOT EXISTS history_version_insert AFTER INSERT ON scraping_history BEGIN
+                    UPDATE data_versions SET version = version + 1 WHERE resource = 'history';
+                END;
+            """)
+            
+            # Full-text index over post titles and descriptions, kept in sync by triggers
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'posts_fts'")
+            fts_exists = cursor.fetchone() is not None
+            cursor.executescript("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5(
+                    title, description,
+                    content='posts', content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2'
+                );
+                
+                CREATE TRIGGER IF NOT EXISTS posts_fts_insert AFTER INSERT ON posts BEGIN
+                    INSERT INTO posts_fts (rowid, title, description) VALUES (NEW.id, NEW.title, NEW.description);
+                END;
+                
+                CREATE TRIGGER IF NOT EXISTS posts_fts_delete AFTER DELETE ON posts BEGIN
+                    INSERT INTO posts_fts (posts_fts, rowid, title, description) VALUES ('delete', OLD.id, OLD.title, OLD.description);
+                END;
+                
+                CREATE TRIGGER IF NOT EXISTS posts_fts_update AFTER UPDATE OF title, description ON posts BEGIN
+                    INSERT INTO posts_fts (posts_fts, rowid, title, description) VALUES ('delete', OLD.id, OLD.title, OLD.description);
+                    INSERT INTO posts_fts (rowid, title, description) VALUES (NEW.id, NEW.title, NEW.description);
+                END;
+            """)
+            if not fts_exists:
+                # Index posts saved before the full-text index existed
+                cursor.execute("INSERT INTO posts_fts (posts_fts) VALUES ('rebuild')")
             
             conn.commit()
 
-    async def download_and_convert_image(self, image_url: str) -> Optional[str]:
+    @staticmethod
+    def _add_column_if_missing(cursor: sqlite3.Cursor, table: str, column: str, definition: str) -> None:
+        """Add a column to an existing table (databases created by older versions)"""
+        cursor.execute(f"PRAGMA table_info({table})")
+        if column not in {row[1] for row in cursor.fetchall()}:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+    async def resolve_images(self, image_urls: List[str]) -> tuple[List[Optional[str]], IngestStats]:
         """
-        Download image from URL and convert it to PNG
-        Returns the local path to the saved image
+        Map image URLs to stored content hashes.
+        URLs already in the index (and still on disk) are never fetched again;
+        the others are ingested concurrently and added to the index.
+        Only content referenced by a post is reused: unreferenced content may
+        be deleted by collect_garbage() before the posts are saved.
         """
-        try:
-            # Create a unique filename based on the URL
-            filename = hashlib.md5(image_url.encode()).hexdigest() + ".png"
-            local_path = os.path.join(self.images_dir, filename)
-            
-            # If file already exists, return its path
-            if os.path.exists(local_path):
-                return local_path
-            
-            # Headers to mimic a browser request
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-                "Accept": "image/avif,image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8",
-                "Accept-Language": "en-US,en;q=0.9",
-                "Referer": "https://www.instagram.com/",
-                "Sec-Fetch-Dest": "image",
-                "Sec-Fetch-Mode": "no-cors",
-                "Sec-Fetch-Site": "same-site",
+        keys = [url_key(image_url) for image_url in image_urls]
+        
+        def lookup(conn: sqlite3.Connection) -> dict:
+            cursor = conn.execute(f"""
+                SELECT u.url_key, u.content_hash FROM image_urls u
+                JOIN images i ON i.content_hash = u.content_hash
+                WHERE u.url_key IN ({','.join('?' * len(keys))}) AND i.refcount > 0
+            """, keys)
+            return {
+                row['url_key']: row['content_hash']
+                for row in cursor.fetchall()
+                if self.image_store.exists(row['content_hash'])
             }
+        
+        known = await self.pool.read(lookup)
+        
+        missing = [image_url for image_url, key in zip(image_urls, keys) if key not in known]
+        if missing and self.image_ingestor.near_duplicates is not None:
+            await self._load_image_hashes(self.image_ingestor.near_duplicates)
+        digests, stats = await self.image_ingestor.ingest_batch(missing)
+        stats.reused = len(set(keys) & known.keys())
+        
+        fetched = {url_key(image_url): digest for image_url, digest in zip(missing, digests) if digest}
+        
+        def record(conn: sqlite3.Connection) -> None:
+            current_time = datetime.now()
+            conn.executemany(
+                "INSERT OR REPLACE INTO image_urls (url_key, content_hash, first_seen) VALUES (?, ?, ?)",
+                [(key, digest, current_time) for key, digest in fetched.items()]
+            )
+            # Track new content right away so it is collected even if no post ends up using it;
+            # unreferenced content ingested again gets a new grace period before collection
+            conn.executemany("""
+                INSERT INTO images (content_hash, refcount, created_at, phash) VALUES (?, 0, ?, ?)
+                ON CONFLICT(content_hash) DO UPDATE SET
+                    phash = COALESCE(images.phash, excluded.phash),
+                    created_at = CASE WHEN images.refcount <= 0 THEN excluded.created_at ELSE images.created_at END
+            """, [(digest, current_time, self._phash_of(digest)) for digest in set(fetched.values())])
+        
+        if fetched:
+            await self.pool.write(record)
+        
+        known.update(fetched)
+        return [known.get(key) for key in keys], stats
+
+    def _phash_of(self, digest: str) -> Optional[str]:
+        index = self.image_ingestor.near_duplicates
+        phash = index.hashes.get(digest) if index is not None else None
+        return to_hex(phash) if phash is not None else None
+    
+    async def _load_image_hashes(self, index: NearDuplicateIndex) -> None:
+        """Add the perceptual hashes stored since the last load (by any process) to the index"""
+        def query(conn: sqlite3.Connection) -> List[sqlite3.Row]:
+            return conn.execute(
+                "SELECT rowid, content_hash, phash FROM images WHERE rowid > ? AND phash IS NOT NULL ORDER BY rowid",
+                (index.loaded_rowid,)
+            ).fetchall()
+        
+        rows = await self.pool.read(query)
+        index.update((row['content_hash'], from_hex(row['phash'])) for row in rows)
+        if rows:
+            index.loaded_rowid = rows[-1]['rowid']
+    
+    async def backfill_image_hashes(self, batch_size: int = 100) -> int:
+        """
+        Compute the perceptual hash of images stored before hashes existed,
+        from their stored file, copy it to their posts and add it to the
+        near-duplicate index (its rows are older than the index's last load).
+        Returns the number of images hashed.
+        """
+        def query(conn: sqlite3.Connection) -> List[str]:
+            return [row['content_hash'] for row in conn.execute("SELECT content_hash FROM images WHERE phash IS NULL")]
+        
+        digests = [digest for digest in await self.pool.read(query) if self.image_store.exists(digest)]
+        hashed = 0
+        for start in range(0, len(digests), batch_size):
+            batch = digests[start:start + batch_size]
+            hashes = []
+            for digest in batch:
+                try:
+                    hashes.append((to_hex(await self.image_ingestor.transcoder.perceptual_hash_file(
+                        os.path.abspath(self.image_store.path_for(digest))
+                    )), digest))
+                except Exception as e:
+                    logger.warning(f"Failed to hash stored image {digest}: {e}")
             
-            async with aiohttp.ClientSession() as session:
-                async with session.get(image_url, headers=headers, allow_redirects=True) as response:
-                    if response.status != 200:
-                        logger.error(f"Failed to download image: {response.status} - {image_url}")
-                        return None
-                    
-                    image_data = await response.read()
-                    
-                    # Convert to PNG using PIL
-                    image = Image.open(io.BytesIO(image_data))
-                    image = image.convert('RGBA')  # Ensure consistent format
-                    image.save(local_path, 'PNG', optimize=True)
-                    
-                    logger.info(f"Successfully downloaded and converted image: {local_path}")
-                    return local_path
-        except Exception as e:
-            logger.error(f"Error downloading/converting image: {e} - URL: {image_url}")
-            return None
-    
-    def cleanup_old_images(self):
-        """
-        Delete all images in the images directory that are not referenced in the database
+            def update(conn: sqlite3.Connection) -> None:
+                conn.executemany("UPDATE images SET phash = ? WHERE content_hash = ? AND phash IS NULL", hashes)
+                conn.executemany("UPDATE posts SET image_phash = ? WHERE content_hash = ? AND image_phash IS NULL", hashes)
+            
+            await self.pool.write(update)
+            hashed += len(hashes)
+            # Read each time: garbage collection replaces the index
+            index = self.image_ingestor.near_duplicates
+            if index is not None:
+                index.update((digest, from_hex(phash)) for phash, digest in hashes)
+        if hashed:
+            logger.info(f"Computed the perceptual hash of {hashed} stored image(s)")
+        return hashed
+    
+    async def download_and_convert_image(self, image_url: str) -> Optional[str]:
         """
-        try:
-            # Get all image paths from database
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT local_image_path FROM posts")
-                db_images = {row['local_image_path'] for row in cursor.fetchall() if row['local_image_path']}
+        Download image from URL and transcode it to the configured format
+        Returns the local path to the saved image
+        """
+        (digest,), _ = await self.resolve_images([image_url])
+        return self.image_store.path_for(digest) if digest else None
+    
+    async def close(self) -> None:
+        """Release resources held by the database (HTTP session, transcoding workers, connections)"""
+        await self.image_ingestor.close()
+        self.pool.close()
+    
+    async def collect_garbage(self) -> int:
+        """
+        Delete images no post references anymore, using the reference counts
+        instead of scanning the images directory.
+        Unreferenced content younger than IMAGE_GC_GRACE_MINUTES is kept, as a
+        save may still be about to reference it.
+        Returns the number of deleted images.
+        """
+        cutoff = datetime.now() - timedelta(minutes=settings.IMAGE_GC_GRACE_MINUTES)
+        
+        def collect(conn: sqlite3.Connection) -> int:
+            cursor = conn.execute(
+                "SELECT content_hash FROM images WHERE refcount <= 0 AND created_at < ?",
+                (cutoff,)
+            )
+            unused = [row['content_hash'] for row in cursor.fetchall()]
+            
+            for digest in unused:
+                self.image_store.delete(digest)
+                logger.info(f"Deleted unused image: {self.image_store.path_for(digest)}")
+            
+            # Forget the content and the URLs pointing to it
+            conn.executemany("DELETE FROM images WHERE content_hash = ? AND refcount <= 0", [(d,) for d in unused])
+            conn.executemany("DELETE FROM image_urls WHERE content_hash = ?", [(d,) for d in unused])
+            return len(unused)
+        
+        deleted = await self.pool.write(collect)
+        if deleted and self.image_ingestor.near_duplicates is not None:
+            # Rebuilt on the next load, without the deleted content
+            index = self.image_ingestor.near_duplicates
+            self.image_ingestor.near_duplicates = NearDuplicateIndex(index.max_distance, index.max_difference)
+        return deleted
 
-            # Get all files in the images directory
-            for filename in os.listdir(self.images_dir):
-                file_path = os.path.join(self.images_dir, filename)
-                if file_path not in db_images:
-                    os.remove(file_path)
-                    logger.info(f"Deleted unused image: {file_path}")
-        except Exception as e:
-            logger.error(f"Error cleaning up old images: {e}")
+    async def prune_posts(self, older_than: datetime) -> int:
+        """
+        Delete posts not seen since older_than
+        Returns the number of deleted posts
+        """
+        def prune(conn: sqlite3.Connection) -> int:
+            return conn.execute("DELETE FROM posts WHERE last_seen < ?", (older_than,)).rowcount
+        
+        return await self.pool.write(prune)
 
-    async def save_posts(self, posts: InstagramPosts) -> None:
+    async def save_posts(self, posts: InstagramPosts, account: Optional[str] = None, prune: bool = True) -> SaveResult:
         """
-        Save or update posts in the database and handle images.
-        Previous posts and unused images will be deleted before saving new ones.
+        Incrementally save posts of an account in the database and handle images.
+        Known posts only get their last_seen bumped; only new posts (or posts
+        whose image previously failed) trigger image downloads. Posts not seen
+        for POST_RETENTION_DAYS are pruned and their unreferenced images deleted,
+        unless prune is False (posts streamed during a run, pruned once at its end).
         """
         current_time = datetime.now()
+        result = SaveResult()
         
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            
-            # Delete all previous posts
-            cursor.execute("DELETE FROM posts")
-            conn.commit()
-
-            # Clean up old images before downloading new ones
-            self.cleanup_old_images()
-            
-            for post in posts.posts:
-                # Download and convert image
-                local_image_path = await self.download_and_convert_image(post.image_url)
-                
-                # Insert new post
-                cursor.execute("""
-                    INSERT INTO posts (url, image_url, local_image_path, title, description, first_seen, last_seen)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                """, (
+        # Diff the batch against stored posts
+        urls = [post.url for post in posts.posts]
+        
+        def diff(conn: sqlite3.Connection) -> dict:
+            cursor = conn.execute(
+                f"SELECT url, content_hash FROM posts WHERE url IN ({','.join('?' * len(urls))})",
+                urls
+            )
+            return {row['url']: row['content_hash'] for row in cursor.fetchall()}
+        
+        existing = await self.pool.read(diff)
+        
+        to_fetch = [post for post in posts.posts if existing.get(post.url) is None]
+        result.new_posts = sum(1 for post in posts.posts if post.url not in existing)
+        result.unchanged_posts = len(posts.posts) - result.new_posts
+        
+        # Download images of new posts only
+        digests, result.images = await self.resolve_images([post.image_url for post in to_fetch])
+        fetched = {post.url: digest for post, digest in zip(to_fetch, digests)}
+        
+        def upsert(conn: sqlite3.Connection) -> None:
+            # New posts are inserted, known posts only have last_seen bumped
+            # (and their image filled in if it previously failed)
+            conn.executemany("""
+                INSERT INTO posts (url, image_url, local_image_path, content_hash, image_phash, title, description, account, first_seen, last_seen)
+                VALUES (?, ?, ?, ?, (SELECT phash FROM images WHERE content_hash = ?), ?, ?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    last_seen = excluded.last_seen,
+                    account = COALESCE(posts.account, excluded.account),
+                    local_image_path = COALESCE(posts.local_image_path, excluded.local_image_path),
+                    content_hash = COALESCE(posts.content_hash, excluded.content_hash),
+                    image_phash = COALESCE(posts.image_phash, excluded.image_phash)
+            """, [
+                (
                     post.url,
                     post.image_url,
-                    local_image_path,
+                    self.image_store.path_for(fetched[post.url]) if fetched.get(post.url) else None,
+                    fetched.get(post.url),
+                    fetched.get(post.url),
                     post.title,
                     post.description,
+                    account,
                     current_time,
                     current_time
-                ))
+                )
+                for post in posts.posts
+            ])
             
-            conn.commit()
+            # Posts whose image was just stored (or shared with a near-duplicate) are flagged
+            # as duplicates of the account's earliest post with the same image
+            images_set = [post.url for post in to_fetch if fetched.get(post.url)]
+            placeholders = ','.join('?' * len(images_set))
+            if images_set:
+                conn.execute(f"""
+                    UPDATE posts SET duplicate_of = (
+                        SELECT original.url FROM posts AS original
+                        WHERE original.content_hash = posts.content_hash AND original.account IS posts.account
+                          AND original.id < posts.id AND original.duplicate_of IS NULL
+                        ORDER BY original.id LIMIT 1
+                    )
+                    WHERE url IN ({placeholders}) AND duplicate_of IS NULL
+                """, images_set)
+                result.duplicate_posts = conn.execute(
+                    f"SELECT COUNT(*) FROM posts WHERE url IN ({placeholders}) AND duplicate_of IS NOT NULL", images_set
+                ).fetchone()[0]
+            
+            # A duplicate seen again keeps its original as recent
+            conn.execute(f"""
+                UPDATE posts SET last_seen = ?
+                WHERE url IN (SELECT duplicate_of FROM posts WHERE url IN ({','.join('?' * len(urls))}) AND duplicate_of IS NOT NULL)
+            """, (current_time, *urls))
+        
+        await self.pool.write(upsert)
+        new_urls = [post.url for post in posts.posts if post.url not in existing]
+        new_posts = await self.get_posts_by_url(new_urls) if new_urls else []
+        
+        if prune:
+            result.pruned_posts = await self.prune_posts(current_time - timedelta(days=settings.POST_RETENTION_DAYS))
+            result.deleted_images = await self.collect_garbage()
+        self.notify("posts", new_posts)
+        
+        logger.info(
+            f"Saved posts: {result.new_posts} new, {result.unchanged_posts} unchanged, "
+            f"{result.pruned_posts} pruned, {result.deleted_images} images deleted, "
+            f"{result.duplicate_posts} duplicates"
+        )
+        return result
     
-    def log_scraping(self, status: str, error_message: Optional[str] = None) -> None:
+    async def log_scraping(self, status: str, error_message: Optional[str] = None, job_id: Optional[int] = None) -> None:
         """
-        Log a scraping attempt
+        Log a scraping attempt, optionally for a job of the queue
         """
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "INSERT INTO scraping_history (timestamp, status, error_message) VALUES (?, ?, ?)",
-                (datetime.now(), status, error_message)
+        def insert(conn: sqlite3.Connection) -> None:
+            conn.execute(
+                "INSERT INTO scraping_history (timestamp, status, error_message, job_id) VALUES (?, ?, ?, ?)",
+                (datetime.now(), status, error_message, job_id)
             )
-            conn.commit()
+        
+        await self.pool.write(insert)
+        self.notify("history")
     
-    def get_latest_posts(self, limit: int = 10) -> List[dict]:
+    async def get_latest_posts(
+        self,
+        limit: int = 10,
+        cursor: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        account: Optional[str] = None,
+        include_duplicates: bool = True,
+    ) -> tuple[List[dict], Optional[str]]:
         """
-        Get the most recent posts with local image paths
+        Get the most recent posts with local image and thumbnail paths.
+        Keyset-paginated on (last_seen, id); since/until filter on last_seen.
+        Without include_duplicates, posts flagged as duplicates are left out.
+        Returns the page and the cursor of the next page (None on the last page)
         """
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT url, image_url, local_image_path, title, description, first_seen, last_seen
+        conditions, params = [], []
+        if not include_duplicates:
+            conditions.append("duplicate_of IS NULL")
+        if account:
+            conditions.append("account = ?")
+            params.append(account)
+        if cursor:
+            conditions.append("(last_seen, id) < (?, ?)")
+            params.extend(decode_cursor(cursor, 2))
+        if since:
+            conditions.append("last_seen >= ?")
+            params.append(_local_naive(since))
+        if until:
+            conditions.append("last_seen < ?")
+            params.append(_local_naive(until))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        
+        def query(conn: sqlite3.Connection) -> List[sqlite3.Row]:
+            return conn.execute(f"""
+                SELECT id, url, image_url, local_image_path, content_hash, title, description, account, first_seen, last_seen, duplicate_of
                 FROM posts
-                ORDER BY last_seen DESC
+                {where}
+                ORDER BY last_seen DESC, id DESC
                 LIMIT ?
-            """, (limit,))
+            """, (*params, limit + 1)).fetchall()
+        
+        rows = await self.pool.read(query)
+        next_cursor = encode_cursor(rows[limit - 1]['last_seen'], rows[limit - 1]['id']) if len(rows) > limit else None
+        return [self._post_with_thumbnails(row) for row in rows[:limit]], next_cursor
+    
+    async def iter_posts(
+        self,
+        since: Optional[datetime] = None,
+        account: Optional[str] = None,
+        batch_size: int = 500,
+    ) -> AsyncIterator[dict]:
+        """
+        Stream posts in the get_latest_posts format, oldest last_seen first,
+        reading batch_size rows at a time (keyset-paginated on (last_seen, id)),
+        so memory does not grow with the table. since filters on last_seen:
+        a post seen again while the export runs moves forward and is streamed
+        again rather than skipped.
+        """
+        conditions, params = [], []
+        if account:
+            conditions.append("account = ?")
+            params.append(account)
+        if since:
+            conditions.append("last_seen >= ?")
+            params.append(_local_naive(since))
+        position: Optional[tuple] = None
+        
+        while True:
+            where = conditions + (["(last_seen, id) > (?, ?)"] if position else [])
             
-            return [dict(row) for row in cursor.fetchall()]
+            def query(conn: sqlite3.Connection) -> List[sqlite3.Row]:
+                return conn.execute(f"""
+                    SELECT id, url, image_url, local_image_path, content_hash, title, description, account, first_seen, last_seen, duplicate_of
+                    FROM posts
+                    {f"WHERE {' AND '.join(where)}" if where else ""}
+                    ORDER BY last_seen, id
+                    LIMIT ?
+                """, (*params, *(position or ()), batch_size)).fetchall()
+            
+            rows = await self.pool.read(query)
+            for row in rows:
+                yield self._post_with_thumbnails(row)
+            if len(rows) < batch_size:
+                return
+            position = (rows[-1]['last_seen'], rows[-1]['id'])
     
-    def get_scraping_history(self, limit: int = 10) -> List[dict]:
+    async def get_posts_by_url(self, urls: List[str]) -> List[dict]:
+        """Get posts by URL, in the same format as get_latest_posts"""
+        def query(conn: sqlite3.Connection) -> List[dict]:
+            cursor = conn.execute(f"""
+                SELECT id, url, image_url, local_image_path, content_hash, title, description, account, first_seen, last_seen, duplicate_of
+                FROM posts
+                WHERE url IN ({','.join('?' * len(urls))})
+                ORDER BY id
+            """, urls)
+            return [self._post_with_thumbnails(row) for row in cursor.fetchall()]
+        
+        return await self.pool.read(query)
+    
+    async def search_posts(
+        self,
+        text: str,
+        limit: int = 10,
+        cursor: Optional[str] = None,
+    ) -> tuple[List[dict], Optional[str]]:
         """
-        Get recent scraping history
+        Full-text search over post titles and descriptions, best matches first.
+        Keyset-paginated on (rank, id).
+        Returns the page and the cursor of the next page (None on the last page)
         """
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT timestamp, status, error_message
+        match = fts_query(text)
+        if not match:
+            return [], None
+        
+        conditions, params = ["posts_fts MATCH ?"], [match]
+        if cursor:
+            conditions.append("(posts_fts.rank, posts.id) > (?, ?)")
+            params.extend(decode_cursor(cursor, 2))
+        
+        def query(conn: sqlite3.Connection) -> List[sqlite3.Row]:
+            return conn.execute(f"""
+                SELECT posts.id, posts_fts.rank AS rank, url, image_url, local_image_path, content_hash,
+                       posts.title, posts.description, account, first_seen, last_seen, duplicate_of
+                FROM posts_fts
+                JOIN posts ON posts.id = posts_fts.rowid
+                WHERE {' AND '.join(conditions)}
+                ORDER BY posts_fts.rank, posts.id
+                LIMIT ?
+            """, (*params, limit + 1)).fetchall()
+        
+        rows = await self.pool.read(query)
+        next_cursor = encode_cursor(rows[limit - 1]['rank'], rows[limit - 1]['id']) if len(rows) > limit else None
+        posts = []
+        for row in rows[:limit]:
+            post = self._post_with_thumbnails(row)
+            post.pop('rank')
+            posts.append(post)
+        return posts, next_cursor
+    
+    def _post_with_thumbnails(self, row: sqlite3.Row) -> dict:
+        """Convert a post row to a dict, adding its thumbnail paths keyed by width"""
+        post = dict(row)
+        post.pop('id', None)
+        digest = post.pop('content_hash', None)
+        post['thumbnails'] = {
+            str(width): path for width, path in self.image_store.thumbnail_paths(digest).items()
+        } if digest else {}
+        return post
+    
+    async def get_scraping_history(
+        self,
+        limit: int = 10,
+        cursor: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        status: Optional[str] = None,
+    ) -> tuple[List[dict], Optional[str]]:
+        """
+        Get recent scraping history.
+        Keyset-paginated on (timestamp, id); filters on time range and status.
+        Returns the page and the cursor of the next page (None on the last page)
+        """
+        conditions, params = [], []
+        if status:
+            conditions.append("status = ?")
+            params.append(status)
+        if cursor:
+            conditions.append("(timestamp, id) < (?, ?)")
+            params.extend(decode_cursor(cursor, 2))
+        if since:
+            conditions.append("timestamp >= ?")
+            params.append(_local_naive(since))
+        if until:
+            conditions.append("timestamp < ?")
+            params.append(_local_naive(until))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        
+        def query(conn: sqlite3.Connection) -> List[sqlite3.Row]:
+            return conn.execute(f"""
+                SELECT id, timestamp, status, error_message, job_id
                 FROM scraping_history
-                ORDER BY timestamp DESC
+                {where}
+                ORDER BY timestamp DESC, id DESC
                 LIMIT ?
-            """, (limit,))
-            
-            return [dict(row) for row in cursor.fetchall()] 
\ No newline at end of file
+            """, (*params, limit + 1)).fetchall()
+        
+        rows = await self.pool.read(query)
+        next_cursor = encode_cursor(rows[limit - 1]['timestamp'], rows[limit - 1]['id']) if len(rows) > limit else None
+        history = []
+        for row in rows[:limit]:
+            entry = dict(row)
+            entry.pop('id')
+            history.append(entry)
+        return history, next_cursor
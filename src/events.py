@@ -0,0 +1,90 @@
+import asyncio
+import json
+import logging
+from typing import Any, AsyncIterator, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Seconds between keep-alive comments on an idle stream
+KEEPALIVE_INTERVAL = 15.0
+
+
+def sse_frame(event: str, data: Any) -> bytes:
+    """Encode one Server-Sent Event"""
+    payload = json.dumps(data, separators=(",", ":"), ensure_ascii=False, default=str)
+    return f"event: {event}\ndata: {payload}\n\n".encode()
+
+
+class Subscription:
+    """One subscriber's bounded queue of pre-encoded frames"""
+
+    def __init__(self, queue_size: int):
+        self.queue: asyncio.Queue[Optional[bytes]] = asyncio.Queue(maxsize=queue_size)
+        self.dropped = False
+
+    def close(self) -> None:
+        """Discard pending frames and wake the consumer with the end-of-stream marker"""
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+
+class Broadcaster:
+    """
+    Fan-out of events to many subscribers.
+    Each event is encoded once and pushed to every subscriber's bounded queue
+    without awaiting. A subscriber whose queue is full is too slow to keep up:
+    it is dropped (its stream ends and the client reconnects) instead of
+    slowing down the publisher or growing memory.
+    """
+
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self.dropped_total = 0
+        self._subscribers: Set[Subscription] = set()
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self) -> Subscription:
+        subscription = Subscription(self.queue_size)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self._subscribers.discard(subscription)
+
+    def publish(self, event: str, data: Any) -> None:
+        """Push an event to every subscriber"""
+        if not self._subscribers:
+            return
+        frame = sse_frame(event, data)
+        for subscription in list(self._subscribers):
+            try:
+                subscription.queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                logger.warning("Dropping slow event subscriber")
+                subscription.dropped = True
+                subscription.close()
+                self._subscribers.discard(subscription)
+                self.dropped_total += 1
+
+    async def stream(self, subscription: Subscription, first: Optional[bytes] = None) -> AsyncIterator[bytes]:
+        """Yield a subscription's frames as an SSE body, with keep-alives while idle"""
+        try:
+            # Ask clients to reconnect quickly if the stream ends
+            yield b"retry: 3000\n\n"
+            if first is not None:
+                yield first
+            while True:
+                try:
+                    frame = await asyncio.wait_for(subscription.queue.get(), timeout=KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield b": keep-alive\n\n"
+                    continue
+                if frame is None:
+                    return
+                yield frame
+        finally:
+            self.unsubscribe(subscription)
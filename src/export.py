@@ -0,0 +1,110 @@
+import asyncio
+import json
+import os
+import tarfile
+import time
+from datetime import datetime
+from typing import TYPE_CHECKING, AsyncIterator, Dict, Optional, Set
+
+if TYPE_CHECKING:
+    from src.database import Database
+
+CHUNK_SIZE = 64 * 1024  # Bytes read from disk per chunk of an image
+BLOCK_SIZE = tarfile.BLOCKSIZE
+
+
+def ndjson_line(post: dict) -> bytes:
+    return (json.dumps(post, ensure_ascii=False, default=str) + "\n").encode()
+
+
+async def ndjson_posts(db: "Database", since: Optional[datetime] = None, account: Optional[str] = None) -> AsyncIterator[bytes]:
+    """Posts as newline-delimited JSON, one line per post, oldest last_seen first"""
+    async for post in db.iter_posts(since=since, account=account):
+        yield ndjson_line(post)
+
+
+def tar_header(name: str, size: int, mtime: float) -> bytes:
+    """Header block(s) of a regular file entry (PAX, so long names are fine)"""
+    info = tarfile.TarInfo(name)
+    info.size = size
+    info.mtime = int(mtime)
+    info.mode = 0o644
+    return info.tobuf(format=tarfile.PAX_FORMAT)
+
+
+def tar_padding(size: int) -> bytes:
+    """Zeros completing the last block of an entry"""
+    return b"\0" * (-size % BLOCK_SIZE)
+
+
+def tar_entry(name: str, data: bytes) -> bytes:
+    """A small in-memory file as a complete entry"""
+    return tar_header(name, len(data), time.time()) + data + tar_padding(len(data))
+
+
+async def tar_file(name: str, path: str) -> AsyncIterator[bytes]:
+    """
+    An entry streamed from disk, CHUNK_SIZE bytes at a time. The size is
+    taken when the file is opened; images are immutable once stored, so it
+    does not change while the entry is written.
+    """
+    f = await asyncio.to_thread(open, path, "rb")
+    try:
+        stat = os.fstat(f.fileno())
+        yield tar_header(name, stat.st_size, stat.st_mtime)
+        remaining = stat.st_size
+        while remaining > 0:
+            chunk = await asyncio.to_thread(f.read, min(CHUNK_SIZE, remaining))
+            if not chunk:
+                raise IOError(f"{path} was truncated while being archived")
+            remaining -= len(chunk)
+            yield chunk
+        yield tar_padding(stat.st_size)
+    finally:
+        f.close()
+
+
+def _shortcode(url: str) -> str:
+    return url.rstrip("/").rsplit("/", 1)[-1]
+
+
+async def tar_archive(db: "Database", since: Optional[datetime] = None, account: Optional[str] = None) -> AsyncIterator[bytes]:
+    """
+    A tarball of the posts and their images: posts/<shortcode>.json per post,
+    with its image paths rewritten to the images/ entries of the archive,
+    followed by the image and thumbnail files it references, read from disk
+    as they are sent. Images shared by several posts are archived once;
+    images missing from disk are left out and their path set to None.
+    """
+    root = db.image_store.root_dir
+    archived: Set[str] = set()
+
+    def archive_name(path: Optional[str]) -> Optional[str]:
+        if not path or not os.path.isfile(path):
+            return None
+        return "images/" + os.path.relpath(path, root).replace(os.sep, "/")
+
+    async for post in db.iter_posts(since=since, account=account):
+        files: Dict[str, str] = {}
+        image = archive_name(post["local_image_path"])
+        if image:
+            files[image] = post["local_image_path"]
+        thumbnails = {}
+        for width, path in post["thumbnails"].items():
+            thumbnails[width] = archive_name(path)
+            if thumbnails[width]:
+                files[thumbnails[width]] = path
+        post = {**post, "local_image_path": image, "thumbnails": thumbnails}
+
+        yield tar_entry(f"posts/{_shortcode(post['url'])}.json", ndjson_line(post))
+        for name, path in files.items():
+            if name in archived:
+                continue
+            archived.add(name)
+            try:
+                async for chunk in tar_file(name, path):
+                    yield chunk
+            except FileNotFoundError:
+                continue  # Collected since the post was read; its entry keeps the path
+
+    yield b"\0" * (2 * BLOCK_SIZE)
@@ -0,0 +1,277 @@
+import asyncio
+import json
+import re
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import quote
+
+from browser_use import Browser
+from langchain_core.language_models import BaseChatModel
+from pydantic import BaseModel
+
+from src.summarizer import SummaryStats
+
+INSTAGRAM_URL = "https://www.instagram.com"
+
+# Network responses carrying timeline data, captured while the profile loads
+PAYLOAD_URL_RE = re.compile(r"/graphql/query|/api/v1/(feed|users)/")
+SCRIPT_JSON_RE = re.compile(r'<script type="application/json"[^>]*>(.*?)</script>', re.DOTALL)
+POST_HREF_RE = re.compile(r"/(?:p|reel)/([A-Za-z0-9_-]+)")
+
+# Collects the post links rendered in the profile grid
+ANCHORS_SCRIPT = """
+els => els.map(a => {
+    const img = a.querySelector('img');
+    return {href: a.href, src: img ? img.src : null, alt: img ? img.alt : null};
+})
+"""
+
+# Resolves a display name to a username with the search endpoint of the logged-in session
+SEARCH_SCRIPT = """
+async query => {
+    const response = await fetch('/web/search/topsearch/?context=user&query=' + encodeURIComponent(query));
+    return response.ok ? await response.json() : null;
+}
+"""
+
+
+class FastPathError(Exception):
+    """Raised when posts cannot be extracted without the agent"""
+
+
+class PostCandidate(BaseModel):
+    """A post read from the profile page, before selection"""
+    shortcode: str
+    url: str
+    image_url: str
+    caption: str = ""
+    alt_text: str = ""
+    taken_at: Optional[datetime] = None
+
+
+class ExtractionAttempt(BaseModel):
+    """Outcome of one extraction path (fast or agent) for a job"""
+    path: str
+    success: bool = False
+    wall_seconds: float = 0.0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    candidates: Optional[int] = None
+    summaries: Optional[SummaryStats] = None
+    dropped_posts: int = 0  # Invalid posts left out of the result
+    error: Optional[str] = None
+
+
+class PostSelection(BaseModel):
+    shortcodes: List[str]
+
+
+def post_url(shortcode: str) -> str:
+    return f"{INSTAGRAM_URL}/p/{shortcode}/"
+
+
+def _image_url(node: Dict[str, Any]) -> Optional[str]:
+    """Best image of a media node (first image of a carousel)"""
+    if node.get("display_url"):
+        return node["display_url"]
+    versions = (node.get("image_versions2") or {}).get("candidates") or []
+    if versions:
+        return max(versions, key=lambda version: version.get("width") or 0).get("url")
+    carousel = node.get("carousel_media") or []
+    return _image_url(carousel[0]) if carousel else None
+
+
+def _caption(node: Dict[str, Any]) -> str:
+    caption = node.get("caption")
+    if isinstance(caption, dict):
+        return caption.get("text") or ""
+    edges = (node.get("edge_media_to_caption") or {}).get("edges") or []
+    return edges[0].get("node", {}).get("text", "") if edges else ""
+
+
+def candidate_from_node(node: Dict[str, Any]) -> Optional[PostCandidate]:
+    """
+    Read a post from a media node, in either the web GraphQL shape
+    (shortcode, display_url, edge_media_to_caption) or the API shape
+    (code, image_versions2, caption). Returns None for other objects.
+    """
+    shortcode = node.get("shortcode") or node.get("code")
+    if not isinstance(shortcode, str):
+        return None
+    image_url = _image_url(node)
+    if not image_url:
+        return None
+    timestamp = node.get("taken_at_timestamp") or node.get("taken_at")
+    return PostCandidate(
+        shortcode=shortcode,
+        url=post_url(shortcode),
+        image_url=image_url,
+        caption=_caption(node),
+        alt_text=node.get("accessibility_caption") or "",
+        taken_at=datetime.fromtimestamp(timestamp) if isinstance(timestamp, (int, float)) else None,
+    )
+
+
+def _walk(payload: Any) -> Iterator[Dict[str, Any]]:
+    if isinstance(payload, dict):
+        yield payload
+        for value in payload.values():
+            yield from _walk(value)
+    elif isinstance(payload, list):
+        for value in payload:
+            yield from _walk(value)
+
+
+def candidates_from_payload(payload: Any) -> List[PostCandidate]:
+    """Every post found anywhere in a JSON payload"""
+    candidates = []
+    for node in _walk(payload):
+        candidate = candidate_from_node(node)
+        if candidate is not None:
+            candidates.append(candidate)
+    return candidates
+
+
+def candidates_from_html(html: str) -> List[PostCandidate]:
+    """Posts embedded in the JSON script tags of a server-rendered page"""
+    candidates = []
+    for script in SCRIPT_JSON_RE.findall(html):
+        try:
+            candidates.extend(candidates_from_payload(json.loads(script)))
+        except ValueError:
+            continue
+    return candidates
+
+
+def candidates_from_anchors(anchors: List[Dict[str, Any]]) -> List[PostCandidate]:
+    """Posts of the rendered grid: link, thumbnail and its alt text (no caption)"""
+    candidates = []
+    for anchor in anchors:
+        match = POST_HREF_RE.search(anchor.get("href") or "")
+        if match and anchor.get("src"):
+            candidates.append(PostCandidate(
+                shortcode=match.group(1),
+                url=post_url(match.group(1)),
+                image_url=anchor["src"],
+                alt_text=anchor.get("alt") or "",
+            ))
+    return candidates
+
+
+def merge_candidates(*sources: List[PostCandidate]) -> List[PostCandidate]:
+    """Deduplicate by shortcode, keeping the first (richest) source, newest first"""
+    merged: Dict[str, PostCandidate] = {}
+    for source in sources:
+        for candidate in source:
+            merged.setdefault(candidate.shortcode, candidate)
+    return sorted(merged.values(), key=lambda c: c.taken_at or datetime.min, reverse=True)
+
+
+def username_from_search(payload: Any, account: str) -> Optional[str]:
+    """Pick the username matching a display name in a topsearch response"""
+    users = [entry.get("user", {}) for entry in (payload or {}).get("users", [])]
+    wanted = account.strip().lower()
+    for user in users:
+        if wanted in ((user.get("full_name") or "").lower(), (user.get("username") or "").lower()):
+            return user.get("username")
+    return users[0].get("username") if users else None
+
+
+async def collect_candidates(browser: Browser, account: str, timeout: float = 30.0) -> List[PostCandidate]:
+    """
+    Load the account's profile in the (logged-in) browser and read its posts
+    from the timeline responses, the embedded JSON and the rendered grid.
+    """
+    playwright_browser = await browser.get_playwright_browser()
+    owns_context = not playwright_browser.contexts
+    context = await playwright_browser.new_context() if owns_context else playwright_browser.contexts[0]
+    page = await context.new_page()
+    responses: List[asyncio.Task] = []
+
+    def on_response(response) -> None:
+        if response.request.resource_type in ("xhr", "fetch") and PAYLOAD_URL_RE.search(response.url):
+            responses.append(asyncio.ensure_future(response.json()))
+
+    page.on("response", on_response)
+    try:
+        username = account.strip()
+        if not re.fullmatch(r"[A-Za-z0-9._]+", username):
+            await page.goto(INSTAGRAM_URL, wait_until="domcontentloaded", timeout=timeout * 1000)
+            username = username_from_search(await page.evaluate(SEARCH_SCRIPT, account), account)
+            if not username:
+                raise FastPathError(f"No Instagram user found for '{account}'")
+
+        await page.goto(f"{INSTAGRAM_URL}/{quote(username)}/", wait_until="domcontentloaded", timeout=timeout * 1000)
+        try:
+            await page.wait_for_load_state("networkidle", timeout=timeout * 1000)
+        except Exception:
+            pass  # Long-polling connections may keep the network busy
+
+        html = await page.content()
+        anchors = await page.eval_on_selector_all("a[href*='/p/'], a[href*='/reel/']", ANCHORS_SCRIPT)
+        payloads = [payload for payload in await asyncio.gather(*responses, return_exceptions=True)
+                    if not isinstance(payload, BaseException)]
+    finally:
+        await page.close()
+        if owns_context:
+            await context.close()
+
+    return merge_candidates(
+        [candidate for payload in payloads for candidate in candidates_from_payload(payload)],
+        candidates_from_html(html),
+        candidates_from_anchors(anchors),
+    )
+
+
+SELECTION_PROMPT = """Les publications du compte Instagram '{account}' ont déjà été extraites ci-dessous (date d'aujourd'hui : {today}).
+Consignes d'origine : {instructions}
+
+Sélectionnez au plus {post_count} publications parmi celles-ci en suivant les consignes et retournez leurs shortcodes.
+
+Publications :
+{candidates}"""
+
+
+async def select_posts(
+    candidates: List[PostCandidate],
+    instructions: str,
+    account: str,
+    post_count: int,
+    llm: BaseChatModel,
+    max_candidates: int = 12,
+) -> Tuple[List[PostCandidate], Dict[str, int]]:
+    """
+    Classify extracted posts with a single text-only LLM call.
+    Returns the selected candidates and the token usage.
+    """
+    candidates = candidates[:max_candidates]
+    by_shortcode = {candidate.shortcode: candidate for candidate in candidates}
+    listing = json.dumps([
+        {
+            "shortcode": candidate.shortcode,
+            "date": candidate.taken_at.strftime('%d/%m/%Y') if candidate.taken_at else None,
+            "legende": candidate.caption[:800],
+            "texte_alternatif": candidate.alt_text[:300],
+        }
+        for candidate in candidates
+    ], ensure_ascii=False)
+
+    result = await llm.with_structured_output(PostSelection, include_raw=True).ainvoke(SELECTION_PROMPT.format(
+        account=account,
+        today=datetime.now().strftime('%d/%m/%Y'),
+        instructions=instructions,
+        post_count=post_count,
+        candidates=listing,
+    ))
+    usage = getattr(result["raw"], "usage_metadata", None) or {}
+    tokens = {"input_tokens": usage.get("input_tokens", 0), "output_tokens": usage.get("output_tokens", 0)}
+    if result.get("parsing_error") or result.get("parsed") is None:
+        raise FastPathError(f"Invalid selection: {result.get('parsing_error')}")
+
+    selected = []
+    for shortcode in dict.fromkeys(result["parsed"].shortcodes):
+        candidate = by_shortcode.get(shortcode)
+        if candidate is None:
+            raise FastPathError(f"Selection returned an unknown post: {shortcode}")
+        selected.append(candidate)
+    return selected[:post_count], tokens
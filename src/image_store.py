@@ -0,0 +1,61 @@
+import hashlib
+import os
+import re
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+# Content-addressed file names: <hash>.<ext> or <hash>_<width>.<ext> for thumbnails
+CONTENT_NAME_RE = re.compile(r"^(?P<hash>[0-9a-f]{32})(?:_(?P<width>\d+))?$")
+
+
+def content_hash(data: bytes) -> str:
+    """Hash of the raw image bytes, used as the storage key"""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def url_key(image_url: str) -> str:
+    """
+    Stable key for an image URL.
+    Instagram CDN URLs carry signed query parameters (oh, oe, _nc_*) that change
+    on every scrape while the path identifies the asset, so the query is dropped.
+    """
+    parts = urlsplit(image_url)
+    return f"{parts.netloc}{parts.path}"
+
+
+class ImageStore:
+    """
+    Content-addressed image store.
+    Files live under <root>/<hash[:2]>/<hash><ext>, with one <hash>_<width><ext>
+    thumbnail per configured width.
+    """
+
+    def __init__(self, root_dir: str, extension: str, thumbnail_sizes: Optional[List[int]] = None):
+        self.root_dir = root_dir
+        self.extension = extension
+        self.thumbnail_sizes = sorted(thumbnail_sizes or [])
+        os.makedirs(self.root_dir, exist_ok=True)
+
+    def path_for(self, digest: str, width: Optional[int] = None) -> str:
+        """Path of the stored image (or one of its thumbnails) for a content hash"""
+        name = digest if width is None else f"{digest}_{width}"
+        return os.path.join(self.root_dir, digest[:2], name + self.extension)
+
+    def thumbnail_paths(self, digest: str) -> Dict[int, str]:
+        """Paths of all thumbnails of a content hash, keyed by width"""
+        return {width: self.path_for(digest, width) for width in self.thumbnail_sizes}
+
+    def exists(self, digest: str) -> bool:
+        return os.path.exists(self.path_for(digest))
+
+    def prepare(self, digest: str) -> None:
+        """Create the shard directory for a content hash"""
+        os.makedirs(os.path.join(self.root_dir, digest[:2]), exist_ok=True)
+
+    def delete(self, digest: str) -> None:
+        """Delete an image and its thumbnails"""
+        for path in [self.path_for(digest), *self.thumbnail_paths(digest).values()]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
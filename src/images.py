@@ -0,0 +1,236 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+from pydantic import BaseModel
+
+from src.image_store import ImageStore, content_hash
+from src.phash import NearDuplicateIndex
+from src.transcode import Transcoder
+
+logger = logging.getLogger(__name__)
+
+# Headers to mimic a browser request
+IMAGE_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Accept": "image/avif,image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9",
+    "Referer": "https://www.instagram.com/",
+    "Sec-Fetch-Dest": "image",
+    "Sec-Fetch-Mode": "no-cors",
+    "Sec-Fetch-Site": "same-site",
+}
+
+# HTTP statuses worth retrying (rate limiting and transient server errors)
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+# Near-duplicate candidates compared cell by cell before storing an image anyway
+NEAR_DUPLICATE_CANDIDATES = 3
+
+
+class IngestStats(BaseModel):
+    """Timing statistics for one batch of image downloads"""
+    total: int = 0
+    reused: int = 0  # Served from the URL index without downloading
+    near_duplicates: int = 0  # Downloaded, then stored as an already stored near-duplicate
+    succeeded: int = 0
+    failed: int = 0
+    retries: int = 0
+    wall_seconds: float = 0.0
+    slowest_seconds: float = 0.0
+    sum_seconds: float = 0.0
+
+
+class ImageIngestor:
+    """
+    Image ingestion stage: downloads images concurrently over one shared,
+    pooled aiohttp session and hands them to the transcoding process pool.
+    Images are stored by content hash, so identical bytes are only transcoded once.
+    With a near-duplicate index, new content whose perceptual hash is close to
+    stored content is not transcoded or stored: it shares the stored file.
+    """
+
+    def __init__(
+        self,
+        store: ImageStore,
+        transcoder: Optional[Transcoder] = None,
+        concurrency: int = 8,
+        per_host_limit: int = 4,
+        retries: int = 3,
+        backoff_base: float = 0.5,
+        timeout: float = 30.0,
+        near_duplicates: Optional[NearDuplicateIndex] = None,
+    ):
+        self.store = store
+        self.near_duplicates = near_duplicates
+        self.transcoder = transcoder or Transcoder()
+        self.concurrency = concurrency
+        self.per_host_limit = per_host_limit
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.timeout = timeout
+        self.last_stats: Optional[IngestStats] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore = asyncio.Semaphore(concurrency)
+        # Content being transcoded, so near-duplicates of the same batch can wait for it
+        self._pending: Dict[str, asyncio.Event] = {}
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Return the shared session, creating it on first use"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.concurrency,
+                limit_per_host=self.per_host_limit,
+                ttl_dns_cache=300,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers=IMAGE_HEADERS,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self._session
+
+    async def close(self) -> None:
+        """Close the shared session, its connection pool and the transcoding workers"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self.transcoder.close()
+
+    async def fetch(self, image_url: str, stats: Optional[IngestStats] = None) -> Optional[bytes]:
+        """
+        Download raw image bytes, retrying transient failures with exponential backoff
+        Returns None if the image could not be downloaded
+        """
+        session = self._get_session()
+        for attempt in range(self.retries + 1):
+            if attempt:
+                if stats is not None:
+                    stats.retries += 1
+                delay = self.backoff_base * (2 ** (attempt - 1))
+                await asyncio.sleep(delay + random.uniform(0, delay / 2))
+            try:
+                async with session.get(image_url, allow_redirects=True) as response:
+                    if response.status == 200:
+                        return await response.read()
+                    if response.status not in RETRYABLE_STATUSES:
+                        logger.error(f"Failed to download image: {response.status} - {image_url}")
+                        return None
+                    logger.warning(f"Retryable status {response.status} for image (attempt {attempt + 1}) - {image_url}")
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.warning(f"Error downloading image (attempt {attempt + 1}): {e} - {image_url}")
+        logger.error(f"Giving up on image after {self.retries + 1} attempts - {image_url}")
+        return None
+
+    async def ingest(self, image_url: str, stats: Optional[IngestStats] = None) -> Optional[str]:
+        """
+        Download image from URL and transcode it to the configured format
+        Returns the content hash of the stored image
+        """
+        try:
+            async with self._semaphore:
+                image_data = await self.fetch(image_url, stats)
+            if image_data is None:
+                return None
+
+            digest = content_hash(image_data)
+
+            # Same bytes already stored under another URL
+            if self.store.exists(digest):
+                logger.info(f"Image content already stored: {digest} - URL: {image_url}")
+                return digest
+
+            candidates: List[str] = []
+            if self.near_duplicates is not None:
+                phash = await self.transcoder.perceptual_hash(image_data)
+                # Candidates taken and this content indexed without yielding to the event
+                # loop: near-duplicates fetched meanwhile find it and wait for its
+                # transcoding, and it never waits on content indexed after it
+                candidates = [digest for _, digest in self.near_duplicates.nearest(phash)[:NEAR_DUPLICATE_CANDIDATES]]
+                self.near_duplicates.add(digest, phash)
+
+            self._pending[digest] = asyncio.Event()
+            try:
+                duplicate = await self._stored_near_duplicate(image_data, candidates)
+                if duplicate is not None:
+                    logger.info(f"Image is a near-duplicate of stored content {duplicate} - URL: {image_url}")
+                    if stats is not None:
+                        stats.near_duplicates += 1
+                    return duplicate
+
+                # Decode/encode off the event loop
+                self.store.prepare(digest)
+                # Absolute paths: worker processes do not share our working directory guarantees
+                await self.transcoder.transcode(
+                    image_data,
+                    os.path.abspath(self.store.path_for(digest)),
+                    {width: os.path.abspath(path) for width, path in self.store.thumbnail_paths(digest).items()},
+                )
+            finally:
+                self._pending.pop(digest).set()
+
+            logger.info(f"Successfully downloaded and converted image: {self.store.path_for(digest)}")
+            return digest
+        except Exception as e:
+            logger.error(f"Error downloading/converting image: {e} - URL: {image_url}")
+            return None
+
+    async def _stored_near_duplicate(self, data: bytes, candidates: List[str]) -> Optional[str]:
+        """
+        First candidate, closest first, that the cell by cell comparison
+        confirms, waiting for candidates being transcoded
+        """
+        for digest in candidates:
+            pending = self._pending.get(digest)
+            if pending is not None:
+                await pending.wait()
+            # Deleted by garbage collection, or its transcoding failed
+            if not self.store.exists(digest):
+                continue
+            # The smallest thumbnail is enough for the comparison grid and the fastest to decode
+            thumbnails = self.store.thumbnail_paths(digest)
+            path = thumbnails[min(thumbnails)] if thumbnails else self.store.path_for(digest)
+            if not os.path.exists(path):
+                path = self.store.path_for(digest)
+            difference = await self.transcoder.grid_difference(data, os.path.abspath(path))
+            if difference <= self.near_duplicates.max_difference:
+                return digest
+            logger.debug(f"Similar hash but different image ({difference} levels apart): {digest}")
+        return None
+
+    async def ingest_batch(self, image_urls: List[str]) -> Tuple[List[Optional[str]], IngestStats]:
+        """
+        Ingest a batch of images concurrently
+        Returns the content hashes in the same order as the URLs (None for failures)
+        and the timing stats of the batch
+        """
+        unique_urls = list(dict.fromkeys(image_urls))
+        stats = IngestStats(total=len(unique_urls))
+        durations: List[float] = []
+
+        async def timed(url: str) -> Optional[str]:
+            started = time.perf_counter()
+            try:
+                return await self.ingest(url, stats)
+            finally:
+                durations.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        digests = dict(zip(unique_urls, await asyncio.gather(*(timed(url) for url in unique_urls))))
+        stats.wall_seconds = time.perf_counter() - started
+        stats.succeeded = sum(1 for digest in digests.values() if digest)
+        stats.failed = stats.total - stats.succeeded
+        stats.slowest_seconds = max(durations, default=0.0)
+        stats.sum_seconds = sum(durations)
+        self.last_stats = stats
+
+        logger.info(
+            f"Ingested {stats.succeeded}/{stats.total} images in {stats.wall_seconds:.2f}s "
+            f"(slowest {stats.slowest_seconds:.2f}s, sequential sum {stats.sum_seconds:.2f}s, "
+            f"{stats.retries} retries)"
+        )
+        return [digests[url] for url in image_urls], stats
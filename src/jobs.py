@@ -0,0 +1,577 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import sqlite3
+import uuid
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, List, Optional
+
+from pydantic import BaseModel, Field, field_validator
+
+if TYPE_CHECKING:
+    from src.database import Database
+
+logger = logging.getLogger(__name__)
+
+# Job lifecycle: queued -> running -> completed | error
+# A running job whose lease expired goes back to queued (or to error after max attempts)
+JOB_STATUSES = ("queued", "running", "completed", "error")
+
+
+def worker_id() -> str:
+    """Lease owner name of this process: host, pid and a random suffix (pids are reused)"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class ScrapeTarget(BaseModel):
+    """An account to scrape and how to prompt the agent for it"""
+    id: Optional[int] = None
+    account: str = Field(min_length=1)
+    # Formatted with {account}, {post_count} and {today}
+    prompt_template: str
+    post_count: int = Field(default=3, ge=1, le=50)
+    enabled: bool = True
+
+    @field_validator("prompt_template")
+    @classmethod
+    def check_placeholders(cls, template: str) -> str:
+        """Reject templates that would fail to format at run time"""
+        try:
+            template.format(account="", post_count=0, today="")
+        except (KeyError, IndexError, ValueError) as e:
+            raise ValueError(f"Invalid prompt template: {e!r}")
+        return template
+
+    def render_prompt(self) -> str:
+        return self.prompt_template.format(
+            account=self.account,
+            post_count=self.post_count,
+            today=datetime.now().strftime('%d/%m/%Y'),
+        )
+
+
+class ScrapeJob(BaseModel):
+    """One scrape of one target, with its own status"""
+    id: int
+    target_id: int
+    account: str
+    status: str
+    created_at: str
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    error_message: Optional[str] = None
+    new_posts: Optional[int] = None
+    stats: Dict[str, Any] = {}
+    attempts: int = 0
+    lease_owner: Optional[str] = None
+    lease_expires_at: Optional[str] = None
+
+
+JOB_COLUMNS = """
+    scrape_jobs.id, scrape_jobs.target_id, scrape_targets.account, scrape_jobs.status,
+    scrape_jobs.created_at, scrape_jobs.started_at, scrape_jobs.finished_at,
+    scrape_jobs.error_message, scrape_jobs.new_posts, scrape_jobs.stats,
+    scrape_jobs.attempts, scrape_jobs.lease_owner, scrape_jobs.lease_expires_at
+"""
+
+
+def _job_from_row(row: sqlite3.Row) -> ScrapeJob:
+    job = dict(row)
+    job['stats'] = json.loads(job['stats']) if job['stats'] else {}
+    return ScrapeJob(**job)
+
+
+def _target_from_row(row: sqlite3.Row) -> ScrapeTarget:
+    target = dict(row)
+    target['enabled'] = bool(target['enabled'])
+    return ScrapeTarget(**target)
+
+
+class JobStore:
+    """
+    Persistence of scrape targets and the job queue, on the application database.
+    Safe to share between processes: a target has at most one queued or running
+    job (enforced by a unique index), and a running job is leased to the process
+    running it, which renews the lease while it works.
+    """
+
+    def __init__(self, db: "Database"):
+        self.db = db
+        self.init_db()
+
+    def init_db(self) -> None:
+        """Create the targets and jobs tables"""
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.executescript("""
+                CREATE TABLE IF NOT EXISTS scrape_targets (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    account TEXT UNIQUE NOT NULL,
+                    prompt_template TEXT NOT NULL,
+                    post_count INTEGER NOT NULL DEFAULT 3,
+                    enabled INTEGER NOT NULL DEFAULT 1,
+                    created_at TIMESTAMP NOT NULL
+                );
+
+                CREATE TABLE IF NOT EXISTS scrape_jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    target_id INTEGER NOT NULL REFERENCES scrape_targets (id),
+                    status TEXT NOT NULL,
+                    created_at TIMESTAMP NOT NULL,
+                    started_at TIMESTAMP,
+                    finished_at TIMESTAMP,
+                    error_message TEXT,
+                    new_posts INTEGER,
+                    stats TEXT
+                );
+
+                CREATE INDEX IF NOT EXISTS idx_jobs_status ON scrape_jobs (status, id);
+                CREATE INDEX IF NOT EXISTS idx_jobs_target ON scrape_jobs (target_id, id);
+            """)
+            self.db._add_column_if_missing(cursor, "scrape_jobs", "attempts", "INTEGER NOT NULL DEFAULT 0")
+            self.db._add_column_if_missing(cursor, "scrape_jobs", "lease_owner", "TEXT")
+            self.db._add_column_if_missing(cursor, "scrape_jobs", "lease_expires_at", "TIMESTAMP")
+            
+            cursor.executescript("""
+                BEGIN IMMEDIATE;
+                
+                -- Older versions could queue a target twice; keep its oldest active job
+                UPDATE scrape_jobs SET status = 'error', error_message = 'Duplicate of an active job'
+                WHERE status IN ('queued', 'running') AND id NOT IN (
+                    SELECT MIN(id) FROM scrape_jobs WHERE status IN ('queued', 'running') GROUP BY target_id
+                );
+                
+                -- One active job per target, across every process using the database
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_active_target
+                ON scrape_jobs (target_id) WHERE status IN ('queued', 'running');
+                
+                -- Number of jobs per status, kept by triggers so /status never scans the jobs
+                CREATE TABLE IF NOT EXISTS job_counts (
+                    status TEXT PRIMARY KEY,
+                    count INTEGER NOT NULL
+                );
+                
+                CREATE TRIGGER IF NOT EXISTS jobs_count_insert AFTER INSERT ON scrape_jobs BEGIN
+                    INSERT INTO job_counts (status, count) VALUES (NEW.status, 1)
+                    ON CONFLICT (status) DO UPDATE SET count = count + 1;
+                END;
+                
+                CREATE TRIGGER IF NOT EXISTS jobs_count_update AFTER UPDATE OF status ON scrape_jobs
+                WHEN OLD.status IS NOT NEW.status
+                BEGIN
+                    UPDATE job_counts SET count = count - 1 WHERE status = OLD.status;
+                    INSERT INTO job_counts (status, count) VALUES (NEW.status, 1)
+                    ON CONFLICT (status) DO UPDATE SET count = count + 1;
+                END;
+                
+                CREATE TRIGGER IF NOT EXISTS jobs_count_delete AFTER DELETE ON scrape_jobs BEGIN
+                    UPDATE job_counts SET count = count - 1 WHERE status = OLD.status;
+                END;
+                
+                CREATE TRIGGER IF NOT EXISTS jobs_version_insert AFTER INSERT ON scrape_jobs BEGIN
+                    UPDATE data_versions SET version = version + 1 WHERE resource = 'jobs';
+                END;
+                
+                CREATE TRIGGER IF NOT EXISTS jobs_version_update AFTER UPDATE OF status ON scrape_jobs BEGIN
+                    UPDATE data_versions SET version = version + 1 WHERE resource = 'jobs';
+                END;
+                
+                -- Recounted at startup, so counts are right for databases of older versions
+                DELETE FROM job_counts;
+                INSERT INTO job_counts (status, count) SELECT status, COUNT(*) FROM scrape_jobs GROUP BY status;
+                
+                COMMIT;
+            """)
+
+    async def save_target(self, target: ScrapeTarget) -> ScrapeTarget:
+        """Create a target, or update the one with the same account"""
+        def upsert(conn: sqlite3.Connection) -> sqlite3.Row:
+            return conn.execute("""
+                INSERT INTO scrape_targets (account, prompt_template, post_count, enabled, created_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(account) DO UPDATE SET
+                    prompt_template = excluded.prompt_template,
+                    post_count = excluded.post_count,
+                    enabled = excluded.enabled
+                RETURNING id, account, prompt_template, post_count, enabled
+            """, (target.account, target.prompt_template, target.post_count, target.enabled, datetime.now())).fetchone()
+
+        return _target_from_row(await self.db.pool.write(upsert))
+
+    def ensure_default_target(self, target: ScrapeTarget) -> None:
+        """Seed a target when none exists yet"""
+        with self.db.get_connection() as conn:
+            if conn.execute("SELECT 1 FROM scrape_targets LIMIT 1").fetchone() is None:
+                conn.execute("""
+                    INSERT INTO scrape_targets (account, prompt_template, post_count, enabled, created_at)
+                    VALUES (?, ?, ?, 1, ?)
+                """, (target.account, target.prompt_template, target.post_count, datetime.now()))
+                conn.commit()
+
+    async def list_targets(self, enabled_only: bool = False) -> List[ScrapeTarget]:
+        def query(conn: sqlite3.Connection) -> List[sqlite3.Row]:
+            return conn.execute(f"""
+                SELECT id, account, prompt_template, post_count, enabled
+                FROM scrape_targets
+                {"WHERE enabled = 1" if enabled_only else ""}
+                ORDER BY id
+            """).fetchall()
+
+        return [_target_from_row(row) for row in await self.db.pool.read(query)]
+
+    async def get_target(self, target_id: int) -> Optional[ScrapeTarget]:
+        def query(conn: sqlite3.Connection) -> Optional[sqlite3.Row]:
+            return conn.execute("""
+                SELECT id, account, prompt_template, post_count, enabled
+                FROM scrape_targets WHERE id = ?
+            """, (target_id,)).fetchone()
+
+        row = await self.db.pool.read(query)
+        return _target_from_row(row) if row else None
+
+    async def enqueue(self, target_id: int) -> ScrapeJob:
+        """
+        Queue a job for a target.
+        If the target already has a queued or running job, in this process or
+        another one, that job is returned instead.
+        """
+        def insert(conn: sqlite3.Connection) -> int:
+            row = conn.execute("""
+                INSERT INTO scrape_jobs (target_id, status, created_at) VALUES (?, 'queued', ?)
+                ON CONFLICT DO NOTHING
+                RETURNING id
+            """, (target_id, datetime.now())).fetchone()
+            if row is not None:
+                return row['id']
+            return conn.execute(
+                "SELECT id FROM scrape_jobs WHERE target_id = ? AND status IN ('queued', 'running')",
+                (target_id,)
+            ).fetchone()['id']
+
+        job = await self.get_job(await self.db.pool.write(insert))
+        self.db.notify("jobs", job)
+        return job
+
+    async def claim_next(self, owner: str, lease_seconds: float) -> Optional[ScrapeJob]:
+        """Atomically move the oldest queued job to running, leased to owner"""
+        def claim(conn: sqlite3.Connection) -> Optional[int]:
+            now = datetime.now()
+            row = conn.execute("""
+                UPDATE scrape_jobs
+                SET status = 'running', started_at = ?, attempts = attempts + 1,
+                    lease_owner = ?, lease_expires_at = ?
+                WHERE id = (SELECT id FROM scrape_jobs WHERE status = 'queued' ORDER BY id LIMIT 1)
+                RETURNING id
+            """, (now, owner, now + timedelta(seconds=lease_seconds))).fetchone()
+            return row['id'] if row else None
+
+        job_id = await self.db.pool.write(claim)
+        if job_id is None:
+            return None
+        job = await self.get_job(job_id)
+        self.db.notify("jobs", job)
+        return job
+
+    async def finish(
+        self,
+        job_id: int,
+        status: str,
+        error_message: Optional[str] = None,
+        new_posts: Optional[int] = None,
+        stats: Optional[Dict[str, Any]] = None,
+        owner: Optional[str] = None,
+    ) -> bool:
+        """
+        Record the outcome of a job and release its lease.
+        With an owner, only a job still leased to it is updated: False means the
+        lease expired and the job was reclaimed by another worker meanwhile.
+        """
+        def update(conn: sqlite3.Connection) -> int:
+            return conn.execute(f"""
+                UPDATE scrape_jobs
+                SET status = ?, finished_at = ?, error_message = ?, new_posts = ?, stats = ?,
+                    lease_owner = NULL, lease_expires_at = NULL
+                WHERE id = ? {"AND status = 'running' AND lease_owner = ?" if owner else ""}
+            """, (
+                status, datetime.now(), error_message, new_posts, json.dumps(stats or {}, default=str),
+                job_id, *([owner] if owner else []),
+            )).rowcount
+
+        if not await self.db.pool.write(update):
+            logger.warning(f"Job {job_id} is no longer leased to {owner}, outcome {status} not recorded")
+            return False
+        self.db.notify("jobs", await self.get_job(job_id))
+        return True
+
+    async def renew_leases(self, job_ids: List[int], owner: str, lease_seconds: float) -> List[int]:
+        """Extend the leases of running jobs of owner; returns the jobs it no longer holds"""
+        def update(conn: sqlite3.Connection) -> List[int]:
+            expires_at = datetime.now() + timedelta(seconds=lease_seconds)
+            lost = []
+            for job_id in job_ids:
+                renewed = conn.execute("""
+                    UPDATE scrape_jobs SET lease_expires_at = ?
+                    WHERE id = ? AND status = 'running' AND lease_owner = ?
+                """, (expires_at, job_id, owner)).rowcount
+                if not renewed:
+                    lost.append(job_id)
+            return lost
+
+        return await self.db.pool.write(update) if job_ids else []
+
+    async def release(self, job_ids: List[int], owner: str) -> int:
+        """Put running jobs of owner back in the queue (on shutdown), without counting the attempt"""
+        def update(conn: sqlite3.Connection) -> int:
+            count = 0
+            for job_id in job_ids:
+                released = conn.execute("""
+                    UPDATE scrape_jobs
+                    SET status = 'queued', attempts = attempts - 1, lease_owner = NULL, lease_expires_at = NULL
+                    WHERE id = ? AND status = 'running' AND lease_owner = ?
+                """, (job_id, owner)).rowcount
+                if released:
+                    conn.execute(
+                        "INSERT INTO scraping_history (timestamp, status, error_message, job_id) VALUES (?, 'error', ?, ?)",
+                        (datetime.now(), "Interrupted by a shutdown, requeued", job_id)
+                    )
+                count += released
+            return count
+
+        count = await self.db.pool.write(update) if job_ids else 0
+        if count:
+            self.db.notify("jobs")
+            self.db.notify("history")
+        return count
+
+    async def reclaim_stale(self, max_attempts: int) -> int:
+        """
+        Take back running jobs whose lease expired: their process died or hung.
+        They are queued again, or failed once they were attempted max_attempts
+        times, and their dangling "started" history entry is closed.
+        Jobs running before leases existed have none, and are reclaimed too.
+        """
+        def update(conn: sqlite3.Connection) -> int:
+            now = datetime.now()
+            stale = conn.execute("""
+                SELECT id, attempts, lease_owner FROM scrape_jobs
+                WHERE status = 'running' AND (lease_expires_at IS NULL OR lease_expires_at < ?)
+            """, (now,)).fetchall()
+            for job in stale:
+                if job['attempts'] < max_attempts:
+                    message = f"Lease of {job['lease_owner']} expired, requeued"
+                    conn.execute("""
+                        UPDATE scrape_jobs SET status = 'queued', lease_owner = NULL, lease_expires_at = NULL
+                        WHERE id = ?
+                    """, (job['id'],))
+                else:
+                    message = f"Lease of {job['lease_owner']} expired after {job['attempts']} attempt(s)"
+                    conn.execute("""
+                        UPDATE scrape_jobs
+                        SET status = 'error', finished_at = ?, error_message = ?, lease_owner = NULL, lease_expires_at = NULL
+                        WHERE id = ?
+                    """, (now, message, job['id']))
+                conn.execute(
+                    "INSERT INTO scraping_history (timestamp, status, error_message, job_id) VALUES (?, 'error', ?, ?)",
+                    (now, message, job['id'])
+                )
+            return len(stale)
+
+        count = await self.db.pool.write(update)
+        if count:
+            self.db.notify("jobs")
+            self.db.notify("history")
+        return count
+
+    async def get_job(self, job_id: int) -> Optional[ScrapeJob]:
+        def query(conn: sqlite3.Connection) -> Optional[sqlite3.Row]:
+            return conn.execute(f"""
+                SELECT {JOB_COLUMNS}
+                FROM scrape_jobs JOIN scrape_targets ON scrape_targets.id = scrape_jobs.target_id
+                WHERE scrape_jobs.id = ?
+            """, (job_id,)).fetchone()
+
+        row = await self.db.pool.read(query)
+        return _job_from_row(row) if row else None
+
+    async def count_by_status(self) -> Dict[str, int]:
+        """Number of jobs in each status, from the counters kept by triggers"""
+        def query(conn: sqlite3.Connection) -> List[sqlite3.Row]:
+            return conn.execute("SELECT status, count FROM job_counts").fetchall()
+
+        counts = {status: 0 for status in JOB_STATUSES}
+        counts.update({row['status']: row['count'] for row in await self.db.pool.read(query)})
+        return counts
+
+    async def extraction_stats(self, last_jobs: int = 100) -> List[Dict[str, Any]]:
+        """Success rate, wall time and token spend of each extraction path over the last jobs"""
+        def query(conn: sqlite3.Connection) -> List[sqlite3.Row]:
+            return conn.execute("""
+                SELECT json_extract(attempt.value, '$.path') AS path,
+                       COUNT(*) AS attempts,
+                       SUM(json_extract(attempt.value, '$.success')) AS successes,
+                       AVG(json_extract(attempt.value, '$.wall_seconds')) AS avg_wall_seconds,
+                       AVG(json_extract(attempt.value, '$.input_tokens')) AS avg_input_tokens,
+                       AVG(json_extract(attempt.value, '$.output_tokens')) AS avg_output_tokens
+                FROM (SELECT stats FROM scrape_jobs WHERE stats IS NOT NULL ORDER BY id DESC LIMIT ?) AS job,
+                     json_each(job.stats, '$.extraction') AS attempt
+                GROUP BY 1
+                ORDER BY 1
+            """, (last_jobs,)).fetchall()
+
+        paths = []
+        for row in await self.db.pool.read(query):
+            path = dict(row)
+            path['success_rate'] = path['successes'] / path['attempts']
+            paths.append(path)
+        return paths
+
+    async def finished_since(self, after_id: int, limit: int = 500) -> List[ScrapeJob]:
+        """Completed or failed jobs with an id above after_id, oldest first"""
+        def query(conn: sqlite3.Connection) -> List[sqlite3.Row]:
+            return conn.execute(f"""
+                SELECT {JOB_COLUMNS}
+                FROM scrape_jobs JOIN scrape_targets ON scrape_targets.id = scrape_jobs.target_id
+                WHERE scrape_jobs.id > ? AND scrape_jobs.status IN ('completed', 'error')
+                ORDER BY scrape_jobs.id
+                LIMIT ?
+            """, (after_id, limit)).fetchall()
+
+        return [_job_from_row(row) for row in await self.db.pool.read(query)]
+
+    async def latest_job_id(self) -> int:
+        def query(conn: sqlite3.Connection) -> int:
+            return conn.execute("SELECT COALESCE(MAX(id), 0) FROM scrape_jobs").fetchone()[0]
+
+        return await self.db.pool.read(query)
+
+    async def list_jobs(self, status: Optional[str] = None, limit: int = 20) -> List[ScrapeJob]:
+        """Most recent jobs first, optionally filtered by status"""
+        def query(conn: sqlite3.Connection) -> List[sqlite3.Row]:
+            return conn.execute(f"""
+                SELECT {JOB_COLUMNS}
+                FROM scrape_jobs JOIN scrape_targets ON scrape_targets.id = scrape_jobs.target_id
+                {"WHERE scrape_jobs.status = ?" if status else ""}
+                ORDER BY scrape_jobs.id DESC
+                LIMIT ?
+            """, (*([status] if status else []), limit)).fetchall()
+
+        return [_job_from_row(row) for row in await self.db.pool.read(query)]
+
+
+# Runs one claimed job for its target
+RunJob = Callable[[ScrapeJob, ScrapeTarget], Awaitable[None]]
+
+
+class JobQueue:
+    """
+    Worker pool running queued scrape jobs, at most `concurrency` at a time.
+    Jobs live in the database, so the queue survives restarts and can be served
+    by several processes at once. Each claimed job is leased to this process and
+    the lease renewed every heartbeat; jobs whose lease expired (their process
+    died) are reclaimed by whichever process notices first. Workers are woken up
+    on enqueue and also poll periodically.
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        runner: RunJob,
+        concurrency: int = 2,
+        poll_interval: float = 5.0,
+        lease_seconds: float = 60.0,
+        heartbeat_seconds: float = 15.0,
+        max_attempts: int = 3,
+    ):
+        self.store = store
+        self.runner = runner
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.max_attempts = max_attempts
+        self.owner = worker_id()
+        self._wakeup = asyncio.Event()
+        self._workers: List[asyncio.Task] = []
+        self._running: Dict[int, asyncio.Task] = {}
+
+    async def start(self) -> None:
+        """Reclaim jobs of dead processes, then start the workers and the heartbeat"""
+        await self._reclaim()
+        self._workers = [asyncio.create_task(self._work(i)) for i in range(self.concurrency)]
+        self._workers.append(asyncio.create_task(self._heartbeat()))
+
+    async def enqueue(self, target_id: int) -> ScrapeJob:
+        job = await self.store.enqueue(target_id)
+        self._wakeup.set()
+        return job
+
+    async def _reclaim(self) -> None:
+        reclaimed = await self.store.reclaim_stale(self.max_attempts)
+        if reclaimed:
+            logger.warning(f"Reclaimed {reclaimed} job(s) whose lease expired")
+            self._wakeup.set()
+
+    async def _heartbeat(self) -> None:
+        """Renew the leases of the running jobs, cancel those lost, and reclaim stale ones"""
+        while True:
+            await asyncio.sleep(self.heartbeat_seconds)
+            try:
+                lost = await self.store.renew_leases(list(self._running), self.owner, self.lease_seconds)
+                for job_id in lost:
+                    task = self._running.get(job_id)
+                    if task is not None:
+                        logger.error(f"Lost the lease of job {job_id}, cancelling it")
+                        task.cancel()
+                await self._reclaim()
+            except Exception as e:
+                logger.error(f"Job heartbeat error: {e}")
+
+    async def _work(self, worker: int) -> None:
+        while True:
+            try:
+                job = await self.store.claim_next(self.owner, self.lease_seconds)
+                if job is None:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                target = await self.store.get_target(job.target_id)
+                logger.info(f"Worker {worker} running job {job.id} for {job.account} (attempt {job.attempts})")
+                # The run is its own task so that losing the lease cancels it, not the worker
+                run = asyncio.create_task(self.runner(job, target))
+                self._running[job.id] = run
+                try:
+                    await asyncio.wait([run])
+                finally:
+                    if run.done():
+                        del self._running[job.id]
+                if run.cancelled():
+                    continue
+                if run.exception() is not None:
+                    logger.error(f"Job {job.id} failed", exc_info=run.exception())
+                    await self.store.finish(job.id, "error", error_message=str(run.exception()), owner=self.owner)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Job worker {worker} error: {e}")
+                await asyncio.sleep(self.poll_interval)
+
+    async def close(self) -> None:
+        """Stop the workers; running jobs are cancelled and handed back to the queue"""
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        runs = list(self._running.values())
+        for task in runs:
+            task.cancel()
+        await asyncio.gather(*runs, return_exceptions=True)
+        released = await self.store.release(list(self._running), self.owner)
+        if released:
+            logger.info(f"Released {released} running job(s) back to the queue")
+        self._running = {}
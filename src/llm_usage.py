@@ -0,0 +1,49 @@
+import time
+from typing import Any, Dict, List
+from uuid import UUID
+
+from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.outputs import LLMResult
+from pydantic import BaseModel
+
+
+class LLMCall(BaseModel):
+    started_at: float
+    ended_at: float
+    input_tokens: int = 0
+    output_tokens: int = 0
+
+
+class LLMUsageHandler(AsyncCallbackHandler):
+    """LangChain callback timing every chat model call and reading its token usage"""
+
+    def __init__(self):
+        self.calls: List[LLMCall] = []
+        self._started: Dict[UUID, float] = {}
+
+    async def on_chat_model_start(self, serialized: Dict[str, Any], messages: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._started[run_id] = time.time()
+
+    async def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], *, run_id: UUID, **kwargs: Any) -> None:
+        self._started[run_id] = time.time()
+
+    async def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        started = self._started.pop(run_id, None)
+        if started is None:
+            return
+        usage: Dict[str, int] = {}
+        try:
+            usage = response.generations[0][0].message.usage_metadata or {}
+        except (AttributeError, IndexError):
+            pass
+        self.calls.append(LLMCall(
+            started_at=started,
+            ended_at=time.time(),
+            input_tokens=usage.get("input_tokens", 0),
+            output_tokens=usage.get("output_tokens", 0),
+        ))
+
+    async def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            self.calls.append(LLMCall(started_at=started, ended_at=time.time()))
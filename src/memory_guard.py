@@ -0,0 +1,201 @@
+import asyncio
+import base64
+import io
+import logging
+import os
+import time
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+from browser_use import Browser
+from browser_use.browser.context import BrowserContext
+from browser_use.browser.views import BrowserState
+from PIL import Image
+from pydantic import BaseModel
+
+from src.browser_pool import python_rss_mb
+
+logger = logging.getLogger(__name__)
+
+RECYCLE_COOLDOWN_SECONDS = 30.0  # Chrome takes a while to hand memory back after a tab is closed
+
+
+def downscale_screenshot(screenshot: str, max_side: int) -> str:
+    """A base64 PNG screenshot shrunk to fit max_side pixels, as base64 PNG"""
+    image = Image.open(io.BytesIO(base64.b64decode(screenshot)))
+    if max(image.size) <= max_side:
+        return screenshot
+    image.thumbnail((max_side, max_side))
+    buffer = io.BytesIO()
+    image.save(buffer, "PNG")
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+class MemoryStats(BaseModel):
+    """Memory of one scrape run, sampled while it goes"""
+    samples: int = 0
+    peak_chrome_rss_mb: float = 0.0
+    peak_python_rss_mb: float = 0.0
+    peak_total_rss_mb: float = 0.0
+    tab_recycles: int = 0
+    screenshots_dropped: int = 0
+    screenshots_spilled: int = 0
+    screenshot_dir: Optional[str] = None
+    aborted: Optional[str] = None  # Why the run was stopped, if it was
+
+
+class MemoryGuard:
+    """
+    Keeps an agent run within memory bounds.
+    Screenshots are downscaled to max_screenshot_side before the agent sees
+    them, and only the last keep_screenshots stay in its history: older ones
+    are written to screenshot_dir (when set) or dropped. The RSS of the run's
+    own Chrome (given to watch()) is sampled every sample_seconds: above
+    recycle_tab_chrome_mb the agent's tab is reopened on the same URL before
+    its next step, above abort_rss_mb the run is stopped (its checkpoint is
+    kept for a resume). Python RSS is only reported: the process is shared
+    by the concurrent runs, so it cannot tell which one grew.
+    """
+
+    def __init__(
+        self,
+        max_screenshot_side: int = 1024,
+        keep_screenshots: int = 3,
+        screenshot_dir: Optional[str] = None,
+        sample_seconds: float = 2.0,
+        recycle_tab_chrome_mb: float = 1200,
+        abort_rss_mb: float = 1800,
+    ):
+        self.max_screenshot_side = max_screenshot_side
+        self.keep_screenshots = keep_screenshots
+        self.sample_seconds = sample_seconds
+        self.recycle_tab_chrome_mb = recycle_tab_chrome_mb
+        self.abort_rss_mb = abort_rss_mb
+        self.stats = MemoryStats()
+        if screenshot_dir:
+            run = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+            self.stats.screenshot_dir = os.path.join(screenshot_dir, run)
+        # Decoded size of each screenshot of the history, by history index, kept once trimmed
+        self.screenshot_bytes: Dict[int, int] = {}
+        self.recycle_requested = False
+        self._recycled_at = 0.0
+        self._agent: Optional[Any] = None
+        self._chrome_rss: Callable[[], float] = lambda: 0.0
+
+    def attach(self, agent: Any) -> None:
+        """The agent stopped when memory goes above abort_rss_mb"""
+        self._agent = agent
+
+    async def sample(self) -> None:
+        chrome = await asyncio.to_thread(self._chrome_rss)
+        python = python_rss_mb()
+        stats = self.stats
+        stats.samples += 1
+        stats.peak_chrome_rss_mb = max(stats.peak_chrome_rss_mb, chrome)
+        stats.peak_python_rss_mb = max(stats.peak_python_rss_mb, python)
+        stats.peak_total_rss_mb = max(stats.peak_total_rss_mb, chrome + python)
+
+        if chrome > self.abort_rss_mb and stats.aborted is None and self._agent is not None:
+            stats.aborted = f"Memory limit: the run's Chrome uses {chrome:.0f} MB > {self.abort_rss_mb:.0f} MB"
+            logger.error(f"Stopping the agent: {stats.aborted}")
+            self._agent.stop()
+        elif (
+            chrome > self.recycle_tab_chrome_mb
+            and not self.recycle_requested
+            and time.monotonic() - self._recycled_at > RECYCLE_COOLDOWN_SECONDS
+        ):
+            logger.warning(f"Chrome uses {chrome:.0f} MB, recycling the agent's tab before its next step")
+            self.recycle_requested = True
+
+    async def _sample_loop(self) -> None:
+        while True:
+            try:
+                await self.sample()
+            except Exception as e:
+                logger.debug(f"Memory sampling failed: {e}")
+            await asyncio.sleep(self.sample_seconds)
+
+    @asynccontextmanager
+    async def watch(self, chrome_rss: Callable[[], float]) -> AsyncIterator["MemoryGuard"]:
+        """Sample memory in the background for the duration of the block; chrome_rss measures the run's own Chrome (MB)"""
+        self._chrome_rss = chrome_rss
+        sampler = asyncio.create_task(self._sample_loop())
+        try:
+            yield self
+        finally:
+            sampler.cancel()
+            await asyncio.gather(sampler, return_exceptions=True)
+            self._agent = None  # The run is over: the last sample only records the peaks
+            try:
+                await self.sample()
+            except Exception as e:
+                logger.debug(f"Memory sampling failed: {e}")
+
+    async def trim_history(self, history: List[Any]) -> None:
+        """Drop or spill the screenshots of an agent history but the last keep_screenshots"""
+        for index, item in enumerate(history[:max(len(history) - self.keep_screenshots, 0)]):
+            screenshot = item.state.screenshot
+            if not screenshot:
+                continue
+            self.screenshot_bytes[index] = len(screenshot) * 3 // 4
+            if self.stats.screenshot_dir:
+                path = os.path.join(self.stats.screenshot_dir, f"step-{index:04d}.png")
+                await asyncio.to_thread(self._spill, path, screenshot)
+                self.stats.screenshots_spilled += 1
+            else:
+                self.stats.screenshots_dropped += 1
+            item.state.screenshot = None
+
+    def tab_recycled(self, succeeded: bool) -> None:
+        self.recycle_requested = False
+        self._recycled_at = time.monotonic()
+        if succeeded:
+            self.stats.tab_recycles += 1
+
+    @staticmethod
+    def _spill(path: str, screenshot: str) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(base64.b64decode(screenshot))
+
+    def context(self, browser: Browser) -> "GuardedBrowserContext":
+        """Browser context for the agent, closed by the caller once the run is over"""
+        return GuardedBrowserContext(browser, self)
+
+
+class GuardedBrowserContext(BrowserContext):
+    """Browser context downscaling screenshots and reopening its tab when asked by the guard"""
+
+    def __init__(self, browser: Browser, guard: MemoryGuard):
+        super().__init__(browser=browser, config=browser.config.new_context_config)
+        self.guard = guard
+
+    async def take_screenshot(self, full_page: bool = False) -> str:
+        screenshot = await super().take_screenshot(full_page=full_page)
+        if not self.guard.max_screenshot_side:
+            return screenshot
+        return await asyncio.to_thread(downscale_screenshot, screenshot, self.guard.max_screenshot_side)
+
+    async def get_state(self) -> BrowserState:
+        if self.guard.recycle_requested:
+            try:
+                await self.recycle_tab()
+                self.guard.tab_recycled(True)
+            except Exception as e:
+                logger.error(f"Failed to recycle the agent's tab: {e}")
+                self.guard.tab_recycled(False)
+        return await super().get_state()
+
+    async def recycle_tab(self) -> None:
+        """
+        Reopen the current page in a fresh tab and close the old one, which
+        frees the renderer memory grown by infinite scrolling. Element indexes
+        are recomputed by the next get_state, so the agent carries on.
+        """
+        page = await self.get_current_page()
+        url = page.url
+        await self.create_new_tab(url)
+        await page.close()
+        logger.info(f"Recycled the agent's tab on {url}")
@@ -0,0 +1,41 @@
+"""
+Post models and the default target, shared by the API, the database and the
+scraping engine. Kept apart from src.scrapper so that serving and storing
+posts does not import browser_use and LangChain.
+"""
+from typing import List
+
+from pydantic import BaseModel
+
+from src.jobs import ScrapeTarget
+
+
+class InstagramPost(BaseModel):
+    url: str
+    image_url: str
+    title: str
+    description: str
+
+
+class InstagramPosts(BaseModel):
+    posts: List[InstagramPost]
+
+
+# Agent instructions; {account}, {post_count} and {today} are filled in per target
+DEFAULT_PROMPT_TEMPLATE = (
+    "Sur Instagram, recherchez le compte '{account}', allez sur la page et faites défiler vers le bas pour charger les publications récentes. "
+    "Vous devez trouver les dernières publications qui concernent les événements à venir (date d'aujourd'hui : {today}). "
+    "Vous devez sélectionner entre {post_count} publications. L'une d'entre elles doit être le 'Menu de la semaine' de la semaine en cours (Ne retournez pas plus d'une publication pour le menu de la semaine) "
+    "Les posts les plus importants sont ceux qui parlent d'événements à venir, de menus spéciaux, etc. (ex: Menu saint valentin)"
+    "Cliquez sur chacune des premières publications intéressantes pour consulter leur description (notamment la date concernée). "
+    "Extrayez les URLs de ces publications ainsi que les URLs de leurs images associées, le titre de la publication et une description synthétisée en FRANÇAIS. "
+    "Le titre doit être identique au titre de la publication. La description correspondra au texte alternatif de l'image. "
+    "Retournez les données au format JSON correspondant à la structure du modèle Pydantic InstagramPosts."
+)
+
+# Target scraped when none is configured
+DEFAULT_TARGET = ScrapeTarget(
+    account="brasserie chez ju",
+    prompt_template=DEFAULT_PROMPT_TEMPLATE,
+    post_count=3,
+)
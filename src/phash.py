@@ -0,0 +1,141 @@
+import io
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from PIL import Image, ImageChops
+
+# dHash grid: HASH_SIZE x HASH_SIZE bits
+HASH_SIZE = 16
+# Grayscale grid compared cell by cell to confirm a near-duplicate (see grid_difference)
+GRID_SIZE = 32
+
+
+def dhash(image: Image.Image, hash_size: int = HASH_SIZE) -> int:
+    """
+    Difference hash: the image shrunk to a (hash_size + 1) x hash_size grayscale
+    grid, one bit per pair of horizontally adjacent pixels (left brighter).
+    Robust to re-encoding, resizing and small color changes.
+    """
+    pixels = image.convert("L").resize((hash_size + 1, hash_size), Image.BOX).tobytes()
+    bits = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            bits = (bits << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return bits
+
+
+def dhash_bytes(data: bytes, hash_size: int = HASH_SIZE) -> int:
+    """dhash of encoded image bytes. Runs in transcoding workers, so it stays module-level"""
+    return dhash(Image.open(io.BytesIO(data)), hash_size)
+
+
+def dhash_file(path: str, hash_size: int = HASH_SIZE) -> int:
+    with Image.open(path) as image:
+        return dhash(image, hash_size)
+
+
+def _grid(image: Image.Image) -> Image.Image:
+    # Full decode: JPEG draft mode scales in the DCT, which moves cells by up to ~10 levels
+    return image.convert("L").resize((GRID_SIZE, GRID_SIZE), Image.BOX)
+
+
+def grid_difference(data: bytes, path: str) -> int:
+    """
+    Largest gray level difference between the GRID_SIZE x GRID_SIZE cells of
+    encoded image bytes and a stored image. dHash barely moves when a line of
+    text changes (this week's menu vs last week's, same layout), while a cell
+    covering that line changes a lot; re-encoding and resizing only move each
+    cell by a few levels. Runs in transcoding workers.
+    """
+    with Image.open(path) as stored:
+        return ImageChops.difference(_grid(Image.open(io.BytesIO(data))), _grid(stored)).getextrema()[1]
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def to_hex(phash: int) -> str:
+    """Fixed-width text form stored in the database (256 bits do not fit an INTEGER)"""
+    return f"{phash:0{HASH_SIZE * HASH_SIZE // 4}x}"
+
+
+def from_hex(text: str) -> int:
+    return int(text, 16)
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree over perceptual hashes, keyed by Hamming distance.
+    A lookup within distance d only descends into children whose edge
+    distance is within d of the query's distance to the node (triangle
+    inequality), so it visits a small part of the tree for small d.
+    """
+
+    def __init__(self):
+        # Node: (hash, value, children by distance to the node)
+        self._root: Optional[Tuple[int, str, Dict[int, tuple]]] = None
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, phash: int, value: str) -> None:
+        node = (phash, value, {})
+        self._size += 1
+        if self._root is None:
+            self._root = node
+            return
+        current = self._root
+        while True:
+            distance = hamming(phash, current[0])
+            child = current[2].get(distance)
+            if child is None:
+                current[2][distance] = node
+                return
+            current = child
+
+    def search(self, phash: int, max_distance: int) -> List[Tuple[int, str]]:
+        """(distance, value) of every entry within max_distance, closest first"""
+        matches = []
+        pending = [self._root] if self._root is not None else []
+        while pending:
+            node = pending.pop()
+            distance = hamming(phash, node[0])
+            if distance <= max_distance:
+                matches.append((distance, node[1]))
+            for edge, child in node[2].items():
+                if distance - max_distance <= edge <= distance + max_distance:
+                    pending.append(child)
+        return sorted(matches)
+
+
+class NearDuplicateIndex:
+    """
+    Perceptual hashes of the stored images, for finding an already stored
+    near-duplicate of new content. Hashes within max_distance bits are only
+    candidates: the caller confirms them with grid_difference, up to
+    max_difference gray levels. Entries are never removed from the tree:
+    a match whose content was deleted since is skipped by the caller, and the
+    index is rebuilt from the database after garbage collection.
+    """
+
+    def __init__(self, max_distance: int, max_difference: int = 10):
+        self.max_distance = max_distance
+        self.max_difference = max_difference
+        self.tree = BKTree()
+        self.hashes: Dict[str, int] = {}  # Content hash -> perceptual hash
+        self.loaded_rowid = 0  # Last row of the images table loaded
+
+    def add(self, digest: str, phash: int) -> None:
+        if digest not in self.hashes:
+            self.hashes[digest] = phash
+            self.tree.add(phash, digest)
+
+    def update(self, entries: Iterable[Tuple[str, int]]) -> None:
+        for digest, phash in entries:
+            self.add(digest, phash)
+
+    def nearest(self, phash: int) -> List[Tuple[int, str]]:
+        """(distance, content hash) of the stored near-duplicates, closest first"""
+        return self.tree.search(phash, self.max_distance)
@@ -0,0 +1,84 @@
+import asyncio
+import logging
+import time
+from typing import TYPE_CHECKING, Awaitable, Callable, Iterable, List, Optional, Set
+
+from src.database import SaveResult
+
+if TYPE_CHECKING:
+    from src.models import InstagramPost
+
+logger = logging.getLogger(__name__)
+
+# Saves a batch of validated posts (and downloads their images)
+SavePosts = Callable[[List["InstagramPost"]], Awaitable[SaveResult]]
+
+
+class PostStream:
+    """
+    Posts of a run, persisted as soon as they are extracted. A background
+    consumer saves whatever is queued, images included, while the agent
+    keeps browsing, so ingestion overlaps with the run instead of following it.
+    Posts put while a save is in progress are saved together by the next one.
+    """
+
+    def __init__(self, save: SavePosts):
+        self.save = save
+        self.result = SaveResult()
+        self.streamed = 0  # Posts put before the end of the run
+        self.first_post_seconds: Optional[float] = None  # From the creation of the stream
+        self._urls: Set[str] = set()
+        self._errors: List[str] = []
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._consumer: Optional[asyncio.Task] = None
+        self._started = time.perf_counter()
+        self._closed = False
+
+    def put(self, post: "InstagramPost") -> bool:
+        """Queue a validated post for saving. Returns False if it was already queued"""
+        if post.url in self._urls:
+            return False
+        self._urls.add(post.url)
+        if not self._closed:
+            self.streamed += 1
+            if self.first_post_seconds is None:
+                self.first_post_seconds = time.perf_counter() - self._started
+        if self._consumer is None:
+            self._consumer = asyncio.create_task(self._consume())
+        self._queue.put_nowait(post)
+        return True
+
+    async def _consume(self) -> None:
+        closing = False
+        while not closing:
+            item = await self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            while not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item is None:
+                    closing = True
+                    break
+                batch.append(item)
+            try:
+                self.result.add(await self.save(batch))
+            except Exception as e:
+                logger.exception(f"Failed to save {len(batch)} streamed post(s)")
+                self._errors.append(str(e))
+
+    async def close(self, posts: Iterable["InstagramPost"] = ()) -> SaveResult:
+        """
+        Save the final posts not streamed yet and wait for pending saves.
+        Raises RuntimeError if any save failed.
+        """
+        self._closed = True
+        for post in posts:
+            self.put(post)
+        if self._consumer is not None:
+            self._queue.put_nowait(None)
+            await self._consumer
+            self._consumer = None
+        if self._errors:
+            raise RuntimeError(f"Failed to save posts: {'; '.join(self._errors)}")
+        return self.result
@@ -1,70 +1,291 @@
 import asyncio
-import aiohttp
+import logging
 import random
+import sqlite3
 from datetime import datetime, timedelta
-import logging
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, List, Optional
+
+from pydantic import BaseModel
+
+from src.config import settings
+from src.jobs import JobStore, ScrapeJob
+
+if TYPE_CHECKING:
+    from src.database import Database
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('scheduler.log'),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
+SCHEDULE_COLUMNS = (
+    "target_id", "interval_hours", "next_run_at", "last_run_at", "last_job_id",
+    "last_new_posts", "runs", "changed_runs",
+)
+
+
+class ScheduleState(BaseModel):
+    """Scheduling state of a target: its current interval and next run"""
+    target_id: int
+    interval_hours: float
+    next_run_at: datetime
+    last_run_at: Optional[datetime] = None
+    last_job_id: int = 0  # Last finished job taken into account
+    last_new_posts: Optional[int] = None
+    runs: int = 0
+    changed_runs: int = 0  # Runs that found new posts
+
+
+def adapt_interval(interval_hours: float, new_posts: int, min_hours: float, max_hours: float,
+                   speedup: float = 0.75, backoff: float = 1.5) -> float:
+    """Shorten the interval when a run found new posts, lengthen it otherwise"""
+    interval_hours *= speedup if new_posts else backoff
+    return min(max(interval_hours, min_hours), max_hours)
+
+
+def fit_to_window(when: datetime, start_hour: int, end_hour: int, rng: random.Random) -> datetime:
+    """
+    Move a run time into the [start_hour, end_hour) window: runs falling
+    outside it are spread at random over the next window.
+    """
+    if start_hour >= end_hour or start_hour <= when.hour < end_hour:
+        return when
+    day = when.date() if when.hour < start_hour else when.date() + timedelta(days=1)
+    start = datetime.combine(day, datetime.min.time()).replace(hour=start_hour)
+    return start + timedelta(seconds=rng.uniform(0, (end_hour - start_hour) * 3600))
+
+
+def next_run_time(after: datetime, interval_hours: float, start_hour: int, end_hour: int,
+                  jitter: float, rng: random.Random) -> datetime:
+    """Run time one interval (± jitter, a fraction of it) after the last run, within the window"""
+    hours = interval_hours * (1 + rng.uniform(-jitter, jitter))
+    return fit_to_window(after + timedelta(hours=hours), start_hour, end_hour, rng)
+
+
+class ScheduleStore:
+    """Persistence of the scheduling state, so intervals survive restarts"""
+
+    def __init__(self, db: "Database"):
+        self.db = db
+        self.init_db()
+
+    def init_db(self) -> None:
+        """Create the schedule_state table"""
+        with self.db.get_connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS schedule_state (
+                    target_id INTEGER PRIMARY KEY,
+                    interval_hours REAL NOT NULL,
+                    next_run_at TIMESTAMP NOT NULL,
+                    last_run_at TIMESTAMP,
+                    last_job_id INTEGER NOT NULL DEFAULT 0,
+                    last_new_posts INTEGER,
+                    runs INTEGER NOT NULL DEFAULT 0,
+                    changed_runs INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            conn.commit()
+
+    async def load(self) -> Dict[int, ScheduleState]:
+        def query(conn: sqlite3.Connection) -> List[sqlite3.Row]:
+            return conn.execute(f"SELECT {', '.join(SCHEDULE_COLUMNS)} FROM schedule_state").fetchall()
+
+        return {row['target_id']: ScheduleState(**dict(row)) for row in await self.db.pool.read(query)}
+
+    async def save(self, state: ScheduleState) -> None:
+        def upsert(conn: sqlite3.Connection) -> None:
+            conn.execute(f"""
+                INSERT OR REPLACE INTO schedule_state ({', '.join(SCHEDULE_COLUMNS)})
+                VALUES ({', '.join('?' * len(SCHEDULE_COLUMNS))})
+            """, tuple(getattr(state, column) for column in SCHEDULE_COLUMNS))
+
+        await self.db.pool.write(upsert)
+
+
 class ScrapingScheduler:
-    def __init__(self, api_url: str = "http://localhost:8000"):
-        self.api_url = api_url
-        self.trigger_endpoint = f"{api_url}/trigger-scrape"
-    
-    async def trigger_scraping(self):
-        """Trigger the scraping process via API"""
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(self.trigger_endpoint) as response:
-                    if response.status == 200:
-                        logger.info("Successfully triggered scraping")
-                    else:
-                        logger.error(f"Failed to trigger scraping: {response.status}")
-        except Exception as e:
-            logger.error(f"Error triggering scraping: {e}")
-    
-    async def run(self):
+    """
+    Schedules a scrape job per enabled target. Each target has its own
+    interval, starting at SCRAPE_INTERVAL_DAYS: it shrinks after runs that
+    found new posts and grows after runs that found nothing, within
+    [min_interval_hours, max_interval_hours]. Runs land in the
+    SCRAPE_START_HOUR-SCRAPE_END_HOUR window with jitter, so targets spread
+    across it. Due targets wait while the queue already holds a job per
+    worker. Every finished job (scheduled or manual) is read back from the
+    job store, so a manual run also postpones the next scheduled one.
+    """
+
+    def __init__(
+        self,
+        job_store: JobStore,
+        enqueue: Callable[[int], Awaitable[ScrapeJob]],
+        store: Optional[ScheduleStore] = None,
+        interval_hours: float = settings.SCRAPE_INTERVAL_DAYS * 24,
+        min_interval_hours: float = settings.SCHEDULE_MIN_INTERVAL_HOURS,
+        max_interval_hours: float = settings.SCHEDULE_MAX_INTERVAL_HOURS,
+        start_hour: int = settings.SCRAPE_START_HOUR,
+        end_hour: int = settings.SCRAPE_END_HOUR,
+        jitter: float = settings.SCHEDULE_JITTER,
+        max_pending: int = settings.MAX_CONCURRENT_JOBS,
+        tick_seconds: float = settings.SCHEDULE_TICK_SECONDS,
+        rng: Optional[random.Random] = None,
+    ):
+        self.job_store = job_store
+        self.enqueue = enqueue
+        self.store = store
+        self.interval_hours = interval_hours
+        self.min_interval_hours = min_interval_hours
+        self.max_interval_hours = max_interval_hours
+        self.start_hour = start_hour
+        self.end_hour = end_hour
+        self.jitter = jitter
+        self.max_pending = max_pending
+        self.tick_seconds = tick_seconds
+        self.rng = rng or random.Random()
+        self.states: Dict[int, ScheduleState] = {}
+        self._loaded = False
+        self._task: Optional[asyncio.Task] = None
+
+    async def _save(self, state: ScheduleState) -> None:
+        if self.store is not None:
+            await self.store.save(state)
+
+    async def _load(self) -> None:
+        if self._loaded:
+            return
+        if self.store is not None:
+            self.states = await self.store.load()
+        self._loaded = True
+
+    async def _sync_targets(self, now: datetime) -> None:
+        """Create the state of new targets: first run within the next window, intervals from the settings"""
+        latest_job_id = None
+        for target in await self.job_store.list_targets(enabled_only=True):
+            if target.id in self.states:
+                continue
+            if latest_job_id is None:
+                latest_job_id = await self.job_store.latest_job_id()
+            state = ScheduleState(
+                target_id=target.id,
+                interval_hours=self.interval_hours,
+                next_run_at=fit_to_window(now + timedelta(hours=self.rng.uniform(0, 1)),
+                                          self.start_hour, self.end_hour, self.rng),
+                last_job_id=latest_job_id,
+            )
+            self.states[target.id] = state
+            await self._save(state)
+            logger.info(f"Scheduled target {target.account} for {state.next_run_at:%Y-%m-%d %H:%M}")
+
+    async def _observe(self) -> None:
+        """Adapt the intervals to the jobs finished since the last tick"""
+        if not self.states:
+            return
+        after_id = min(state.last_job_id for state in self.states.values())
+        for job in await self.job_store.finished_since(after_id):
+            state = self.states.get(job.target_id)
+            if state is None or job.id <= state.last_job_id:
+                continue
+            finished_at = datetime.fromisoformat(job.finished_at) if job.finished_at else datetime.now()
+            state.last_job_id = job.id
+            state.last_run_at = finished_at
+            state.runs += 1
+            if job.status == "completed":
+                state.last_new_posts = job.new_posts
+                state.changed_runs += bool(job.new_posts)
+                state.interval_hours = adapt_interval(
+                    state.interval_hours, job.new_posts, self.min_interval_hours, self.max_interval_hours
+                )
+                state.next_run_at = next_run_time(
+                    finished_at, state.interval_hours, self.start_hour, self.end_hour, self.jitter, self.rng
+                )
+            else:
+                # A failed run says nothing about the change rate: try again after the shortest interval
+                state.next_run_at = next_run_time(
+                    finished_at, self.min_interval_hours, self.start_hour, self.end_hour, self.jitter, self.rng
+                )
+            await self._save(state)
+            logger.info(
+                f"Job {job.id} ({job.status}, {job.new_posts} new post(s)): target {job.account} "
+                f"every {state.interval_hours:.1f}h, next run {state.next_run_at:%Y-%m-%d %H:%M}"
+            )
+
+    async def tick(self, now: Optional[datetime] = None) -> List[ScrapeJob]:
+        """Update the schedule and queue the due targets the queue has room for"""
+        now = now or datetime.now()
+        await self._load()
+        await self._sync_targets(now)
+        await self._observe()
+
+        counts = await self.job_store.count_by_status()
+        room = self.max_pending - counts["queued"] - counts["running"]
+        enabled = {target.id for target in await self.job_store.list_targets(enabled_only=True)}
+        due = sorted(
+            (state for state in self.states.values() if state.target_id in enabled and state.next_run_at <= now),
+            key=lambda state: state.next_run_at,
+        )
+        if due and room <= 0:
+            logger.info(f"{len(due)} target(s) due, waiting for the queue to drain")
+
+        jobs = []
+        for state in due[:max(room, 0)]:
+            jobs.append(await self.enqueue(state.target_id))
+            # Provisional next run, replaced once the job finishes
+            state.next_run_at = next_run_time(
+                now, state.interval_hours, self.start_hour, self.end_hour, self.jitter, self.rng
+            )
+            await self._save(state)
+        return jobs
+
+    async def run(self) -> None:
         """Run the scheduler indefinitely"""
         while True:
             try:
-                # Calculate next run time (random time in the next 3 days)
-                now = datetime.now()
-                next_run = now + timedelta(days=3)
-                
-                # Random hour between 9:00 and 17:00
-                next_run = next_run.replace(
-                    hour=random.randint(9, 17),
-                    minute=random.randint(0, 59),
-                    second=random.randint(0, 59)
-                )
-                
-                # Calculate seconds to wait
-                wait_seconds = (next_run - now).total_seconds()
-                
-                logger.info(f"Next scraping scheduled for: {next_run}")
-                
-                # Wait until next run time
-                await asyncio.sleep(wait_seconds)
-                
-                # Trigger scraping
-                await self.trigger_scraping()
-                
+                await self.tick()
             except Exception as e:
                 logger.error(f"Scheduler error: {e}")
-                # Wait 1 hour before retrying on error
-                await asyncio.sleep(3600)
+            await asyncio.sleep(self.tick_seconds)
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self.run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def snapshot(self) -> List[Dict[str, Any]]:
+        """Schedule of every target, next run first"""
+        if self._task is None and self.store is not None:
+            # Driven by another process: read its persisted state
+            self.states = await self.store.load()
+        targets = {target.id: target for target in await self.job_store.list_targets()}
+        return [
+            {
+                **state.model_dump(mode="json"),
+                "account": targets[state.target_id].account if state.target_id in targets else None,
+                "enabled": targets[state.target_id].enabled if state.target_id in targets else False,
+            }
+            for state in sorted(self.states.values(), key=lambda state: state.next_run_at)
+        ]
+
 
 async def main():
-    scheduler = ScrapingScheduler()
-    await scheduler.run()
+    """Standalone mode: schedule jobs into the shared database, run by the API's workers"""
+    from src.database import Database
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    )
+    if settings.SCHEDULER_MODE != "standalone":
+        logger.info(f"Scheduler mode is '{settings.SCHEDULER_MODE}', not starting the standalone scheduler")
+        return
+
+    db = Database(db_path=settings.DB_PATH, images_dir=settings.IMAGES_DIR)
+    job_store = JobStore(db)
+    scheduler = ScrapingScheduler(job_store, job_store.enqueue, store=ScheduleStore(db))
+    try:
+        await scheduler.run()
+    finally:
+        await db.close()
+
 
 if __name__ == "__main__":
-    asyncio.run(main()) 
\ No newline at end of file
+    asyncio.run(main())
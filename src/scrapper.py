@@ -1,19 +1,25 @@
 from langchain_openai import ChatOpenAI
-from browser_use import Agent, Browser, BrowserConfig, Controller
+from browser_use import ActionResult, Agent, Browser, BrowserConfig, Controller
+from browser_use.browser.context import BrowserContext
 import asyncio
-from pydantic import BaseModel
-from typing import List
+import logging
+from typing import TYPE_CHECKING, Awaitable, Callable, List, Optional
 import random
-from datetime import datetime
+import time
+from src.browser_pool import BrowserPool
+from src.checkpoints import Checkpoint, RunCheckpoint
+from src.extractor import ExtractionAttempt, FastPathError, collect_candidates, select_posts
+from src.jobs import ScrapeTarget
+from src.memory_guard import MemoryGuard
+from src.models import DEFAULT_TARGET, InstagramPost, InstagramPosts
+from src.telemetry import RunRecorder
+from src.summarizer import Summarizer, SummaryInput, create_summary_backend
+from src.config import settings
 
-class InstagramPost(BaseModel):
-    url: str
-    image_url: str
-    title: str
-    description: str
+if TYPE_CHECKING:
+    from src.post_stream import PostStream
 
-class InstagramPosts(BaseModel):
-    posts: List[InstagramPost]
+logger = logging.getLogger(__name__)
 
 # Configuration for browser
 BROWSER_CONFIG = BrowserConfig(
@@ -41,89 +47,392 @@ INITIAL_ACTIONS = [
     {"scroll_down": {"amount": random.randint(100, 500)}}
 ]
 
-async def create_agent() -> Agent:
-    """Create a new agent with a fresh browser instance"""
-    browser = Browser(config=BROWSER_CONFIG)
+# Appended to the task so that every extracted post is checkpointed right away
+RECORD_INSTRUCTIONS = (
+    " Dès que vous avez extrait l'URL, l'URL de l'image, le titre et la description d'une publication, "
+    "enregistrez-la avec l'action record_post avant de passer à la suivante."
+)
+
+# Appended to the task when resuming a failed run
+RESUME_INSTRUCTIONS = (
+    " Reprise d'une exécution interrompue : ces publications sont déjà enregistrées, ne les traitez plus : {recorded}."
+    " Il vous reste {remaining} publication(s) à trouver."
+)
+
+# Called after each agent step with (browser state, model output, step number)
+StepCallback = Callable[..., Awaitable[None]]
+
+def create_browser_pool() -> BrowserPool:
+    """Browser pool configured from the settings"""
+    return BrowserPool(
+        config=BROWSER_CONFIG,
+        size=settings.BROWSER_POOL_SIZE,
+        max_uses=settings.BROWSER_MAX_USES,
+        max_chrome_rss_mb=settings.BROWSER_MAX_CHROME_RSS_MB,
+        user_data_dir=settings.BROWSER_USER_DATA_DIR,
+        profiles_dir=settings.BROWSER_PROFILES_DIR,
+        start_timeout=settings.BROWSER_START_TIMEOUT,
+    )
+
+def create_memory_guard() -> MemoryGuard:
+    """Memory bounds of an agent run, configured from the settings"""
+    return MemoryGuard(
+        max_screenshot_side=settings.AGENT_SCREENSHOT_MAX_SIDE,
+        keep_screenshots=settings.AGENT_KEEP_SCREENSHOTS,
+        screenshot_dir=settings.AGENT_SCREENSHOT_DIR,
+        sample_seconds=settings.AGENT_MEMORY_SAMPLE_SECONDS,
+        recycle_tab_chrome_mb=settings.AGENT_RECYCLE_TAB_CHROME_MB,
+        abort_rss_mb=settings.AGENT_ABORT_RSS_MB,
+    )
+
+def create_summarizer(db=None) -> Summarizer:
+    """Summarization stage configured from the settings, cached in db when given"""
+    return Summarizer(
+        backend=create_summary_backend(settings.SUMMARY_BACKEND, settings.SUMMARY_MODEL),
+        db=db,
+        batch_size=settings.SUMMARY_BATCH_SIZE,
+    )
+
+async def create_agent(
+    browser: Browser,
+    target: ScrapeTarget,
+    on_step: Optional[StepCallback] = None,
+    callbacks: Optional[list] = None,
+    checkpoint: Optional[RunCheckpoint] = None,
+    stream: Optional["PostStream"] = None,
+    browser_context: Optional[BrowserContext] = None,
+) -> Agent:
+    """
+    Create a new agent scraping a target on a (pooled) browser instance.
+    With a checkpoint, the agent records each post as soon as it is extracted,
+    and a resumed run starts from the last page and skips recorded posts.
+    Recorded posts are also pushed to stream, to be saved while the agent goes on.
+    A browser_context given is used instead of a new one, and left open.
+    """
     controller = Controller(output_model=InstagramPosts)
+    task = target.render_prompt()
+    initial_actions = INITIAL_ACTIONS
+    
+    if checkpoint is not None:
+        @controller.action("Enregistrer une publication extraite (url, image_url, title, description)", param_model=InstagramPost)
+        async def record_post(params: InstagramPost):
+            error = validate_post(params)
+            if error:
+                return ActionResult(error=error, include_in_memory=True)
+            if await checkpoint.record_post(params.model_dump()):
+                if stream is not None:
+                    stream.put(params)
+                return ActionResult(extracted_content=f"Publication enregistrée : {params.url}", include_in_memory=True)
+            return ActionResult(extracted_content=f"Publication déjà enregistrée : {params.url}", include_in_memory=True)
+        
+        task += RECORD_INSTRUCTIONS
+        if checkpoint.resumed:
+            task += RESUME_INSTRUCTIONS.format(
+                recorded=", ".join(checkpoint.recorded_urls) or "aucune",
+                remaining=max(target.post_count - len(checkpoint.state.posts), 0),
+            )
+            if checkpoint.state.last_url:
+                initial_actions = [{"open_tab": {"url": checkpoint.state.last_url}}]
     
     return Agent(
-        task = (
-            "Sur Instagram, recherchez le compte 'brasserie chez ju', allez sur la page et faites défiler vers le bas pour charger les publications récentes. "
-            f"Vous devez trouver les dernières publications qui concernent les événements à venir (date d'aujourd'hui : {datetime.now().strftime('%d/%m/%Y')}). "
-            "Vous devez sélectionner entre 3 publications. L'une d'entre elles doit être le 'Menu de la semaine' de la semaine en cours (Ne retournez pas plus d'une publication pour le menu de la semaine) "
-            "Les posts les plus importants sont ceux qui parlent d'événements à venir, de menus spéciaux, etc. (ex: Menu saint valentin)"
-            "Cliquez sur chacune des premières publications intéressantes pour consulter leur description (notamment la date concernée). "
-            "Extrayez les URLs de ces publications ainsi que les URLs de leurs images associées, le titre de la publication et une description synthétisée en FRANÇAIS. "
-            "Le titre doit être identique au titre de la publication. La description correspondra au texte alternatif de l'image. "
-            "Retournez les données au format JSON correspondant à la structure du modèle Pydantic InstagramPosts."
-        ),
-        initial_actions=INITIAL_ACTIONS,
+        task=task,
+        initial_actions=initial_actions,
         llm=ChatOpenAI(
             model="gpt-4o",
-            temperature=0
+            temperature=0,
+            callbacks=callbacks
         ),
         use_vision=True,
+        max_input_tokens=settings.AGENT_MAX_INPUT_TOKENS,
         browser=browser,
-        controller=controller
+        browser_context=browser_context,
+        controller=controller,
+        register_new_step_callback=on_step
     )
 
-async def scrape_instagram() -> tuple[bool, InstagramPosts | str]:
+def validate_post(post: InstagramPost) -> Optional[str]:
+    """Check the content of a post, returning an error message if it is invalid"""
+    if not all([
+        # Accept any Instagram post URL that contains /p/
+        "/p/" in post.url and post.url.startswith("https://www.instagram.com/"),
+        post.image_url.startswith("http"),
+        post.title.strip(),
+        post.description.strip()
+    ]):
+        return f"Invalid post data format: {post.model_dump_json()}"
+    return None
+
+def validate_posts(parsed: InstagramPosts) -> Optional[str]:
+    """Check the content of each post, returning an error message if one is invalid"""
+    for post in parsed.posts:
+        error = validate_post(post)
+        if error:
+            return error
+    return None
+
+async def run_fast_path(
+    browser: Browser,
+    target: ScrapeTarget,
+    summarizer: Summarizer,
+    recorder: RunRecorder,
+) -> tuple[Optional[InstagramPosts], ExtractionAttempt]:
     """
-    Scrape Instagram posts for events from 'brasserie chez ju'.
-    
-    Returns:
-        tuple[bool, InstagramPosts | str]: A tuple containing:
-            - bool: Success status
-            - InstagramPosts | str: Either the parsed posts data or error message
+    Read the posts straight from the profile page, select them with one
+    text-only LLM call and summarize the selected captions (cached).
+    Returns None (and the reason in the attempt) on failure.
+    """
+    attempt = ExtractionAttempt(path="fast")
+    started = time.perf_counter()
+    try:
+        with recorder.span("fast_collect"):
+            candidates = await collect_candidates(browser, target.account, timeout=settings.FAST_PATH_TIMEOUT)
+            attempt.candidates = len(candidates)
+            if not candidates:
+                raise FastPathError("No posts found on the profile page")
+        
+        with recorder.span("fast_select", llm_calls=1) as span:
+            selected, tokens = await select_posts(
+                candidates,
+                instructions=target.render_prompt(),
+                account=target.account,
+                post_count=target.post_count,
+                llm=ChatOpenAI(model=settings.FAST_PATH_MODEL, temperature=0),
+                max_candidates=settings.FAST_PATH_MAX_CANDIDATES,
+            )
+            span.input_tokens, span.output_tokens = tokens["input_tokens"], tokens["output_tokens"]
+        
+        with recorder.span("summarize") as span:
+            summaries, attempt.summaries = await summarizer.summarize([
+                SummaryInput(url=candidate.url, caption=candidate.caption, alt_text=candidate.alt_text)
+                for candidate in selected
+            ])
+            span.llm_calls = attempt.summaries.batches
+            span.input_tokens = attempt.summaries.input_tokens
+            span.output_tokens = attempt.summaries.output_tokens
+        attempt.input_tokens = tokens["input_tokens"] + attempt.summaries.input_tokens
+        attempt.output_tokens = tokens["output_tokens"] + attempt.summaries.output_tokens
+        parsed = InstagramPosts(posts=[
+            InstagramPost(
+                url=candidate.url,
+                image_url=candidate.image_url,
+                title=summary.title,
+                description=summary.description,
+            )
+            for candidate, summary in zip(selected, summaries)
+        ])
+        error = validate_posts(parsed) if parsed.posts else "No post selected"
+        if error:
+            raise FastPathError(error)
+        
+        attempt.success = True
+        return parsed, attempt
+    except Exception as e:
+        attempt.error = str(e)
+        logger.warning(f"Fast path failed for '{target.account}', falling back to the agent: {e}")
+        return None, attempt
+    finally:
+        attempt.wall_seconds = time.perf_counter() - started
+
+def merge_posts(final: List[InstagramPost], recorded: List[InstagramPost], limit: int) -> InstagramPosts:
+    """The agent's final posts, completed by posts recorded along the way (resumed runs included)"""
+    posts = {post.url: post for post in final}
+    for post in recorded:
+        posts.setdefault(post.url, post)
+    return InstagramPosts(posts=list(posts.values())[:max(limit, len(final))])
+
+async def run_agent(
+    browser: Browser,
+    target: ScrapeTarget,
+    recorder: RunRecorder,
+    checkpoint: RunCheckpoint,
+    on_step: Optional[StepCallback] = None,
+    stream: Optional["PostStream"] = None,
+    guard: Optional[MemoryGuard] = None,
+) -> tuple[InstagramPosts | str, ExtractionAttempt]:
     """
+    Run the full browsing agent, recording a span per step and checkpointing
+    its progress. Posts recorded along the way go to stream as they come.
+    With a guard, the run's screenshots and history are kept within its
+    bounds, and the run is stopped when memory goes above its limit.
+    Each post of the final result is validated on its own: invalid ones are
+    dropped instead of failing the run. Returns the posts or an error message
+    """
+    attempt = ExtractionAttempt(path="agent")
+    started = time.perf_counter()
+    context = guard.context(browser) if guard is not None else None
+    
+    def recorded() -> List[InstagramPost]:
+        return [InstagramPost(**post) for post in checkpoint.state.posts]
+    
     try:
-        # Create a new agent with a fresh browser for each scraping session
-        agent = await create_agent()
+        if len(checkpoint.state.posts) >= target.post_count:
+            # A previous run recorded every post but failed before finishing
+            attempt.success = True
+            return InstagramPosts(posts=recorded()), attempt
+        
+        async def step_callback(state, model_output, step: int) -> None:
+            await checkpoint.visit(getattr(state, "url", None), step)
+            if guard is not None:
+                await guard.trim_history(agent.state.history.history)
+            if on_step is not None:
+                await on_step(state, model_output, step)
+        
+        agent = await create_agent(
+            browser, target, step_callback, callbacks=[recorder.llm], checkpoint=checkpoint, stream=stream,
+            browser_context=context,
+        )
+        if guard is not None:
+            guard.attach(agent)
         history = await agent.run()
+        recorder.add_agent_history(history, screenshot_bytes=guard.screenshot_bytes if guard is not None else None)
+        steps = [span for span in recorder.spans if span.kind == "agent_step"]
+        attempt.input_tokens = sum(span.input_tokens for span in steps)
+        attempt.output_tokens = sum(span.output_tokens for span in steps)
         result = history.final_result()
         
+        if guard is not None and guard.stats.aborted:
+            # Posts recorded so far are checkpointed: the retry resumes on a recycled browser
+            attempt.error = guard.stats.aborted
+            return attempt.error, attempt
+        
         if not result:
-            return False, "No result returned from agent"
-            
+            attempt.error = "No result returned from agent"
+            return attempt.error, attempt
+        
         try:
             # Validate and parse the JSON result
             parsed: InstagramPosts = InstagramPosts.model_validate_json(result)
-            
-            # Validate the content of each post
-            for post in parsed.posts:
-                if not all([
-                    # Accept any Instagram post URL that contains /p/
-                    "/p/" in post.url and post.url.startswith("https://www.instagram.com/"),
-                    post.image_url.startswith("http"),
-                    post.title.strip(),
-                    post.description.strip()
-                ]):
-                    return False, f"Invalid post data format: {post.model_dump_json()}"
-            
-            # Log the successful extraction
-            print("\nExtracted Instagram Posts:")
-            for i, post in enumerate(parsed.posts, 1):
-                print(f"\nPost {i}:")
-                print(f"URL: {post.url}")
-                print(f"Image URL: {post.image_url}")
-                print(f"Title: {post.title}")
-                print(f"Description: {post.description}")
-            
-            # Save the raw JSON to a file
-            with open("output.json", "w") as f:
-                f.write(result)
-            
-            return True, parsed
-            
         except Exception as e:
-            error_msg = f"Error parsing result: {str(e)}"
-            print(error_msg)
-            return False, error_msg
+            attempt.error = f"Error parsing result: {str(e)}"
+            return attempt.error, attempt
+        
+        valid = []
+        for post in parsed.posts:
+            error = validate_post(post)
+            if error:
+                logger.warning(f"Dropping invalid post from the agent's result: {error}")
+                attempt.dropped_posts += 1
+            else:
+                valid.append(post)
+        posts = merge_posts(valid, recorded(), target.post_count)
+        if not posts.posts:
+            attempt.error = validate_posts(parsed) or "No post returned by the agent"
+            return attempt.error, attempt
+        
+        attempt.success = True
+        return posts, attempt
+    except Exception as e:
+        attempt.error = f"Error during scraping: {str(e)}"
+        return attempt.error, attempt
+    finally:
+        if context is not None:
+            await context.close()
+        attempt.wall_seconds = time.perf_counter() - started
+
+async def scrape_instagram(
+    target: Optional[ScrapeTarget] = None,
+    on_step: Optional[StepCallback] = None,
+    browser_pool: Optional[BrowserPool] = None,
+    stats: Optional[dict] = None,
+    summarizer: Optional[Summarizer] = None,
+    recorder: Optional[RunRecorder] = None,
+    checkpoint: Optional[RunCheckpoint] = None,
+    stream: Optional["PostStream"] = None,
+) -> tuple[bool, InstagramPosts | str]:
+    """
+    Scrape Instagram posts for events from the target account (DEFAULT_TARGET if None).
+    The fast path reads the posts from the profile page; the full agent only
+    runs when it fails (or FAST_PATH_ENABLED is off).
+    on_step is awaited after each agent step to report progress.
+    The browser is borrowed from browser_pool; without one, a single-use pool
+    is created and torn down at the end of the run. Without a summarizer, an
+    uncached one is created from the settings.
+    When given, stats is filled with the browser latency/memory of the run and
+    the wall time, tokens and outcome of each extraction path tried, and
+    recorder with the timed spans of the run (agent steps, fast path stages),
+    and the peak Chrome and Python memory of the run (see MemoryGuard).
+    The agent's progress goes to checkpoint (in memory if None), which is
+    cleared on success and kept for a retry to resume from on failure.
+    Posts the agent records are pushed to stream as soon as they are
+    extracted; the caller closes it with the returned posts.
+    
+    Returns:
+        tuple[bool, InstagramPosts | str]: A tuple containing:
+            - bool: Success status
+            - InstagramPosts | str: Either the parsed posts data or error message
+    """
+    target = target or DEFAULT_TARGET
+    summarizer = summarizer or create_summarizer()
+    recorder = recorder or RunRecorder()
+    checkpoint = checkpoint or RunCheckpoint(Checkpoint())
+    resumed_from_step = checkpoint.state.step if checkpoint.resumed else None
+    attempts: List[ExtractionAttempt] = []
+    guard = create_memory_guard()
+    owns_pool = browser_pool is None
+    if owns_pool:
+        browser_pool = create_browser_pool()
+    
+    try:
+        async with browser_pool.acquire() as pooled:
+            async def step_callback(state, model_output, step: int) -> None:
+                pooled.mark_step()
+                if on_step is not None:
+                    await on_step(state, model_output, step)
+            
+            run = pooled.run
+            parsed = None
+            async with guard.watch(pooled.chrome_rss_mb):
+                if settings.FAST_PATH_ENABLED:
+                    parsed, attempt = await run_fast_path(pooled.browser, target, summarizer, recorder)
+                    attempts.append(attempt)
+                if parsed is None:
+                    parsed, attempt = await run_agent(
+                        pooled.browser, target, recorder, checkpoint, step_callback, stream, guard
+                    )
+                    attempts.append(attempt)
+            if guard.stats.aborted:
+                # Its checkpoint retry starts on a fresh Chrome
+                pooled.recycle_reason = guard.stats.aborted
+        if stats is not None:
+            stats["browser"] = run.model_dump()
+        
+        if isinstance(parsed, str):
+            print(parsed)
+            await checkpoint.fail()
+            return False, parsed
+        await checkpoint.clear()
+        
+        # Log the successful extraction
+        print(f"\nExtracted Instagram Posts ({attempts[-1].path} path):")
+        for i, post in enumerate(parsed.posts, 1):
+            print(f"\nPost {i}:")
+            print(f"URL: {post.url}")
+            print(f"Image URL: {post.image_url}")
+            print(f"Title: {post.title}")
+            print(f"Description: {post.description}")
+        
+        # Save the JSON to a file
+        with open("output.json", "w") as f:
+            f.write(parsed.model_dump_json())
+        
+        return True, parsed
             
     except Exception as e:
         error_msg = f"Error during scraping: {str(e)}"
         print(error_msg)
+        await checkpoint.fail()
         return False, error_msg
+    finally:
+        if stats is not None:
+            stats["extraction"] = [attempt.model_dump() for attempt in attempts]
+            stats["memory"] = guard.stats.model_dump()
+            stats["checkpoint"] = {
+                "resumed_from_step": resumed_from_step,
+                "recorded_posts": len(checkpoint.state.posts),
+                "failures": checkpoint.state.failures,
+            }
+        if owns_pool:
+            await browser_pool.close()
 
 if __name__ == "__main__":
     success, result = asyncio.run(scrape_instagram())
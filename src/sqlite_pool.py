@@ -0,0 +1,102 @@
+import asyncio
+import logging
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Applied to every connection; journal_mode=WAL is persistent but cheap to re-assert
+PRAGMAS = {
+    "journal_mode": "WAL",  # Readers never block the writer and vice versa
+    "synchronous": "NORMAL",  # Durable enough with WAL, far fewer fsyncs
+    "busy_timeout": 5000,  # Milliseconds to wait on a lock held by another process
+    "temp_store": "MEMORY",
+}
+
+
+class SQLitePool:
+    """
+    Async access layer over SQLite.
+    Reads run on a small pool of threads, writes on a single writer thread so
+    they are serialized without lock contention. Each thread keeps one long-lived
+    connection, so sqlite3's per-connection statement cache turns repeated
+    queries into prepared statements.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        readers: int = 4,
+        mmap_size: int = 256 * 1024 * 1024,
+        cache_size_kb: int = 64 * 1024,
+        cached_statements: int = 256,
+    ):
+        self.db_path = db_path
+        self.mmap_size = mmap_size
+        self.cache_size_kb = cache_size_kb
+        self.cached_statements = cached_statements
+        self._local = threading.local()
+        self._connections: list[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix="sqlite-read")
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-write")
+
+    def connect(self) -> sqlite3.Connection:
+        """Open a new tuned connection"""
+        conn = sqlite3.connect(
+            self.db_path,
+            cached_statements=self.cached_statements,
+            check_same_thread=False,
+        )
+        conn.row_factory = sqlite3.Row  # This enables column access by name
+        for name, value in PRAGMAS.items():
+            conn.execute(f"PRAGMA {name}={value}")
+        conn.execute(f"PRAGMA mmap_size={self.mmap_size}")
+        conn.execute(f"PRAGMA cache_size=-{self.cache_size_kb}")
+        return conn
+
+    def _thread_connection(self) -> sqlite3.Connection:
+        """Connection owned by the current worker thread"""
+        conn: Optional[sqlite3.Connection] = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self.connect()
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def _run_read(self, fn: Callable[..., T], *args: Any) -> T:
+        return fn(self._thread_connection(), *args)
+
+    def _run_write(self, fn: Callable[..., T], *args: Any) -> T:
+        conn = self._thread_connection()
+        try:
+            result = fn(conn, *args)
+            conn.commit()
+            return result
+        except Exception:
+            conn.rollback()
+            raise
+
+    async def read(self, fn: Callable[..., T], *args: Any) -> T:
+        """Run fn(conn, *args) on a reader thread"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._readers, self._run_read, fn, *args)
+
+    async def write(self, fn: Callable[..., T], *args: Any) -> T:
+        """Run fn(conn, *args) on the writer thread and commit (rolled back on error)"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._writer, self._run_write, fn, *args)
+
+    def close(self) -> None:
+        """Stop the worker threads and close their connections"""
+        self._readers.shutdown(wait=True)
+        self._writer.shutdown(wait=True)
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
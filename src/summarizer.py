@@ -0,0 +1,203 @@
+import asyncio
+import hashlib
+import logging
+import sqlite3
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from langchain_openai import ChatOpenAI
+from pydantic import BaseModel
+
+if TYPE_CHECKING:
+    from src.database import Database
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = """Pour chacune des publications Instagram ci-dessous, retournez son index, son titre
+(la première ligne de la légende, à l'identique) et une description synthétisée en FRANÇAIS
+(date et contenu de l'événement, plats du menu, etc.). Répondez pour toutes les publications.
+
+Publications :
+{posts}"""
+
+
+class SummaryInput(BaseModel):
+    """Raw text of a post to summarize"""
+    url: str
+    caption: str = ""
+    alt_text: str = ""
+
+
+class Summary(BaseModel):
+    title: str
+    description: str
+
+
+class IndexedSummary(Summary):
+    index: int
+
+
+class SummaryBatch(BaseModel):
+    summaries: List[IndexedSummary]
+
+
+class SummaryStats(BaseModel):
+    """Cache hits and LLM spend of one summarization pass"""
+    posts: int = 0
+    cached: int = 0
+    summarized: int = 0
+    batches: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+
+
+def caption_hash(post: SummaryInput) -> str:
+    """Key of a post's text: a post is only summarized again when its caption changes"""
+    return hashlib.blake2b(f"{post.caption}\x00{post.alt_text}".encode(), digest_size=16).hexdigest()
+
+
+class OpenAISummaryBackend:
+    """Summarizes a batch of posts with one structured-output request"""
+
+    def __init__(self, model: str = "gpt-4o-mini"):
+        self.model = model
+        self._llm: Optional[ChatOpenAI] = None
+
+    async def summarize(self, posts: List[SummaryInput]) -> Tuple[List[Summary], Dict[str, int]]:
+        if self._llm is None:
+            self._llm = ChatOpenAI(model=self.model, temperature=0)
+        listing = "\n\n".join(
+            f"[{index}] Légende : {post.caption[:800]}\nTexte alternatif : {post.alt_text[:300]}"
+            for index, post in enumerate(posts)
+        )
+        result = await self._llm.with_structured_output(SummaryBatch, include_raw=True).ainvoke(
+            SUMMARY_PROMPT.format(posts=listing)
+        )
+        usage = getattr(result["raw"], "usage_metadata", None) or {}
+        tokens = {"input_tokens": usage.get("input_tokens", 0), "output_tokens": usage.get("output_tokens", 0)}
+        if result.get("parsing_error") or result.get("parsed") is None:
+            raise ValueError(f"Invalid summary batch: {result.get('parsing_error')}")
+
+        by_index = {summary.index: summary for summary in result["parsed"].summaries}
+        missing = [index for index in range(len(posts)) if index not in by_index]
+        if missing:
+            raise ValueError(f"Summary batch is missing posts {missing}")
+        return [Summary(title=by_index[i].title, description=by_index[i].description) for i in range(len(posts))], tokens
+
+
+class StubSummaryBackend:
+    """
+    Offline backend for tests and benchmarks: the title is the first line of
+    the caption and the description the rest (or the alt text).
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.posts = 0
+
+    async def summarize(self, posts: List[SummaryInput]) -> Tuple[List[Summary], Dict[str, int]]:
+        self.calls += 1
+        self.posts += len(posts)
+        summaries = []
+        for post in posts:
+            lines = [line.strip() for line in post.caption.splitlines() if line.strip()]
+            title = lines[0][:120] if lines else (post.alt_text[:120] or post.url)
+            description = " ".join(lines[1:])[:500] or post.alt_text or title
+            summaries.append(Summary(title=title, description=description))
+        return summaries, {"input_tokens": 0, "output_tokens": 0}
+
+
+def create_summary_backend(name: str, model: str):
+    """Backend named in the settings ("openai" or "stub")"""
+    if name == "stub":
+        return StubSummaryBackend()
+    return OpenAISummaryBackend(model=model)
+
+
+class Summarizer:
+    """
+    Summarization stage: turns raw captions into French titles/descriptions.
+    Posts are looked up in a persistent cache keyed by (url, caption hash)
+    first; only the misses are sent to the backend, batch_size posts per
+    request. Without a database the cache is skipped.
+    """
+
+    def __init__(self, backend, db: Optional["Database"] = None, batch_size: int = 10):
+        self.backend = backend
+        self.db = db
+        self.batch_size = batch_size
+        if db is not None:
+            self.init_db()
+
+    def init_db(self) -> None:
+        """Create the summaries cache table"""
+        with self.db.get_connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS summaries (
+                    url TEXT NOT NULL,
+                    caption_hash TEXT NOT NULL,
+                    title TEXT NOT NULL,
+                    description TEXT NOT NULL,
+                    created_at TIMESTAMP NOT NULL,
+                    PRIMARY KEY (url, caption_hash)
+                ) WITHOUT ROWID
+            """)
+            conn.commit()
+
+    async def _cached(self, keys: List[Tuple[str, str]]) -> Dict[Tuple[str, str], Summary]:
+        if self.db is None or not keys:
+            return {}
+
+        def lookup(conn: sqlite3.Connection) -> List[sqlite3.Row]:
+            urls = list({url for url, _ in keys})
+            return conn.execute(f"""
+                SELECT url, caption_hash, title, description FROM summaries
+                WHERE url IN ({','.join('?' * len(urls))})
+            """, urls).fetchall()
+
+        wanted = set(keys)
+        return {
+            (row['url'], row['caption_hash']): Summary(title=row['title'], description=row['description'])
+            for row in await self.db.pool.read(lookup)
+            if (row['url'], row['caption_hash']) in wanted
+        }
+
+    async def _store(self, entries: List[Tuple[str, str, Summary]]) -> None:
+        if self.db is None or not entries:
+            return
+        now = datetime.now()
+
+        def insert(conn: sqlite3.Connection) -> None:
+            conn.executemany("""
+                INSERT OR REPLACE INTO summaries (url, caption_hash, title, description, created_at)
+                VALUES (?, ?, ?, ?, ?)
+            """, [(url, digest, summary.title, summary.description, now) for url, digest, summary in entries])
+
+        await self.db.pool.write(insert)
+
+    async def summarize(self, posts: List[SummaryInput]) -> Tuple[List[Summary], SummaryStats]:
+        """Summaries of the posts, in order, and the cache/LLM stats of the pass"""
+        stats = SummaryStats(posts=len(posts))
+        keys = [(post.url, caption_hash(post)) for post in posts]
+        summaries: Dict[Tuple[str, str], Summary] = await self._cached(keys)
+        stats.cached = sum(1 for key in keys if key in summaries)
+
+        # Each distinct post is summarized once, even if it appears twice in the input
+        misses = list({key: post for key, post in zip(keys, posts) if key not in summaries}.items())
+        batches = [misses[i:i + self.batch_size] for i in range(0, len(misses), self.batch_size)]
+
+        async def run(batch: List[Tuple[Tuple[str, str], SummaryInput]]) -> List[Tuple[str, str, Summary]]:
+            results, tokens = await self.backend.summarize([post for _, post in batch])
+            stats.input_tokens += tokens["input_tokens"]
+            stats.output_tokens += tokens["output_tokens"]
+            return [(key[0], key[1], summary) for (key, _), summary in zip(batch, results)]
+
+        for entries in await asyncio.gather(*(run(batch) for batch in batches)):
+            for url, digest, summary in entries:
+                summaries[(url, digest)] = summary
+            await self._store(entries)
+        stats.summarized = len(misses)
+        stats.batches = len(batches)
+
+        logger.info(f"Summarized {stats.summarized} post(s) in {stats.batches} batch(es), {stats.cached} cached")
+        return [summaries[key] for key in keys], stats
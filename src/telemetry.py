@@ -0,0 +1,209 @@
+import logging
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+if TYPE_CHECKING:
+    from src.database import Database
+
+logger = logging.getLogger(__name__)
+
+SPAN_COLUMNS = (
+    "kind", "step", "started_at", "duration_seconds", "state_seconds", "llm_seconds", "action_seconds",
+    "input_tokens", "output_tokens", "llm_calls", "screenshot_bytes", "url", "actions", "error",
+)
+
+
+class Span(BaseModel):
+    """
+    One timed unit of a run: an agent step, or a stage of the fast path.
+    An agent step splits into reading the page state (DOM and screenshot),
+    waiting for the LLM and executing the actions (navigation, clicks).
+    """
+    kind: str
+    step: Optional[int] = None
+    started_at: float  # Unix time
+    duration_seconds: float = 0.0
+    state_seconds: Optional[float] = None
+    llm_seconds: float = 0.0
+    action_seconds: Optional[float] = None
+    input_tokens: int = 0
+    output_tokens: int = 0
+    llm_calls: int = 0
+    screenshot_bytes: int = 0
+    url: Optional[str] = None
+    actions: Optional[str] = None
+    error: Optional[str] = None
+
+
+def _screenshot_bytes(screenshot: Optional[str]) -> int:
+    """Decoded size of a base64 screenshot"""
+    return len(screenshot) * 3 // 4 if screenshot else 0
+
+
+class RunRecorder:
+    """Collects the spans of one scrape run"""
+
+    def __init__(self):
+        # Imported here: LangChain is only loaded by the processes running scrapes, not by the API reading spans
+        from src.llm_usage import LLMUsageHandler
+
+        self.spans: List[Span] = []
+        self.llm = LLMUsageHandler()
+
+    @contextmanager
+    def span(self, kind: str, **fields: Any) -> Iterator[Span]:
+        """Time a block as a span; the block may fill in tokens, url, ..."""
+        span = Span(kind=kind, started_at=time.time(), **fields)
+        started = time.perf_counter()
+        try:
+            yield span
+        except Exception as e:
+            span.error = str(e)
+            raise
+        finally:
+            span.duration_seconds = time.perf_counter() - started
+            self.spans.append(span)
+
+    def add_agent_history(self, history: Any, screenshot_bytes: Optional[Dict[int, int]] = None) -> None:
+        """
+        Turn a browser_use AgentHistoryList into one span per step, matching
+        the LLM calls timed by the callback handler to the step they ran in.
+        screenshot_bytes gives the size of screenshots trimmed from the history, by index.
+        """
+        screenshot_bytes = screenshot_bytes or {}
+        for index, item in enumerate(history.history):
+            metadata = item.metadata
+            if metadata is None:
+                continue
+            calls = [
+                call for call in self.llm.calls
+                if metadata.step_start_time <= call.started_at <= metadata.step_end_time
+            ]
+            span = Span(
+                kind="agent_step",
+                step=metadata.step_number,
+                started_at=metadata.step_start_time,
+                duration_seconds=metadata.duration_seconds,
+                llm_seconds=sum(call.ended_at - call.started_at for call in calls),
+                # The message manager's estimate when the provider reported no usage
+                input_tokens=sum(call.input_tokens for call in calls) or metadata.input_tokens,
+                output_tokens=sum(call.output_tokens for call in calls),
+                llm_calls=len(calls),
+                screenshot_bytes=screenshot_bytes.get(index) or _screenshot_bytes(item.state.screenshot),
+                url=item.state.url,
+                actions=",".join(
+                    next(iter(action.model_dump(exclude_unset=True)), "?") for action in item.model_output.action
+                ) if item.model_output else None,
+                error="; ".join(result.error for result in item.result if result.error) or None,
+            )
+            if calls:
+                span.state_seconds = min(call.started_at for call in calls) - metadata.step_start_time
+                span.action_seconds = metadata.step_end_time - max(call.ended_at for call in calls)
+            self.spans.append(span)
+
+
+class TelemetryStore:
+    """Persistence of run spans, keyed by job id (the run id)"""
+
+    def __init__(self, db: "Database"):
+        self.db = db
+        self.init_db()
+
+    def init_db(self) -> None:
+        """Create the run_spans table"""
+        with self.db.get_connection() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS run_spans (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    job_id INTEGER NOT NULL,
+                    kind TEXT NOT NULL,
+                    step INTEGER,
+                    started_at REAL NOT NULL,
+                    duration_seconds REAL NOT NULL,
+                    state_seconds REAL,
+                    llm_seconds REAL NOT NULL DEFAULT 0,
+                    action_seconds REAL,
+                    input_tokens INTEGER NOT NULL DEFAULT 0,
+                    output_tokens INTEGER NOT NULL DEFAULT 0,
+                    llm_calls INTEGER NOT NULL DEFAULT 0,
+                    screenshot_bytes INTEGER NOT NULL DEFAULT 0,
+                    url TEXT,
+                    actions TEXT,
+                    error TEXT
+                );
+
+                CREATE INDEX IF NOT EXISTS idx_run_spans_job ON run_spans (job_id, id);
+            """)
+            conn.commit()
+
+    async def save(self, job_id: int, spans: List[Span]) -> None:
+        if not spans:
+            return
+
+        def insert(conn: sqlite3.Connection) -> None:
+            conn.executemany(f"""
+                INSERT INTO run_spans (job_id, {', '.join(SPAN_COLUMNS)})
+                VALUES (?, {', '.join('?' * len(SPAN_COLUMNS))})
+            """, [(job_id, *(getattr(span, column) for column in SPAN_COLUMNS)) for span in spans])
+
+        await self.db.pool.write(insert)
+
+    async def profile(self, job_id: int, slowest: int = 5) -> Dict[str, Any]:
+        """Spans of a run, their totals per kind and the slowest ones"""
+        def query(conn: sqlite3.Connection) -> List[sqlite3.Row]:
+            return conn.execute(f"""
+                SELECT {', '.join(SPAN_COLUMNS)} FROM run_spans WHERE job_id = ? ORDER BY id
+            """, (job_id,)).fetchall()
+
+        spans = [dict(row) for row in await self.db.pool.read(query)]
+        totals: Dict[str, Dict[str, float]] = {}
+        for span in spans:
+            kind = totals.setdefault(span['kind'], {
+                "spans": 0, "duration_seconds": 0.0, "state_seconds": 0.0, "llm_seconds": 0.0,
+                "action_seconds": 0.0, "input_tokens": 0, "output_tokens": 0, "screenshot_bytes": 0,
+            })
+            kind["spans"] += 1
+            for field in ("duration_seconds", "state_seconds", "llm_seconds", "action_seconds",
+                          "input_tokens", "output_tokens", "screenshot_bytes"):
+                kind[field] += span[field] or 0
+        return {
+            "job_id": job_id,
+            "totals": totals,
+            "slowest": sorted(spans, key=lambda span: span['duration_seconds'], reverse=True)[:slowest],
+            "spans": spans,
+        }
+
+    async def totals_by_kind(self) -> List[Dict[str, Any]]:
+        """Cumulative span counts, time, tokens and screenshot bytes per kind"""
+        def query(conn: sqlite3.Connection) -> List[sqlite3.Row]:
+            return conn.execute("""
+                SELECT kind, COUNT(*) AS spans, SUM(duration_seconds) AS duration_seconds,
+                       SUM(llm_seconds) AS llm_seconds, SUM(input_tokens) AS input_tokens,
+                       SUM(output_tokens) AS output_tokens, SUM(screenshot_bytes) AS screenshot_bytes,
+                       SUM(error IS NOT NULL) AS errors
+                FROM run_spans
+                GROUP BY kind
+                ORDER BY kind
+            """).fetchall()
+
+        return [dict(row) for row in await self.db.pool.read(query)]
+
+
+MetricSamples = List[Tuple[Dict[str, Any], float]]
+
+
+def _escape_label(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_metric(name: str, kind: str, help_text: str, samples: MetricSamples) -> str:
+    """One metric in the Prometheus text exposition format"""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        label_text = ",".join(f'{key}="{_escape_label(label)}"' for key, label in labels.items())
+        lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,127 @@
+import asyncio
+import io
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, Optional
+
+from PIL import Image, features
+
+from src.phash import dhash_bytes, dhash_file, grid_difference
+
+logger = logging.getLogger(__name__)
+
+# Output formats supported by the transcoding stage and their file extensions
+FORMAT_EXTENSIONS = {
+    "PNG": ".png",
+    "WEBP": ".webp",
+    "AVIF": ".avif",
+    "JPEG": ".jpg",
+}
+
+
+def _save_atomic(image: Image.Image, path: str, fmt: str, options: dict) -> None:
+    """Write to a temporary file first so readers never see a partial image"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    image.save(tmp_path, fmt, **options)
+    os.replace(tmp_path, path)
+
+
+def transcode_to_file(
+    data: bytes,
+    local_path: str,
+    fmt: str,
+    quality: int,
+    thumbnails: Optional[Dict[int, str]] = None,
+) -> None:
+    """
+    Decode raw image bytes and encode them to local_path in the given format,
+    plus one downscaled copy per thumbnail width.
+    Runs inside a worker process, so it must stay a picklable module-level function.
+    """
+    image = Image.open(io.BytesIO(data))
+    if fmt == "JPEG":
+        image = image.convert('RGB')  # JPEG has no alpha channel
+        options = {"quality": quality, "progressive": True}
+    else:
+        image = image.convert('RGBA')  # Ensure consistent format
+        options = {} if fmt == "PNG" else {"quality": quality}
+
+    _save_atomic(image, local_path, fmt, options)
+
+    # Largest first so each thumbnail is resized from the closest bigger one
+    source = image
+    for width, path in sorted((thumbnails or {}).items(), reverse=True):
+        if width < source.width:
+            height = max(1, round(source.height * width / source.width))
+            source = source.resize((width, height), Image.LANCZOS)
+        _save_atomic(source, path, fmt, options)
+
+
+def resolve_format(fmt: str) -> str:
+    """Validate the configured format, falling back to WEBP when AVIF is unavailable"""
+    fmt = fmt.upper()
+    if fmt not in FORMAT_EXTENSIONS:
+        raise ValueError(f"Unsupported image format: {fmt} (expected one of {', '.join(FORMAT_EXTENSIONS)})")
+    if fmt == "AVIF" and not features.check("avif"):
+        logger.warning("AVIF encoding is not available in this Pillow build, falling back to WEBP")
+        return "WEBP"
+    return fmt
+
+
+class Transcoder:
+    """
+    CPU-bound transcoding stage: decodes and re-encodes images in a process pool
+    so large images never block the event loop.
+    With workers=0 the work runs inline, which is only meant for debugging.
+    """
+
+    def __init__(self, fmt: str = "WEBP", quality: int = 80, workers: int = 2):
+        self.format = resolve_format(fmt)
+        self.quality = quality
+        self.workers = workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def extension(self) -> str:
+        return FORMAT_EXTENSIONS[self.format]
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Return the process pool, starting it on first use"""
+        if self._executor is None:
+            # spawn avoids forking a process that runs an event loop and threads
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    async def _run(self, job: Callable[[], Any]) -> Any:
+        if self.workers <= 0:
+            return job()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), job)
+
+    async def transcode(self, data: bytes, local_path: str, thumbnails: Optional[Dict[int, str]] = None) -> None:
+        """Transcode raw image bytes to local_path and the given thumbnail paths"""
+        await self._run(partial(transcode_to_file, data, local_path, self.format, self.quality, thumbnails))
+
+    async def perceptual_hash(self, data: bytes) -> int:
+        """Perceptual hash (dHash) of raw image bytes"""
+        return await self._run(partial(dhash_bytes, data))
+
+    async def perceptual_hash_file(self, path: str) -> int:
+        """Perceptual hash (dHash) of a stored image"""
+        return await self._run(partial(dhash_file, path))
+
+    async def grid_difference(self, data: bytes, path: str) -> int:
+        """Largest cell difference between raw image bytes and a stored image"""
+        return await self._run(partial(grid_difference, data, path))
+
+    def close(self) -> None:
+        """Shut down the worker processes"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,165 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Awaitable, Callable, List, Optional
+
+from src.checkpoints import CheckpointStore
+from src.config import settings
+from src.jobs import JobQueue, JobStore, ScrapeJob, ScrapeTarget
+from src.models import DEFAULT_TARGET, InstagramPosts
+from src.post_stream import PostStream
+from src.telemetry import RunRecorder, TelemetryStore
+
+if TYPE_CHECKING:
+    from src.database import Database
+
+logger = logging.getLogger(__name__)
+
+# Agent step callback of a job, called with (browser state, model output, step number)
+StepPublisher = Callable[[ScrapeJob], Callable[..., Awaitable[None]]]
+
+
+class JobRunner:
+    """
+    Runs the queued scrape jobs: the job queue workers, the browser pool and
+    the summarizer. Runs inside each API worker (JOB_RUNNER_MODE "in_process")
+    or on its own (`python -m src.worker`, "standalone"), leaving the API
+    workers to serve reads and queue jobs.
+    """
+
+    def __init__(
+        self,
+        db: "Database",
+        job_store: JobStore,
+        telemetry: TelemetryStore,
+        checkpoints: CheckpointStore,
+        step_publisher: Optional[StepPublisher] = None,
+    ):
+        # Imported here rather than at the top: the API only needs the scraping
+        # engine (browser_use, LangChain) in process mode, and the transcoding
+        # processes spawned by `python -m src.worker` re-import this module
+        from src.scrapper import create_browser_pool, create_summarizer
+
+        self.db = db
+        self.job_store = job_store
+        self.telemetry = telemetry
+        self.checkpoints = checkpoints
+        self.step_publisher = step_publisher
+        # Pre-warmed browsers shared by the scraping runs
+        self.browser_pool = create_browser_pool()
+        # Caption summarization, cached by post URL and caption hash across runs
+        self.summarizer = create_summarizer(db)
+        # Runs queued jobs, up to MAX_CONCURRENT_JOBS agents at once per process
+        self.queue = JobQueue(
+            job_store, self.run_job,
+            concurrency=settings.MAX_CONCURRENT_JOBS,
+            lease_seconds=settings.JOB_LEASE_SECONDS,
+            heartbeat_seconds=settings.JOB_HEARTBEAT_SECONDS,
+            max_attempts=settings.JOB_MAX_ATTEMPTS,
+        )
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self) -> None:
+        """Warm the browser pool and hash older stored images in the background, and start the job workers"""
+        self._tasks.append(asyncio.create_task(self.browser_pool.start()))
+        if settings.IMAGE_NEAR_DUPLICATE_DISTANCE is not None:
+            self._tasks.append(asyncio.create_task(self.db.backfill_image_hashes()))
+        await self.queue.start()
+
+    async def close(self) -> None:
+        """Stop the job workers (running jobs are handed back to the queue) and close the browsers"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self.queue.close()
+        await self.browser_pool.close()
+
+    async def run_job(self, job: ScrapeJob, target: ScrapeTarget) -> None:
+        """
+        Run one scrape job: scrape the target, save its posts and record the outcome.
+        Posts are saved (and their images downloaded) as the agent records them;
+        the rest of the result is saved, and old posts pruned, once the run is over.
+        """
+        from src.scrapper import scrape_instagram
+
+        db = self.db
+        logger.info(f"Starting scraping job {job.id} for {target.account}")
+        await db.log_scraping("started", job_id=job.id)
+        stats = {}
+        recorder = RunRecorder()
+        checkpoint = await self.checkpoints.open(target.id, job.id)
+        stream = PostStream(lambda posts: db.save_posts(InstagramPosts(posts=posts), account=target.account, prune=False))
+        try:
+            success, result = await scrape_instagram(
+                target=target, on_step=self.step_publisher(job) if self.step_publisher else None,
+                browser_pool=self.browser_pool, stats=stats, summarizer=self.summarizer,
+                recorder=recorder, checkpoint=checkpoint, stream=stream,
+            )
+            logger.debug(f"Scraper returned: success={success}, result type={type(result)}")
+
+            if success:
+                logger.debug(f"Saving {len(result.posts)} posts to database ({stream.streamed} already streamed)")
+                with recorder.span("save"):
+                    save = await stream.close(result.posts)
+                    save.pruned_posts = await db.prune_posts(datetime.now() - timedelta(days=settings.POST_RETENTION_DAYS))
+                    save.deleted_images = await db.collect_garbage()
+                await self.telemetry.save(job.id, recorder.spans)
+                stats["save"] = save.model_dump(mode="json")
+                stats["stream"] = {"streamed_posts": stream.streamed, "first_post_seconds": stream.first_post_seconds}
+                await self.job_store.finish(job.id, "completed", new_posts=save.new_posts, stats=stats, owner=job.lease_owner)
+                await db.log_scraping("completed", job_id=job.id)
+                logger.info(f"Scraping job {job.id} completed")
+            else:
+                logger.error(f"Scraping job {job.id} failed: {result}")
+                # Posts recorded before the failure are valid: finish saving them
+                await stream.close()
+                await self.telemetry.save(job.id, recorder.spans)
+                await self.job_store.finish(job.id, "error", error_message=result, stats=stats, owner=job.lease_owner)
+                await db.log_scraping("error", result, job_id=job.id)
+
+                # Retry right away from the checkpoint when the run made progress
+                if checkpoint.resumed and checkpoint.state.failures <= settings.CHECKPOINT_MAX_RETRIES:
+                    retry = await self.queue.enqueue(target.id)
+                    logger.info(f"Retrying job {job.id} as job {retry.id} from step {checkpoint.state.step}")
+
+        except Exception as e:
+            logger.exception(f"Unexpected error during scraping job {job.id}")
+            try:
+                await stream.close()
+            except Exception:
+                logger.exception(f"Failed to save the posts streamed by job {job.id}")
+            await self.telemetry.save(job.id, recorder.spans)
+            await self.job_store.finish(job.id, "error", error_message=str(e), stats=stats, owner=job.lease_owner)
+            await db.log_scraping("error", str(e), job_id=job.id)
+
+
+async def main():
+    """Standalone mode: run the jobs queued in the shared database by the API workers and the scheduler"""
+    from src.database import Database
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    )
+    if settings.JOB_RUNNER_MODE != "standalone":
+        logger.info(f"Job runner mode is '{settings.JOB_RUNNER_MODE}', not starting the standalone job runner")
+        return
+
+    db = Database(db_path=settings.DB_PATH, images_dir=settings.IMAGES_DIR)
+    job_store = JobStore(db)
+    job_store.ensure_default_target(DEFAULT_TARGET)
+    runner = JobRunner(
+        db, job_store,
+        telemetry=TelemetryStore(db),
+        checkpoints=CheckpointStore(db, ttl_hours=settings.CHECKPOINT_TTL_HOURS),
+    )
+    await runner.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.close()
+        await db.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,112 @@
+import asyncio
+import io
+import random
+import sqlite3
+
+from aiohttp import web
+from PIL import Image, ImageChops, ImageDraw
+
+from src.config import settings
+from src.database import Database
+from src.models import InstagramPost, InstagramPosts
+from src.phash import GRID_SIZE, dhash, hamming
+
+# Seed of a textured image whose 500px JPEG q70 copy is 16 dHash bits (of 256) from it, 18 from its stored WEBP
+RESIZED_SEED = 14
+
+
+def textured_image(seed: int, size: int = 800) -> Image.Image:
+    """Seeded rectangles under fine noise, like a photo of a menu board"""
+    rng = random.Random(seed)
+    image = Image.new("RGB", (size, size), tuple(rng.randrange(256) for _ in range(3)))
+    draw = ImageDraw.Draw(image)
+    for _ in range(12):
+        x, y = rng.randrange(size), rng.randrange(size)
+        w, h = rng.randrange(size // 8, size // 2), rng.randrange(size // 8, size // 2)
+        draw.rectangle((x - w // 2, y - h // 2, x + w // 2, y + h // 2), fill=tuple(rng.randrange(256) for _ in range(3)))
+    noise = Image.frombytes("RGB", (size, size), rng.randbytes(size * size * 3)).point(lambda v: 112 + v // 8)
+    return ImageChops.add(image, noise, offset=-128)
+
+
+def encode(image: Image.Image, width: int = None, quality: int = 90) -> bytes:
+    if width is not None:
+        image = image.resize((width, width), Image.LANCZOS)
+    buf = io.BytesIO()
+    image.save(buf, "JPEG", quality=quality)
+    return buf.getvalue()
+
+
+def grid_difference(a: bytes, b: bytes) -> int:
+    def grid(data: bytes) -> Image.Image:
+        return Image.open(io.BytesIO(data)).convert("L").resize((GRID_SIZE, GRID_SIZE), Image.BOX)
+    return ImageChops.difference(grid(a), grid(b)).getextrema()[1]
+
+
+def test_resized_recompressed_copy_is_a_candidate_and_confirmed():
+    original = encode(textured_image(RESIZED_SEED))
+    copy = encode(textured_image(RESIZED_SEED), width=500, quality=70)
+    distance = hamming(dhash(Image.open(io.BytesIO(original))), dhash(Image.open(io.BytesIO(copy))))
+    assert 10 < distance <= settings.IMAGE_NEAR_DUPLICATE_DISTANCE
+    assert grid_difference(original, copy) <= settings.IMAGE_NEAR_DUPLICATE_MAX_DIFFERENCE
+
+
+def test_distinct_images_are_rejected_by_the_grid():
+    images = [encode(textured_image(seed)) for seed in range(6)]
+    for i, a in enumerate(images):
+        for b in images[i + 1:]:
+            assert grid_difference(a, b) > settings.IMAGE_NEAR_DUPLICATE_MAX_DIFFERENCE
+
+
+async def serve(images: dict) -> web.AppRunner:
+    async def handler(request: web.Request) -> web.Response:
+        return web.Response(body=images[request.match_info["name"]], content_type="image/jpeg")
+
+    app = web.Application()
+    app.router.add_get("/{name}", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 0).start()
+    return runner
+
+
+def post(url: str, image_url: str) -> InstagramPost:
+    return InstagramPost(url=url, image_url=image_url, title="Menu", description="This week's menu")
+
+
+def test_backfilled_image_is_matched_by_a_resized_copy(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "TRANSCODE_WORKERS", 0)
+    db_path, images_dir = str(tmp_path / "posts.db"), str(tmp_path / "images")
+    images = {
+        "old.jpg": encode(textured_image(RESIZED_SEED)),
+        "other.jpg": encode(textured_image(100)),
+        "unrelated.jpg": encode(textured_image(101)),
+        "copy.jpg": encode(textured_image(RESIZED_SEED), width=500, quality=70),
+    }
+
+    async def run() -> str:
+        runner = await serve(images)
+        cdn = f"http://127.0.0.1:{runner.addresses[0][1]}"
+        try:
+            db = Database(db_path=db_path, images_dir=images_dir)
+            await db.save_posts(InstagramPosts(posts=[post("https://x/p/old/", f"{cdn}/old.jpg")]), account="a", prune=False)
+            await db.save_posts(InstagramPosts(posts=[post("https://x/p/other/", f"{cdn}/other.jpg")]), account="a", prune=False)
+            await db.close()
+
+            # The oldest image was stored before perceptual hashes existed
+            with sqlite3.connect(db_path) as conn:
+                conn.execute("UPDATE images SET phash = NULL WHERE rowid = (SELECT MIN(rowid) FROM images)")
+                conn.execute("UPDATE posts SET image_phash = NULL")
+
+            db = Database(db_path=db_path, images_dir=images_dir)
+            # The index is loaded (past every stored row) before the backfill runs
+            await db.save_posts(InstagramPosts(posts=[post("https://x/p/unrelated/", f"{cdn}/unrelated.jpg")]), account="b", prune=False)
+            assert await db.backfill_image_hashes() == 1
+            saved = await db.save_posts(InstagramPosts(posts=[post("https://x/p/copy/", f"{cdn}/copy.jpg")]), account="a", prune=False)
+            assert saved.images.near_duplicates == 1
+            await db.close()
+        finally:
+            await runner.cleanup()
+        with sqlite3.connect(db_path) as conn:
+            return conn.execute("SELECT duplicate_of FROM posts WHERE url = 'https://x/p/copy/'").fetchone()[0]
+
+    assert asyncio.run(run()) == "https://x/p/old/"